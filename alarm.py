@@ -0,0 +1,90 @@
+import heapq
+import utime
+
+# Alarm days: bit 0 is Monday, like the weekday of utime.localtime(). An
+# alarm without days is a one shot, it rings once at the next wakeup time.
+DAYS_EVERY = const(0x7F)
+DAYS_WEEK = const(0x1F)
+DAYS_WEEKEND = const(0x60)
+DAYS_ONCE = const(0)
+
+DAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+DAYS_PRESETS = ((DAYS_EVERY, "every day"), (DAYS_WEEK, "Mon-Fri"), (DAYS_WEEKEND, "Sat-Sun"),
+                (DAYS_ONCE, "once")) + tuple((1 << day, name) for day, name in enumerate(DAY_NAMES))
+
+SECONDS_PER_DAY = const(86400)
+EPOCH_WEEKDAY = const(5)    # 2000-01-01 was a Saturday
+
+def days_name(days):
+    for preset, name in DAYS_PRESETS:
+        if preset == days:
+            return name
+    return "".join(DAY_NAMES[day][0] if days & (1 << day) else "-" for day in range(7))
+
+def next_fire(alarm, now):
+    # first local time matching the wakeup time and days, from the start of
+    # the current minute, not on the date the alarm last rang; None when the
+    # alarm cannot ring
+    if not alarm.active or alarm.wakeup is None:
+        return None
+    day = now - now % SECONDS_PER_DAY
+    offset = alarm.wakeup[0]*3600 + alarm.wakeup[1]*60
+    days = alarm.days if alarm.days else DAYS_EVERY
+    last = alarm.last_ring_date
+    for _ in range(8):
+        fire = day + offset
+        if fire + 60 > now and days & (1 << ((day // SECONDS_PER_DAY + EPOCH_WEEKDAY) % 7)):
+            tm = utime.localtime(fire)
+            if tm[0] != last[0] or tm[1] != last[1] or tm[2] != last[2]:
+                return fire
+        day += SECONDS_PER_DAY
+    return None
+
+class AlarmScheduler:
+    # Min-heap of (fire time, generation, alarm) in local seconds. Changing
+    # an alarm gives it a new generation and pushes a new entry, the old one
+    # is dropped when it reaches the top. Checking for a due alarm only looks
+    # at the top, whatever the number of alarms.
+    def __init__(self):
+        self.heap = []
+        self.generation = 0
+        self.changed = []
+        self.ringing = set()
+
+    def invalidate(self, alarm):
+        # wakeup, days or on/off changed: rescheduled by update()
+        if alarm not in self.changed:
+            self.changed.append(alarm)
+
+    def schedule(self, alarm, now):
+        self.generation += 1
+        alarm.generation = self.generation
+        fire = next_fire(alarm, now)
+        if fire is not None:
+            heapq.heappush(self.heap, (fire, self.generation, alarm))
+
+    def reschedule_all(self, now):
+        # the local time jumped: clock set or time zone changed
+        alarms = [entry[2] for entry in self.heap if entry[1] == entry[2].generation]
+        alarms.extend(self.changed)
+        self.heap.clear()
+        self.changed.clear()
+        for alarm in alarms:
+            self.schedule(alarm, now)
+
+    def update(self, now):
+        while self.changed:
+            self.schedule(self.changed.pop(), now)
+
+    def next_time(self):
+        heap = self.heap
+        while heap and heap[0][1] != heap[0][2].generation:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now):
+        # next alarm whose time has come, None when there is none
+        fire = self.next_time()
+        if fire is None or fire > now:
+            return None
+        return heapq.heappop(self.heap)[2]
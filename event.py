@@ -1,4 +1,23 @@
-from collections import deque
+import utime
+import machine
+import perf
+from array import array
+
+EVENTS_CAPACITY = const(16)
+
+# An event record is EVENT_SLOTS ints of the queue's array, its text the
+# matching entry of a list beside it. Frequencies travel as tuner channels,
+# 100 kHz steps from 87.5 MHz, so posting boxes no float.
+SLOT_TYPE = const(0)
+SLOT_DELTA = const(1)
+SLOT_ACCEL = const(2)
+SLOT_CHANNEL = const(3)
+SLOT_RSSI = const(4)
+SLOT_VALID = const(5)
+SLOT_PI = const(6)
+SLOT_TS = const(7)
+EVENT_SLOTS = const(8)
+CHANNEL_NONE = const(-1)
 
 class Event:
     ROT_CW = const(0)
@@ -14,47 +33,158 @@ class Event:
     TIMEOUT = const(10)
     SEEK_COMPLETE = const(11)
     EXIT = const(12)
+    RDS_PI = const(13)
 
+    # The record popped from the queue, in attributes for the handlers.
+    # frequency in MHz follows channel, 0.0 without one.
     def __init__(self, event_type):
         self.type = event_type
+        self.delta = 1      # rotation: detents, and acceleration multiplier
+        self.accel = 1
+        self.channel = CHANNEL_NONE
+        self.frequency = 0.0
+        self.rssi = 0
+        self.valid = False
+        self.text = None
+        self.pi = 0
+        self.ts = 0
 
-class EventRotCwEvent(Event):
-    def __init__(self, fast=False):
-        super().__init__(Event.ROT_CW)
-        self.fast = fast
-
-class EventRotCcwEvent(Event):
-    def __init__(self, fast=False):
-        super().__init__(Event.ROT_CCW)
-        self.fast = fast
-
-class RadioTunedEvent(Event):
-    def __init__(self, frequency, rssi, valid):
-        super().__init__(Event.TUNED)
-        self.frequency = frequency
-        self.rssi = rssi
-        self.valid = valid
-
-class BasicTuningEvent(Event):
-    def __init__(self, text):
-        super().__init__(Event.RDS_Basic_Tuning)
-        self.text = text
-
-class RadioTextEvent(Event):
-    def __init__(self, text):
-        super().__init__(Event.RDS_Radio_Text)
-        self.text = text
+# perf histogram names, by event type
+EVENT_NAMES = ("rot_cw", "rot_ccw", "rot_push", "rot_rel", "ko_push", "ko_rel", "tuned",
+               "rds_ps", "rds_rt", "mode_enter", "timeout", "seek_complete", "exit", "rds_pi")
 
 class EventsQueue:
-    def __init__(self, event_flag):
-        self.queue = deque((), 10)
+    # Fixed capacity ring of event records in one array. post() writes a
+    # record in place and may be called from a hard interrupt handler.
+    # pop() copies the oldest into the queue's Event, which stays valid
+    # until the next pop().
+    def __init__(self, event_flag, capacity=EVENTS_CAPACITY):
+        self.slots = array("i", [0]*(capacity*EVENT_SLOTS))
+        self.texts = [None]*capacity
+        self.event = Event(Event.EXIT)
+        # frequency of the last channel seen: a float only when it changes
+        self.channel = CHANNEL_NONE
+        self.frequency = 0.0
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
         self.event_flag = event_flag
 
-    def push(self, event):
-        self.queue.append(event)
+        self.posted = 0
+        self.drops = 0
+        self.high_water = 0
+        self.latency_max = 0    # post to pop, in us
+        self.latency_avg = 0
+        self.latency = [perf.histogram("event." + name) for name in EVENT_NAMES]
+
+    def post(self, event_type, channel=CHANNEL_NONE, rssi=0, valid=False, text=None, pi=0):
+        state = machine.disable_irq()
+        if self.count == self.capacity:
+            self.drops += 1
+            machine.enable_irq(state)
+            self.event_flag.set()
+            return False
+        index = self.head + self.count
+        if index >= self.capacity:
+            index -= self.capacity
+        slots = self.slots
+        base = index*EVENT_SLOTS
+        slots[base + SLOT_TYPE] = event_type
+        slots[base + SLOT_DELTA] = 1
+        slots[base + SLOT_ACCEL] = 1
+        slots[base + SLOT_CHANNEL] = channel
+        slots[base + SLOT_RSSI] = rssi
+        slots[base + SLOT_VALID] = 1 if valid else 0
+        slots[base + SLOT_PI] = pi
+        slots[base + SLOT_TS] = utime.ticks_us()
+        self.texts[index] = text
+        self.count += 1
+        self.posted += 1
+        if self.count > self.high_water:
+            self.high_water = self.count
+        machine.enable_irq(state)
         self.event_flag.set()
+        return True
 
     def pop(self):
-        if len(self.queue) == 0:
+        event = self.event
+        slots = self.slots
+        state = machine.disable_irq()
+        if self.count == 0:
+            machine.enable_irq(state)
             return None
-        return self.queue.popleft()
+        base = self.head*EVENT_SLOTS
+        event.type = slots[base + SLOT_TYPE]
+        event.delta = slots[base + SLOT_DELTA]
+        event.accel = slots[base + SLOT_ACCEL]
+        channel = slots[base + SLOT_CHANNEL]
+        event.rssi = slots[base + SLOT_RSSI]
+        event.valid = slots[base + SLOT_VALID] != 0
+        event.pi = slots[base + SLOT_PI]
+        event.ts = slots[base + SLOT_TS]
+        event.text = self.texts[self.head]
+        self.texts[self.head] = None
+        self.head += 1
+        if self.head == self.capacity:
+            self.head = 0
+        self.count -= 1
+        machine.enable_irq(state)
+
+        event.channel = channel
+        if channel == CHANNEL_NONE:
+            event.frequency = 0.0
+        else:
+            if channel != self.channel:
+                self.channel = channel
+                self.frequency = 87.5 + channel/10.0
+            event.frequency = self.frequency
+        latency = utime.ticks_diff(utime.ticks_us(), event.ts)
+        if latency > self.latency_max:
+            self.latency_max = latency
+        self.latency_avg += (latency - self.latency_avg) >> 3
+        self.latency[event.type].add(latency)
+        return event
+
+    def stats(self):
+        return {"posted": self.posted, "drops": self.drops, "high_water": self.high_water,
+                "latency_max_us": self.latency_max, "latency_avg_us": self.latency_avg}
+
+class EventRouter:
+    # Handlers subscribed to event types, in order of priority, higher
+    # first, equal ones in order of subscription. dispatch() looks up the
+    # route of the event type and calls its handlers until one consumes the
+    # event by returning None; the others return it. A route can be timed
+    # with a perf histogram.
+    def __init__(self):
+        self.routes = [[] for _ in EVENT_NAMES]
+        self.dispatched = 0
+        self.consumed = 0
+
+    def subscribe(self, event_types, handler, priority=0, timer=None):
+        for event_type in event_types:
+            route = self.routes[event_type]
+            index = len(route)
+            while index and route[index-1][0] < priority:
+                index -= 1
+            route.insert(index, (priority, handler, timer))
+
+    def unsubscribe(self, handler):
+        for route in self.routes:
+            for entry in [entry for entry in route if entry[1] == handler]:
+                route.remove(entry)
+
+    def dispatch(self, event):
+        self.dispatched += 1
+        for priority, handler, timer in self.routes[event.type]:
+            if timer is None:
+                consumed = handler(event) is None
+            else:
+                start = timer.start()
+                try:
+                    consumed = handler(event) is None
+                finally:
+                    timer.since(start)
+            if consumed:
+                self.consumed += 1
+                return True
+        return False
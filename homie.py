@@ -0,0 +1,203 @@
+# Homie 3.0 device over MQTTClient:
+#
+#   homie/<device>/$homie, $name, $state, $nodes, ...
+#   homie/<device>/<node>/$name, $type, $properties
+#   homie/<device>/<node>/<property>          value, retained
+#   homie/<device>/<node>/<property>/set      commands for settable ones
+#
+# The description and the current values are published on each connection,
+# node by node so it never overflows the client queue. After that only
+# changed values go out: publish() marks a property, run() sends the marked
+# ones whose payload differs from the last one sent, at most once per
+# DELTA_MS, and the $stats every STATS_INTERVAL_S. The will sets $state to
+# lost.
+
+import json
+import utime
+import network
+import uasyncio as asyncio
+
+HOMIE_PREFIX = "homie"
+HOMIE_VERSION = "3.0.1"
+IMPLEMENTATION = "esp32 fm alarm clock"
+DELTA_MS = const(500)
+STATS_INTERVAL_S = const(60)
+
+def format_value(value):
+    if value is None:
+        return ""
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, (list, tuple)):
+        return json.dumps(value)
+    return str(value)
+
+def datatype_of(value):
+    if value is True or value is False:
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "float"
+    return "string"
+
+def homie_id(name):
+    # topic ids are lower case letters, digits and hyphens
+    return name.lower().replace("_", "-").replace(" ", "-")
+
+class HomieProperty:
+    def __init__(self, node, prop_id, name, datatype, settable, handler, unit, format):
+        self.node = node
+        self.id = prop_id
+        self.name = name
+        self.datatype = datatype
+        self.settable = settable
+        # handler(property, payload string) for a /set command
+        self.handler = handler
+        self.unit = unit
+        self.format = format
+        self.value = None
+        self.sent = None        # payload last published
+        self.topic = "{}/{}".format(node.topic, prop_id)
+
+    def attributes(self):
+        yield "$name", self.name
+        yield "$datatype", self.datatype
+        if self.settable:
+            yield "$settable", "true"
+        if self.unit is not None:
+            yield "$unit", self.unit
+        if self.format is not None:
+            yield "$format", self.format
+
+class HomieNode:
+    def __init__(self, device, node_id, name, node_type):
+        self.device = device
+        self.id = node_id
+        self.name = name
+        self.type = node_type
+        self.properties = {}
+        self.topic = "{}/{}".format(device.topic, node_id)
+
+    def add_property(self, prop_id, name, datatype="string", settable=False, handler=None, unit=None, format=None):
+        prop = HomieProperty(self, prop_id, name, datatype, settable, handler, unit, format)
+        self.properties[prop_id] = prop
+        return prop
+
+class HomieDevice:
+    def __init__(self, client, device_id, name, fw_name, fw_version, prefix=HOMIE_PREFIX):
+        self.client = client
+        self.id = device_id
+        self.name = name
+        self.fw_name = fw_name
+        self.fw_version = fw_version
+        self.topic = "{}/{}".format(prefix, device_id)
+        self.nodes = {}
+        self.state = "init"
+        self.dirty = []
+        self.flag = asyncio.Event()
+        # $stats/<name> -> function returning the value
+        self.stats = {}
+        self.start_ms = utime.ticks_ms()
+        client.set_last_will(self.topic + "/$state", "lost", True)
+        client.subscribe(self.topic + "/+/+/set", self._on_set)
+        client.on_connect = self.announce
+
+        self.announces = 0
+        self.deltas = 0
+
+    def add_node(self, node_id, name, node_type):
+        node = HomieNode(self, node_id, name, node_type)
+        self.nodes[node_id] = node
+        return node
+
+    def add_stat(self, name, function):
+        self.stats[name] = function
+
+    def publish(self, prop, value):
+        # new value of a property, sent with the next delta; offline the
+        # next announce sends it
+        prop.value = value
+        if prop not in self.dirty:
+            self.dirty.append(prop)
+            self.flag.set()
+
+    async def run(self):
+        asyncio.create_task(self._publish_stats())
+        while True:
+            await self.flag.wait()
+            await asyncio.sleep_ms(DELTA_MS)
+            self.flag.clear()
+            if self.state != "ready" or not self.client.connected:
+                # kept for after the next announce
+                continue
+            dirty = self.dirty
+            while dirty:
+                prop = dirty.pop(0)
+                payload = format_value(prop.value)
+                if payload != prop.sent:
+                    self.client.publish(prop.topic, payload, True)
+                    prop.sent = payload
+                    self.deltas += 1
+
+    async def _publish_stats(self):
+        while True:
+            await asyncio.sleep(STATS_INTERVAL_S)
+            if self.state == "ready" and self.client.connected:
+                self._send_stats()
+
+    def _send_stats(self):
+        client = self.client
+        uptime = utime.ticks_diff(utime.ticks_ms(), self.start_ms) // 1000
+        client.publish(self.topic + "/$stats/uptime", str(uptime), True)
+        for name, function in self.stats.items():
+            client.publish("{}/$stats/{}".format(self.topic, name), format_value(function()), True)
+
+    async def announce(self):
+        client = self.client
+        topic = self.topic
+        self.state = "init"
+        client.publish(topic + "/$state", "init", True)
+        client.publish(topic + "/$homie", HOMIE_VERSION, True)
+        client.publish(topic + "/$name", self.name, True)
+        client.publish(topic + "/$implementation", IMPLEMENTATION, True)
+        # the address may change between two connections
+        wlan = network.WLAN(network.STA_IF)
+        client.publish(topic + "/$localip", wlan.ifconfig()[0], True)
+        client.publish(topic + "/$mac", ":".join(["{:02X}".format(byte) for byte in wlan.config("mac")]), True)
+        client.publish(topic + "/$fw/name", self.fw_name, True)
+        client.publish(topic + "/$fw/version", self.fw_version, True)
+        client.publish(topic + "/$nodes", ",".join(self.nodes), True)
+        client.publish(topic + "/$stats", ",".join(["uptime"] + list(self.stats)), True)
+        client.publish(topic + "/$stats/interval", str(STATS_INTERVAL_S), True)
+        await client.flush()
+        for node in self.nodes.values():
+            client.publish(node.topic + "/$name", node.name, True)
+            client.publish(node.topic + "/$type", node.type, True)
+            client.publish(node.topic + "/$properties", ",".join(node.properties), True)
+            await client.flush()
+            for prop in node.properties.values():
+                for attribute, value in prop.attributes():
+                    client.publish("{}/{}".format(prop.topic, attribute), value, True)
+                prop.sent = format_value(prop.value)
+                client.publish(prop.topic, prop.sent, True)
+                await client.flush()
+        if client.connected:
+            self.state = "ready"
+            client.publish(topic + "/$state", "ready", True)
+            self._send_stats()
+            self.announces += 1
+            # changes made while announcing
+            self.flag.set()
+
+    def _on_set(self, topic, payload):
+        parts = topic.split("/")
+        node = self.nodes.get(parts[-3])
+        if node is None:
+            return
+        prop = node.properties.get(parts[-2])
+        if prop is None or not prop.settable or prop.handler is None:
+            return
+        prop.handler(prop, str(payload, "utf-8"))
@@ -1,20 +1,35 @@
-import json
 import gc
+import perf
 from si4703 import SI4703
 from rotary import RotaryEncoder
 from event import *
+from widget import Widget, RenderScheduler, swap565
+from surface import Surface
+from store import StateStore
+from alarm import AlarmScheduler, DAYS_EVERY, DAYS_PRESETS, days_name
+from mqtt import MQTTClient
+from homie import HomieDevice, homie_id, datatype_of
+from scan import BandScanner
+from monitor import LoopMonitor
+from timesync import TimeSync
+from stations import StationIndex, STORE_NAME as STATIONS_STORE_NAME, ENTRY_PI, ENTRY_PS
 
 from machine import I2C, Pin, SPI
+import machine
+import binascii
 
 import st7789
+import framebuf
 import vga2_bold_16x32
 import vga2_8x8
 import vga2_8x16
-import ntptime
 import utime
 import uasyncio as asyncio
 import micropython as upy
 
+# tracebacks from hard interrupt handlers
+upy.alloc_emergency_exception_buf(100)
+
 # display
 # BLK 19
 # A 26
@@ -41,6 +56,364 @@ RADIO_NAME_Y = const(SCREEN_HEIGHT-32-32-32)
 RADIO_TEXT_X = const(0)
 RADIO_TEXT_Y = const(SCREEN_HEIGHT-32-32)
 
+# radio text scrolling: each step resends the line, so the step rate sets
+# the SPI load. A glyph every 250 ms, 64 pixels per second, is the 4 line
+# blits a second the character scroller sent, in one window each
+RDS_RT_LEN = const(64)
+SCROLL_GAP_CHARS = const(4)
+SCROLL_STRIP_CHARS = const(RDS_RT_LEN+SCROLL_GAP_CHARS+16)
+SCROLL_STEP_PX = const(16)
+SCROLL_FRAME_MS = const(250)
+SCROLL_HOLD_MS = const(2000)    # pause on the start of the text
+
+# firmware as announced to the Homie controllers
+FIRMWARE_NAME = "fmclock"
+FIRMWARE_VERSION = "1.0.0"
+
+# MQTT broker, an address avoids a blocking name lookup
+MQTT_HOST = "192.168.1.10"
+MQTT_PORT = const(1883)
+
+# NTP server: a name is looked up once, blocking, an address is not
+NTP_HOST = "fr.pool.ntp.org"
+
+# perf histograms to the broker, under homie/<device>/$perf
+PERF_PUBLISH_S = const(300)
+
+# event routes, higher first: the volume grab and the alarm dismiss take
+# their events before the selected app
+ROUTE_RADIO = const(2)
+ROUTE_ALARM = const(1)
+ROUTE_APPS = const(0)
+
+# compose offscreen: the mini panels, a 4.6 KB buffer, go in one blit
+# instead of a window per text. The main area takes 52 KB more and sends
+# more bytes than it draws for the station list and the alarm screen.
+OFFSCREEN_MINI = True
+OFFSCREEN = False
+
+CLOCK_X = const(16)
+CLOCK_Y = const(SCREEN_HEIGHT-32)
+CLOCK_TIME_X = const(MINI_SPLIT_X-8*16-32)
+
+class StationInfo(Widget):
+    # frequency and signal strength, left of the station name
+    def __init__(self):
+        super().__init__(0, RADIO_NAME_Y, RADIO_NAME_X, 32)
+        self.frequency = None
+        self.rssi = 0
+
+    def set(self, frequency, rssi):
+        self.frequency = frequency
+        self.rssi = rssi
+        self.invalidate()
+
+    def clear(self):
+        self.frequency = None
+        self.invalidate()
+
+    def draw(self, display):
+        display.fill_rect(self.x, self.y, self.width, self.height, Application.background)
+        if self.frequency is None:
+            return
+        display.text(vga2_8x16, "{:>5.1f} MHz".format(self.frequency), self.x, self.y, st7789.WHITE)
+        ctr = 0
+        levels = [10, 20, 30, 40]
+        while ctr < 4 and self.rssi >= levels[ctr]:
+            display.vline(self.x+24+2*ctr, self.y+32-4-4*ctr, 4*ctr+4, Application.foreground)
+            ctr += 1
+        display.text(vga2_8x16, "{}".format(self.rssi), self.x, self.y + 16, st7789.WHITE)
+
+class StationName(Widget):
+    # a name from the station index is grey until RDS confirms it
+    cached_color = st7789.color565(128, 128, 128)
+
+    def __init__(self):
+        super().__init__(RADIO_NAME_X, RADIO_NAME_Y, MINI_SPLIT_X-RADIO_NAME_X, 32)
+        self.text = None
+        self.confirmed = True
+
+    def set(self, text, confirmed=True):
+        if text == self.text and confirmed == self.confirmed:
+            return
+        self.text = text
+        self.confirmed = confirmed
+        self.invalidate()
+
+    def draw(self, display):
+        width = 0
+        if self.text is not None:
+            color = st7789.WHITE if self.confirmed else StationName.cached_color
+            display.text(vga2_bold_16x32, self.text, self.x, self.y, color, st7789.BLACK)
+            width = 16*len(self.text)
+        if width < self.width:
+            display.fill_rect(self.x+width, self.y, self.width-width, self.height, Application.background)
+
+class RadioTextLine(Widget):
+    # The radio text is rendered once, 1 bit per pixel, into an offscreen
+    # strip: text, a gap, then the head of the text again so the window
+    # wraps without a seam. A text wider than the line scrolls by
+    # SCROLL_STEP_PX every SCROLL_FRAME_MS: each step expands the window
+    # of the strip into the line buffer and sends the rows with ink in one
+    # blit, the others are cleared once per text. Without the memory for
+    # the buffers the text scrolls by characters with the display font.
+    # run() is the only task, it waits while nothing scrolls.
+    def __init__(self):
+        super().__init__(RADIO_TEXT_X, RADIO_TEXT_Y, MINI_SPLIT_X, 32)
+        font = vga2_bold_16x32
+        self.font = font
+        self.glyph_size = font.WIDTH//8*font.HEIGHT
+        self.strip_stride = SCROLL_STRIP_CHARS*font.WIDTH//8
+        try:
+            self.strip_buf = bytearray(self.strip_stride*font.HEIGHT)
+            self.strip = framebuf.FrameBuffer(self.strip_buf, SCROLL_STRIP_CHARS*font.WIDTH, font.HEIGHT, framebuf.MONO_HLSB)
+            self.line_buf = bytearray(self.width*self.height*2)
+            self.step = SCROLL_STEP_PX
+            self.frame_ms = SCROLL_FRAME_MS
+        except MemoryError:
+            self.strip_buf = self.line_buf = self.strip = None
+            self.step = font.WIDTH
+            self.frame_ms = SCROLL_FRAME_MS*font.WIDTH//SCROLL_STEP_PX
+        self.line = None
+        self.line_view = None
+        self.top = 0            # first row with ink
+        self.rows = 0
+        self.palette = framebuf.FrameBuffer(bytearray(4), 2, 1, framebuf.RGB565)
+        self.palette.pixel(0, 0, swap565(Application.background))
+        self.palette.pixel(1, 0, swap565(st7789.WHITE))
+        self.text = None
+        self.shown = None       # text as laid out in the strip
+        self.offset = 0
+        self.wrap = 0           # strip width of one turn, 0 if the text fits
+        self.hold = 0           # steps left before moving
+        self.clear = True       # rows without ink to clear on the next draw
+        self.flag = asyncio.Event()
+        self.frames = 0
+
+    def set(self, text):
+        if text is None:
+            self.text = None
+            self.wrap = 0
+            self.clear = True
+            self.invalidate()
+            return
+        text = text.strip()
+        if text == self.text:
+            return
+        self.text = text
+        chars = self.width//self.font.WIDTH
+        if len(text) > chars:
+            text = text[:RDS_RT_LEN]
+            self.shown = text + " "*SCROLL_GAP_CHARS + text[:chars+1]
+            self.wrap = (len(text)+SCROLL_GAP_CHARS)*self.font.WIDTH
+            self.hold = SCROLL_HOLD_MS//self.frame_ms
+            self.flag.set()
+        else:
+            self.shown = text
+            self.wrap = 0
+        if self.strip is not None:
+            self.strip.fill(0)
+            self.render(self.shown)
+            self.ink_rows()
+        self.offset = 0
+        self.clear = True
+        self.invalidate()
+
+    def render(self, text):
+        # glyph rows are whole bytes: copied row by row into the strip
+        font = self.font
+        row_bytes = font.WIDTH//8
+        stride = self.strip_stride
+        strip = self.strip_buf
+        glyphs = font.FONT
+        for index, code in enumerate(text.encode()):
+            if index >= SCROLL_STRIP_CHARS:
+                break
+            if code < font.FIRST or code > font.LAST:
+                continue
+            src = (code-font.FIRST)*self.glyph_size
+            dst = index*row_bytes
+            for row in range(font.HEIGHT):
+                strip[dst:dst+row_bytes] = glyphs[src:src+row_bytes]
+                src += row_bytes
+                dst += stride
+
+    def ink_rows(self):
+        # the line buffer is cut down to the strip rows with a pixel set
+        stride = self.strip_stride
+        strip = self.strip_buf
+        top = bottom = 0
+        for row in range(self.font.HEIGHT):
+            if any(strip[row*stride:(row+1)*stride]):
+                if bottom == 0:
+                    top = row
+                bottom = row + 1
+        self.top = top
+        self.rows = bottom - top
+        if self.rows:
+            self.line = framebuf.FrameBuffer(self.line_buf, self.width, self.rows, framebuf.RGB565)
+            self.line_view = memoryview(self.line_buf)[:self.width*self.rows*2]
+
+    async def run(self):
+        while True:
+            if not self.wrap:
+                self.flag.clear()
+                await self.flag.wait()
+                continue
+            await asyncio.sleep_ms(self.frame_ms)
+            if self.hold:
+                self.hold -= 1
+                continue
+            self.offset += self.step
+            if self.offset >= self.wrap:
+                self.offset -= self.wrap
+                self.hold = SCROLL_HOLD_MS//self.frame_ms
+            self.invalidate()
+
+    def draw(self, display):
+        if self.text is None:
+            display.fill_rect(self.x, self.y, self.width, self.height, Application.background)
+            self.clear = False
+            return
+        if self.strip is None:
+            chars = self.width//self.font.WIDTH
+            start = self.offset//self.font.WIDTH
+            text = self.shown[start:start+chars]
+            display.text(self.font, text + " "*(chars-len(text)), self.x, self.y, st7789.WHITE, Application.background)
+        else:
+            if self.clear:
+                display.fill_rect(self.x, self.y, self.width, self.height, Application.background)
+            if self.rows:
+                self.line.blit(self.strip, -self.offset, -self.top, -1, self.palette)
+                display.blit_buffer(self.line_view, self.x, self.y+self.top, self.width, self.rows)
+        self.clear = False
+        self.frames += 1
+
+# one character strings for the clock cells, indexed by code - 0x20
+CLOCK_CHARS = tuple(chr(c) for c in range(0x20, 0x3B))
+
+CLOCK_CELLS = const(18)    # "DD/MM", " YYYY", "HH:MM:SS"
+
+def put_2digits(cells, index, value):
+    cells[index] = 0x30 + value//10
+    cells[index+1] = 0x30 + value%10
+
+class ClockFace(Widget):
+    # Keeps the characters on screen in a buffer and redraws only the cells
+    # that changed: a normal tick is one 16x32 cell and no string.
+    def __init__(self):
+        super().__init__(CLOCK_X, CLOCK_Y, MINI_SPLIT_X-CLOCK_X, 32)
+        self.cells = bytearray(b"  /   0000  :  :  ")
+        self.shown = bytearray(CLOCK_CELLS)
+        self.redraw()
+
+    def redraw(self):
+        for i in range(CLOCK_CELLS):
+            self.shown[i] = 0xFF
+        self.invalidate()
+
+    def set_time(self, tm):
+        cells = self.cells
+        put_2digits(cells, 0, tm[2])
+        put_2digits(cells, 3, tm[1])
+        put_2digits(cells, 6, tm[0]//100)
+        put_2digits(cells, 8, tm[0]%100)
+        put_2digits(cells, 10, tm[3])
+        put_2digits(cells, 13, tm[4])
+        put_2digits(cells, 16, tm[5])
+        if cells != self.shown:
+            self.invalidate()
+
+    def draw(self, display):
+        cells = self.cells
+        shown = self.shown
+        for i in range(CLOCK_CELLS):
+            code = cells[i]
+            if code == shown[i]:
+                continue
+            shown[i] = code
+            if i < 5:
+                display.text(vga2_8x16, CLOCK_CHARS[code-0x20], self.x+8*i, self.y, st7789.WHITE, st7789.BLACK)
+            elif i < 10:
+                display.text(vga2_8x16, CLOCK_CHARS[code-0x20], self.x+8*(i-5), self.y+16, st7789.WHITE, st7789.BLACK)
+            else:
+                display.text(vga2_bold_16x32, CLOCK_CHARS[code-0x20], CLOCK_TIME_X+16*(i-10), self.y, st7789.WHITE, st7789.BLACK)
+
+class MiniPanel(Widget):
+    def __init__(self, app):
+        super().__init__(app.mini_coords.x, app.mini_coords.y, SCREEN_WIDTH-app.mini_coords.x-MINI_APP_X_MARGIN, MINI_APP_INNER_HEIGHT)
+        self.app = app
+
+    def draw(self, display):
+        # composed offscreen when there is room for it, sent in one blit
+        surface = self.app.main_app.mini_surface
+        if surface is None:
+            self.app.draw_mini(display)
+            return
+        surface.display = display
+        surface.move(self.x, self.y)
+        self.app.draw_mini(surface)
+        surface.draw(display)
+
+class ModeBar(Widget):
+    # mode names of the selected app and the arrow under the current one,
+    # the arrow moves without redrawing the names
+    def __init__(self):
+        super().__init__(0, 0, MINI_SPLIT_X, 16)
+        self.app = None
+        self.selected = None
+        self.arrow = False
+        self.names_dirty = False
+        self.drawn_app = None
+        self.drawn_arrow = -1
+
+    def show(self, app, selected=None):
+        self.app = app
+        self.selected = selected
+        self.arrow = True
+        self.names_dirty = True
+        self.invalidate()
+
+    def set_arrow(self, on):
+        self.arrow = on
+        self.invalidate()
+
+    def hide(self):
+        self.app = None
+        self.arrow = False
+        self.names_dirty = True
+        self.invalidate()
+
+    def arrow_x(self, index):
+        x = 8
+        for mode in self.app.modes[:index]:
+            x += len(mode.name)*8 + 16
+        return x
+
+    def draw(self, display):
+        if self.names_dirty:
+            self.names_dirty = False
+            if self.drawn_app is not self.app:
+                display.fill_rect(self.x, self.y, self.width, self.height, Application.background)
+                self.drawn_app = self.app
+                self.drawn_arrow = -1
+            if self.app is not None:
+                x = 0
+                for ctr, mode in enumerate(self.app.modes):
+                    mode.pre_display_mode()
+                    if ctr == self.selected:
+                        display.text(vga2_8x8, mode.name, x, 0, Application.background, Application.foreground)
+                    else:
+                        display.text(vga2_8x8, mode.name, x, 0, Application.foreground)
+                    x += len(mode.name)*8 + 16
+        arrow = self.app.mode_index if self.app is not None and self.arrow else -1
+        if arrow != self.drawn_arrow:
+            if self.drawn_arrow >= 0:
+                display.text(vga2_8x8, " ", self.arrow_x(self.drawn_arrow), 8, Application.foreground)
+            if arrow >= 0:
+                display.text(vga2_8x8, "\x1e", self.arrow_x(arrow), 8, Application.foreground)
+            self.drawn_arrow = arrow
+
 class RadioManager:
     def __init__(self, radio):
         self.radio = radio
@@ -49,16 +422,26 @@ class RadioManager:
         self.setting_volume = False
         self.volume_set = False
 
-        self.scroll_timer = None
-        self.scroll_text = ""
-        self.scroll_pos = 0
+        self.station_info = StationInfo()
+        self.station_name = StationName()
+        self.radio_text = RadioTextLine()
+        self.scanner = BandScanner(radio)
 
     def set_main_app(self, main_app):
         self.main_app = main_app
         self.radio_app = main_app.radio_app
+        self.station_index = main_app.station_index
+        for widget in (self.station_info, self.station_name, self.radio_text):
+            main_app.renderer.add(widget)
+        handler_time = perf.histogram("handler.radio_manager")
+        main_app.router.subscribe((Event.TUNED, Event.RDS_PI, Event.RDS_Basic_Tuning, Event.RDS_Radio_Text),
+                                  self.station_event, ROUTE_RADIO, handler_time)
+        main_app.router.subscribe((Event.ROT_PUSH, Event.ROT_REL, Event.ROT_CW, Event.ROT_CCW),
+                                  self.volume_event, ROUTE_RADIO, handler_time)
 
     def set_volume(self, volume):
         self.radio.set_volume(volume)
+        self.radio_app.volume = self.radio.get_volume()
         self.radio_app.display_mini()
 
     def set_radio_on(self, on):
@@ -75,12 +458,14 @@ class RadioManager:
             self.radio.mute(True)
             self.clean_and_stop_scroll()
             self.radio_on = False
+        self.radio_app.on = self.radio_on
         self.radio_app.display_mini()
 
     def clean_and_stop_scroll(self):
-        if self.scroll_timer is not None:
-            self.scroll_timer.cancel()
-        self.main_app.display.fill_rect(0, RADIO_NAME_Y, MINI_SPLIT_X, 64, st7789.BLACK)
+        self.station_info.clear()
+        self.station_name.set(None)
+        self.radio_text.set(None)
+        self.radio_app.station = ""
 
     def tune_to(self, frequency):
         self.clean_and_stop_scroll()
@@ -112,125 +497,168 @@ class RadioManager:
         self.radio_app.sleep_time = delay_minutes
         self.delay_task = asyncio.create_task(delayed_task())
 
-    def do_scroll_text(self, first=False):
-        async def scroll_timer_handler(self, first):
-            self.main_app.display.text(vga2_bold_16x32, self.scroll_text[self.scroll_pos:self.scroll_pos+14], RADIO_TEXT_X, RADIO_TEXT_Y, st7789.WHITE, st7789.BLACK)
-            await asyncio.sleep(2 if first else .250)
-            self.scroll_pos +=1
-            if self.scroll_pos > len(self.scroll_text)-14:
-                self.scroll_pos = 0
-                self.do_scroll_text(True)
+    def station_event(self, event):
+        # the station index learns from every tune, the screen only shows
+        # it with the radio on. The tunes of a scan are the scanner's: the
+        # radio keeps its frequency and the screen its station
+        index = self.station_index
+        scanning = self.scanner.running
+        if event.type == Event.TUNED:
+            if not scanning:
+                self.radio_app.frequency = round(event.frequency, 1)
+            index.heard(event.frequency, event.rssi)
+        elif event.type == Event.RDS_PI:
+            entry = index.get(event.frequency)
+            if entry is None or entry[ENTRY_PI] != event.pi:
+                # another program on the channel: maybe heard elsewhere
+                other = index.find_pi(event.pi)
+                entry = index.update(event.frequency, pi=event.pi, ps=None if other is None else other[ENTRY_PS])
+        elif event.type == Event.RDS_Basic_Tuning:
+            # valid once the PS held for a while, only then saved
+            if event.valid:
+                index.update(event.frequency, ps=event.text, pty=self.radio.rds.pty)
             else:
-                self.do_scroll_text(False)
-        self.scroll_timer = asyncio.create_task(scroll_timer_handler(self, first))
-
-    def handle_event(self, event):
-        if self.radio_on:
+                index.update(event.frequency, ps=event.text, save=False)
+        if self.radio_on and not scanning:
             if event.type == Event.TUNED:
                 self.radio.enable_rds(True)  # Enable RDS when tuned
-                freq_str = "{:>5.1f} MHz".format(event.frequency)
-                rssi_str = "{}".format(event.rssi)
-                self.main_app.display.fill_rect(0, RADIO_NAME_Y, RADIO_NAME_X, 32, st7789.BLACK)
-                self.main_app.display.text(vga2_8x16, freq_str, 0, RADIO_NAME_Y, st7789.WHITE)
-                ctr = 0
-                levels = [10, 20, 30, 40]
-                while ctr < 4 and event.rssi >= levels[ctr]:
-                    self.main_app.display.vline(24+2*ctr, RADIO_NAME_Y+32-4-4*ctr, 4*ctr+4, Application.foreground)
-                    ctr += 1
-                self.main_app.display.text(vga2_8x16, rssi_str, 0, RADIO_NAME_Y + 16, st7789.WHITE)
+                self.station_info.set(event.frequency, event.rssi)
+                name = index.name(event.frequency)
+                self.station_name.set(name, False)
+                self.radio_app.station = "" if name is None else name.strip()
+            elif event.type == Event.RDS_PI:
+                self.station_name.set(entry[ENTRY_PS], True)
+                self.radio_app.station = "" if entry[ENTRY_PS] is None else entry[ENTRY_PS].strip()
             elif event.type == Event.RDS_Basic_Tuning:
-                self.main_app.display.text(vga2_bold_16x32, event.text, RADIO_NAME_X, RADIO_NAME_Y, st7789.WHITE, st7789.BLACK)
+                self.station_name.set(event.text)
+                self.radio_app.station = event.text.strip()
             elif event.type == Event.RDS_Radio_Text:
-                if self.scroll_timer is not None:
-                    self.scroll_timer.cancel()
-                if len(event.text) > 14:
-                    self.scroll_text = event.text.strip()+" "*14
-                    self.scroll_pos = 0
-                    self.do_scroll_text(True)
-            # volume setting handling when radio is on
-            # priority over app handling
-            # pushing rotary button without rotation is considered as a normal click.
-            elif event.type == Event.ROT_PUSH:
-                if self.radio_on:
-                    self.setting_volume = True
-                    return None
-            elif self.setting_volume:
-                if event.type == Event.ROT_REL and self.volume_set:
-                    self.setting_volume = False
-                    self.volume_set = False
-                    return None
-                elif event.type == Event.ROT_REL:
-                    # volume was not set, so consider as normal click
-                    self.setting_volume = False
-                elif event.type == Event.ROT_CW :
-                    # volume adjustment
-                    self.set_volume(self.radio.get_volume() + (1 if not event.fast else 5))
-                    self.volume_set = True
-                    return None
-                elif event.type == Event.ROT_CCW:
-                    # volume adjustment
-                    self.set_volume(self.radio.get_volume() - (1 if not event.fast else 5))
-                    self.volume_set = True
-                    return None
+                self.radio_text.set(event.text)
+        return event
+
+    def volume_event(self, event):
+        # volume setting when radio is on, priority over app handling
+        # pushing rotary button without rotation is considered as a normal click.
+        if not self.radio_on:
+            return event
+        if event.type == Event.ROT_PUSH:
+            self.setting_volume = True
+            return None
+        elif self.setting_volume:
+            if event.type == Event.ROT_REL and self.volume_set:
+                self.setting_volume = False
+                self.volume_set = False
+                return None
+            elif event.type == Event.ROT_REL:
+                # volume was not set, so consider as normal click
+                self.setting_volume = False
+            elif event.type == Event.ROT_CW :
+                # volume adjustment
+                self.set_volume(self.radio.get_volume() + event.delta*event.accel)
+                self.volume_set = True
+                return None
+            elif event.type == Event.ROT_CCW:
+                # volume adjustment
+                self.set_volume(self.radio.get_volume() - event.delta*event.accel)
+                self.volume_set = True
+                return None
         return event
 
 
 class Clock:
-    def __init__(self, main_app, radio_mgr, alarms, settings_app):
+    def __init__(self, main_app, radio_mgr, settings_app):
         self.display = main_app.display
         self.radio_mgr = radio_mgr
-        self.alarms = alarms
+        self.scheduler = main_app.alarm_scheduler
+        self.timesync = main_app.timesync
         self.settings_app = settings_app
+        self.face = main_app.renderer.add(ClockFace())
+        # from the alarm time to the ring, by the disciplined clock
+        self.alarm_late = perf.histogram("alarm.late")
+        main_app.router.subscribe((Event.KO_REL, Event.ROT_REL), self.alarm_event, ROUTE_ALARM, perf.histogram("handler.clock"))
 
     async def update_time(self):
+        scheduler = self.scheduler
+        timesync = self.timesync
+        zone = None
+        last = 0
         while True:
             # print (upy.mem_info())
-            tm = utime.localtime()
-            tm = self.apply_tz(tm)
-            for alarm in self.alarms:
-                if alarm.active and alarm.wakeup is not None:
-                    if [tm[3], tm[4]] == alarm.wakeup and alarm.last_ring_date != tm[:3] and not alarm.ringing:
-                        alarm.last_ring_date = tm[:3]
-                        alarm.ringing = True
-                        self.radio_mgr.set_radio_on(True)
-                        asyncio.create_task(self.volume_ramp_up_and_ring(alarm))
-                        print("Alarm ringing!")
-            self.show_time(tm)
-            await asyncio.sleep_ms(1000-(utime.ticks_ms()%1000))
-
-    def apply_tz(self, tm):
-        tm = list(tm)
-        tm[3] = (tm[3]+self.settings_app.zone)%24
-        return tm
+            seconds, ms = timesync.now()
+            now = seconds + 3600*self.settings_app.zone
+            if zone != self.settings_app.zone or now < last or now > last + 5:
+                # first run, clock set or time zone changed
+                zone = self.settings_app.zone
+                scheduler.reschedule_all(now)
+            else:
+                scheduler.update(now)
+            last = now
+            fire = scheduler.next_time()
+            while fire is not None and fire <= now:
+                self.alarm_late.add(((now - fire)*1000 + ms)*1000)
+                self.ring(scheduler.pop_due(now), now)
+                fire = scheduler.next_time()
+            self.show_time(utime.localtime(now))
+            # woken on the second after the one shown, by the disciplined time
+            later, ms = timesync.now()
+            await asyncio.sleep_ms(max(0, (seconds + 1 - later)*1000 - ms))
+
+    def local_time(self):
+        return utime.localtime(self.timesync.time() + 3600*self.settings_app.zone)
 
     def show_time(self, tm):
-        self.display.text(vga2_8x16, "{:02}/{:02}".format(tm[2], tm[1]), 16, 240-32, st7789.WHITE, st7789.BLACK)
-        self.display.text(vga2_8x16, " {:04}".format(tm[0]), 16, 240-16, st7789.WHITE, st7789.BLACK)
-        time_str = "{:02}:{:02}:{:02}".format(tm[3], tm[4], tm[5])
-        self.display.text(vga2_bold_16x32, time_str, MINI_SPLIT_X-8*16-32, 240-32, st7789.WHITE, st7789.BLACK)
+        self.face.set_time(tm)
+
+    def ring(self, alarm, now):
+        tm = utime.localtime(now)
+        alarm.last_ring_date = [tm[0], tm[1], tm[2]]
+        if not alarm.days:
+            alarm.active = False    # one shot
+        self.scheduler.ringing.add(alarm)
+        self.radio_mgr.set_radio_on(True)
+        asyncio.create_task(self.volume_ramp_up_and_ring(alarm))
+        print("Alarm ringing!")
 
     async def volume_ramp_up_and_ring(self, alarm):
         # Let it ring for 60 minutes
         self.radio_mgr.delayed_off(60)
         for vol in range(1, alarm.volume + 1):
             if not self.radio_mgr.radio_on:
-                alarm.ringing = False
-                return
+                break
             self.radio_mgr.set_volume(vol)
             await asyncio.sleep(5)
+        while self.radio_mgr.radio_on and alarm in self.scheduler.ringing:
+            await asyncio.sleep(1)
+        self.scheduler.ringing.discard(alarm)
 
-    def handle_event(self, event):
-        ringing_alarms = list(filter(lambda x: x.ringing, self.alarms))
-        if len(ringing_alarms):
+    def alarm_event(self, event):
+        # a ringing alarm takes the knob and the button
+        ringing = self.scheduler.ringing
+        if ringing:
             if event.type == Event.KO_REL:
                 return None
-            elif event.tpye == Event.ROT_REL:
-                for alarm in ringing_alarms:
-                    alarm.ringing = False
+            elif event.type == Event.ROT_REL:
+                ringing.clear()
                 self.radio_mgr.set_radio_on(False)
                 return None
         return event
 
+class BootPhases:
+    # milliseconds from power on to the end of each startup phase
+    def __init__(self):
+        self.phases = []
+
+    def mark(self, name):
+        ms = utime.ticks_ms()
+        self.phases.append((name, ms))
+        print("boot: {} at {} ms".format(name, ms))
+
+    def get(self, name):
+        for phase, ms in self.phases:
+            if phase == name:
+                return ms
+        return None
+
 class Point:
     def __init__(self, x, y):
         self.x = x
@@ -251,7 +679,8 @@ class Application:
         self.modes = modes
         self.mode_index = 0
         self.selected_mode = None
-        self.need_save = False
+        self.mini = main_app.renderer.add(MiniPanel(self))
+        self.handler_time = perf.histogram("handler.app." + homie_id(name))
 
     def get_fg_bg_color(self, alt=None):
         if (alt is not None and alt) or (alt is None and self.selected):
@@ -260,29 +689,18 @@ class Application:
             return Application.foreground, Application.background
 
     def display_mini(self):
+        self.mini.invalidate()
+
+    def draw_mini(self, display):
         fg, bg = self.get_fg_bg_color()
-        self.display.fill_rect(self.mini_coords.x, self.mini_coords.y, 320-self.mini_coords.x-MINI_APP_X_MARGIN, MINI_APP_INNER_HEIGHT, bg)
-        self.display.text(vga2_8x8, self.name, self.mini_coords.x, self.mini_coords.y, fg, bg)
+        display.fill_rect(self.mini_coords.x, self.mini_coords.y, 320-self.mini_coords.x-MINI_APP_X_MARGIN, MINI_APP_INNER_HEIGHT, bg)
+        display.text(vga2_8x8, self.name, self.mini_coords.x, self.mini_coords.y, fg, bg)
 
     def display_arrow_mode(self, clear_all=False):
-        x = 8
-        for ctr, mode in enumerate(self.modes):
-            if ctr == self.mode_index and not clear_all:
-                self.display.text(vga2_8x8, "\x1e", x, 8, Application.foreground)
-            else:
-                self.display.text(vga2_8x8, " ", x, 8, Application.foreground)
-            x += len(mode.name)*8 + 16
+        self.main_app.mode_bar.set_arrow(not clear_all)
 
     def display_modes(self, selected=None):
-        x = 0
-        for ctr, mode in enumerate(self.modes):
-            mode.pre_display_mode()
-            if selected is not None and ctr == selected:
-                self.display.text(vga2_8x8, mode.name, x, 0, Application.background, Application.foreground)
-            else:
-                self.display.text(vga2_8x8, mode.name, x, 0, Application.foreground)
-            x += len(mode.name)*8 + 16
-        self.display_arrow_mode()
+        self.main_app.mode_bar.show(self, selected)
 
     def handle_event(self, event):
         if self.selected_mode is not None:
@@ -293,14 +711,10 @@ class Application:
                 self.display_modes()
         else:
             if event.type == Event.ROT_CW:
-                self.mode_index += 1
-                if self.mode_index > len(self.modes)-1:
-                    self.mode_index = 0
+                self.mode_index = (self.mode_index + event.delta) % len(self.modes)
                 self.display_arrow_mode()
             elif event.type == Event.ROT_CCW:
-                self.mode_index -= 1
-                if self.mode_index < 0:
-                    self.mode_index = len(self.modes)-1
+                self.mode_index = (self.mode_index - event.delta) % len(self.modes)
                 self.display_arrow_mode()
             elif event.type == Event.ROT_REL:
                 #switch mode
@@ -311,26 +725,38 @@ class Application:
                 self.handle_event(Event(Event.MODE_ENTER))
                 return None
             elif event.type == Event.KO_PUSH:
-                self.display.fill_rect(0, 0, MINI_SPLIT_X, 16, Application.background)
+                self.main_app.mode_bar.hide()
                 self.selected_mode = None
                 self.display_mini()
-                self.display_arrow_mode(clear_all=True)
                 self.main_app.post_exit_event()
                 return None
         return self
 
     def __setattr__(self, name, value):
+        # saved attributes are handed to the store, which writes the ones
+        # that changed a little later; saved and published ones to the homie
+        # device, which sends the ones that changed as a delta
         if name in self.__dict__.get("saved_attributes", []):
-            self.need_save = True
+            self.main_app.store.set(self.name, name, value)
+        properties = self.__dict__.get("homie_properties")
+        if properties is not None and name in properties:
+            self.main_app.homie.publish(properties[name], value)
         return super().__setattr__(name, value)
 
-    def save_state(self):
-        return { attr: self.__dict__.get(attr) for attr in self.saved_attributes }
+    def add_homie_node(self, device):
+        # one node per application, one property per saved or published
+        # attribute, typed after its current value
+        node = device.add_node(homie_id(self.name), self.name, "application")
+        properties = {}
+        for name in self.__dict__.get("saved_attributes", []) + self.__dict__.get("published_attributes", []):
+            value = getattr(self, name)
+            properties[name] = node.add_property(homie_id(name), name.replace("_", " "), datatype_of(value))
+            properties[name].value = value
+        self.homie_properties = properties
 
     def load_state(self, state):
         for key in state:
             self.__setattr__(key, state[key])
-        self.need_save = False
 
 class Mode:
     def __init__(self, name):
@@ -402,38 +828,46 @@ class RadioManualMode(Mode):
 
     def handle_event(self, event):
         if event.type == Event.ROT_CW:
-            self.radio_app.radio_mgr.radio.set_frequency((int(10*self.radio_app.radio_mgr.radio.get_frequency())+1)/10)
+            self.step(event.delta*event.accel)
         elif event.type == Event.ROT_CCW:
-            self.radio_app.radio_mgr.radio.set_frequency((int(10*self.radio_app.radio_mgr.radio.get_frequency())-1)/10)
+            self.step(-event.delta*event.accel)
         elif event.type == Event.KO_PUSH:
             return None
         return self
 
+    def step(self, channels):
+        radio = self.radio_app.radio_mgr.radio
+        channel = int(round(10*radio.get_frequency())) + channels
+        radio.set_frequency(max(875, min(1080, channel))/10)
+
 class RadioFavMode(Mode):
     def __init__(self, radio_app):
         super().__init__("fav")
         self.radio_app = radio_app
         self.stations = []
-        self.start = 0
         self.highlight = 0
+        self.list = radio_app.main_app.renderer.add(StationList(radio_app.display, radio_app.main_coords.x, radio_app.main_coords.y, False))
 
     def handle_event(self, event):
         if event.type == Event.MODE_ENTER:
             self.stations = list(filter(lambda x: x[2],self.radio_app.main_app.favorites_app.stations))
-            display_stations(self.stations, self.start, self.radio_app.display, self.radio_app.main_coords.x, self.radio_app.main_coords.y, self.highlight, False)
+            self.highlight = min(self.highlight, max(0, len(self.stations)-1))
+            self.list.show(self.stations)
+            self.list.move(self.highlight)
         elif event.type == Event.ROT_CW:
-            self.highlight += 1
+            self.highlight += event.delta
             if self.highlight > len(self.stations)-1:
                 self.highlight = len(self.stations)-1
-            display_stations(self.stations, self.start, self.radio_app.display, self.radio_app.main_coords.x, self.radio_app.main_coords.y, self.highlight, False)
+            self.list.move(self.highlight)
         elif event.type == Event.ROT_CCW:
-            self.highlight -= 1
+            self.highlight -= event.delta
             if self.highlight < 0:
                 self.highlight = 0
-            display_stations(self.stations, self.start, self.radio_app.display, self.radio_app.main_coords.x, self.radio_app.main_coords.y, self.highlight, False)
+            self.list.move(self.highlight)
         elif event.type == Event.ROT_REL:
             self.radio_app.radio_mgr.tune_to(self.stations[self.highlight][0])
         elif event.type == Event.KO_REL:
+            self.list.hide()
             return None
         return self
 
@@ -448,14 +882,10 @@ class RadioSleepMode(Mode):
         if event.type == Event.MODE_ENTER:
             self.display_sleep_time()
         elif event.type == Event.ROT_CW:
-            self.sleep_index += 1
-            if self.sleep_index >= len(self.sleep_times):
-                self.sleep_index = 0
+            self.sleep_index = (self.sleep_index + event.delta) % len(self.sleep_times)
             self.display_sleep_time()
         elif event.type == Event.ROT_CCW:
-            self.sleep_index -= 1
-            if self.sleep_index < 0:
-                self.sleep_index = len(self.sleep_times)-1
+            self.sleep_index = (self.sleep_index - event.delta) % len(self.sleep_times)
             self.display_sleep_time()
         elif event.type == Event.ROT_REL:
             # set sleep time
@@ -485,17 +915,23 @@ class RadioApp(Application):
                   RadioSleepMode(self)
                 ]
         self.sleep_time = None
-
-    def display_mini(self):
-        super().display_mini()
+        # radio state, published but not saved
+        self.on = False
+        self.frequency = 0.0
+        self.volume = self.radio_mgr.radio.get_volume()
+        self.station = ""
+        self.published_attributes = ["on", "frequency", "volume", "station", "sleep_time"]
+
+    def draw_mini(self, display):
+        super().draw_mini(display)
         status = "on vol:{:>2}".format(self.radio_mgr.radio.get_volume()) if self.radio_mgr.radio_on else "off"
 
         fg, bg = self.get_fg_bg_color()
-        self.display.text(vga2_8x8, status, self.mini_coords.x, self.mini_coords.y+12, fg, bg)
+        display.text(vga2_8x8, status, self.mini_coords.x, self.mini_coords.y+12, fg, bg)
 
         if self.sleep_time is not None:
             sleep_str = " sleep:{:>2}m".format(self.sleep_time)
-            self.display.text(vga2_8x8, sleep_str, self.mini_coords.x, self.mini_coords.y+24, fg, bg)
+            display.text(vga2_8x8, sleep_str, self.mini_coords.x, self.mini_coords.y+24, fg, bg)
 
 class AlarmOn(Mode):
     def __init__(self, alarm_app):
@@ -522,43 +958,46 @@ class AlarmStation(Mode):
         super().__init__("station")
         self.alarm_app = alarm_app
 
+SET_HOUR = const(0)
+SET_MINUTE = const(1)
+SET_DAYS = const(2)
+
 class AlarmSet(Mode):
     def __init__(self, alarm_app):
         super().__init__("set")
         self.alarm_app = alarm_app
         self.hour = 0
         self.minute = 0
-        self.setting_hour = True
+        self.days = 0
+        self.setting = SET_HOUR
 
     def handle_event(self, event):
         if event.type == Event.MODE_ENTER:
-            self.setting_hour = True
+            self.setting = SET_HOUR
             self.hour, self.minute = self.alarm_app.wakeup
+            self.days = 0
+            for index, preset in enumerate(DAYS_PRESETS):
+                if preset[0] == self.alarm_app.days:
+                    self.days = index
             self.display_time(first=True)
-        elif event.type == Event.ROT_CW:
-            if self.setting_hour:
-                self.hour += 5 if event.fast else 1
-                if self.hour > 23:
-                    self.hour = 0
+        elif event.type == Event.ROT_CW or event.type == Event.ROT_CCW:
+            step = event.delta*event.accel
+            if event.type == Event.ROT_CCW:
+                step = -step
+            if self.setting == SET_HOUR:
+                self.hour = (self.hour + step) % 24
+            elif self.setting == SET_MINUTE:
+                self.minute = (self.minute + step) % 60
             else:
-                self.minute += 5 if event.fast else 1
-                if self.minute > 59:
-                    self.minute = 0
-        elif event.type == Event.ROT_CCW:
-            if self.setting_hour:
-                self.hour -= 5 if event.fast else 1
-                if self.hour < 0:
-                    self.hour = 23
-            else:
-                self.minute -= 5 if event.fast else 1
-                if self.minute < 0:
-                    self.minute = 59
+                step = event.delta if event.type == Event.ROT_CW else -event.delta
+                self.days = (self.days + step) % len(DAYS_PRESETS)
         elif event.type == Event.ROT_REL:
-            if self.setting_hour:
-                self.setting_hour = False
+            if self.setting != SET_DAYS:
+                self.setting += 1
             else:
                 #finish setting
                 self.alarm_app.wakeup = [self.hour, self.minute]
+                self.alarm_app.days = DAYS_PRESETS[self.days][0]
                 self.alarm_app.last_ring_date = [0,0,0] # reset last ring date
                 return None
         elif event.type == Event.KO_PUSH:
@@ -571,11 +1010,13 @@ class AlarmSet(Mode):
             self.alarm_app.display.text(vga2_bold_16x32, "Alarm: ", self.alarm_app.main_coords.x, self.alarm_app.main_coords.y, Application.foreground)
             self.alarm_app.display.text(vga2_bold_16x32, ":", self.alarm_app.main_coords.x+9*16, self.alarm_app.main_coords.y, Application.foreground)
         time_str = "{:02}".format(self.hour)
-        fg, bg = self.alarm_app.get_fg_bg_color(self.setting_hour)
+        fg, bg = self.alarm_app.get_fg_bg_color(self.setting == SET_HOUR)
         self.alarm_app.display.text(vga2_bold_16x32, time_str, self.alarm_app.main_coords.x+7*16, self.alarm_app.main_coords.y, fg, bg)
         time_str = "{:02}".format(self.minute)
-        fg, bg = self.alarm_app.get_fg_bg_color(not self.setting_hour)
+        fg, bg = self.alarm_app.get_fg_bg_color(self.setting == SET_MINUTE)
         self.alarm_app.display.text(vga2_bold_16x32, time_str, self.alarm_app.main_coords.x+10*16, self.alarm_app.main_coords.y, fg, bg)
+        fg, bg = self.alarm_app.get_fg_bg_color(self.setting == SET_DAYS)
+        self.alarm_app.display.text(vga2_8x16, "{:<9}".format(DAYS_PRESETS[self.days][1]), self.alarm_app.main_coords.x+7*16, self.alarm_app.main_coords.y+40, fg, bg)
 
 class AlarmSetVolume(Mode):
     def __init__(self, alarm_app):
@@ -587,11 +1028,11 @@ class AlarmSetVolume(Mode):
         if event.type == Event.MODE_ENTER:
             self.volume = self.alarm_app.volume
         elif event.type == Event.ROT_CW:
-            self.volume += 1 if not event.fast else 5
+            self.volume += event.delta*event.accel
             if self.volume > 30:
                 self.volume = 30
         elif event.type == Event.ROT_CCW:
-            self.volume -= 1 if not event.fast else 5
+            self.volume -= event.delta*event.accel
             if self.volume < 1:
                 self.volume = 1
         elif event.type == Event.ROT_REL:
@@ -609,6 +1050,8 @@ class AlarmSetVolume(Mode):
         fg, bg = self.alarm_app.get_fg_bg_color(True)
         self.alarm_app.display.text(vga2_bold_16x32, vol_str, self.alarm_app.main_coords.x+8*16, self.alarm_app.main_coords.y, fg, bg)
 
+ALARM_SCHEDULE_ATTRIBUTES = ("wakeup", "active", "days", "last_ring_date")
+
 class AlarmApp(Application):
 
     def __init__(self, name, main_app, main_coords, mini_coords):
@@ -620,59 +1063,147 @@ class AlarmApp(Application):
         super().__init__(name, main_app, main_coords, mini_coords, modes=modes)
         self.wakeup = [0,0]
         self.active = False
+        self.days = DAYS_EVERY
         self.volume = 12
         self.last_ring_date = [0,0,0]
-        self.ringing = False
-        self.saved_attributes = ["wakeup", "active", "volume", "last_ring_date"]
+        self.saved_attributes = ["wakeup", "active", "days", "volume", "last_ring_date"]
 
-    def display_mini(self):
-        super().display_mini()
+    def __setattr__(self, name, value):
+        if name in ALARM_SCHEDULE_ATTRIBUTES:
+            self.main_app.alarm_scheduler.invalidate(self)
+        return super().__setattr__(name, value)
+
+    def draw_mini(self, display):
+        super().draw_mini(display)
         status = "--:--"
         if self.wakeup:
             status = "{:02}:{:02}".format(self.wakeup[0], self.wakeup[1])
         fg, bg = self.get_fg_bg_color()
-        self.display.text(vga2_8x8, status, self.mini_coords.x, self.mini_coords.y+12, fg, bg)
+        display.text(vga2_8x8, status, self.mini_coords.x, self.mini_coords.y+12, fg, bg)
 
         if self.active:
             status = "on"
             fg = st7789.RED
         else:
             status = "off"
-        self.display.text(vga2_8x8, status, self.mini_coords.x+8*6, self.mini_coords.y+12, fg, bg)
+        display.text(vga2_8x8, status, self.mini_coords.x+8*6, self.mini_coords.y+12, fg, bg)
+        fg, bg = self.get_fg_bg_color()
+        display.text(vga2_8x8, days_name(self.days), self.mini_coords.x, self.mini_coords.y+22, fg, bg)
 
 MAX_STATIONS = const(12)
 
-def display_stations(favorites, start, display, x, y, highlight_index = None, show_hearts=True):
-
-    def display_half(fav, x, y, highlight, show_hearts):
-        station = fav[1] if fav[1] is not None else "{:>4.1f}".format(fav[0])
-        left_is_fav = fav[2] and show_hearts
-        if highlight:
-            display.text(vga2_8x16, "{} {:>8}".format("\x03" if left_is_fav else " ", station), x, y, Application.background, Application.foreground)
-        else:
-            display.text(vga2_8x16, "{} {:>8}".format("\x03" if left_is_fav else " ", station), x, y, Application.foreground)
-
-    x += 16
-
-    ctr = 0
-    iter_fav = iter(favorites)
-    while ctr != start:
-        fav = next(iter_fav)
-        ctr += 1
-    x_offset = 0
-    y_offset = 0
-    while (ctr-start) < MAX_STATIONS:
-        try:
-            fav = next(iter_fav)
-            display_half(fav, x+x_offset, y+y_offset, ctr==highlight_index, show_hearts)
-        except StopIteration:
-            display.text(vga2_8x8, " "*11, x+x_offset, y+y_offset, Application.foreground)
-        if x_offset != 0:
-            x_offset = 0
-            y_offset += 18
+CELL_WIDTH = const(12*8)
+CELL_HEIGHT = const(18)
+LABEL_CHARS = const(10)
+
+class StationList(Widget):
+    # The stations in cells of two per row, MAX_STATIONS of them from start.
+    # Labels are formatted once per station. draw() repaints only the cells
+    # whose label or highlight differ from what they show: a detent costs two
+    # cells, plus the scrolls. It draws on the display of its application: on
+    # the offscreen surface, a scroll moves the rows already drawn and paints
+    # the new one; on the display it turns a page, MAX_STATIONS cells every
+    # MAX_STATIONS detents. Either way the cost does not grow with the list.
+    def __init__(self, display, x, y, show_hearts=True):
+        super().__init__(x, y, 16+2*CELL_WIDTH, MAX_STATIONS//2*CELL_HEIGHT)
+        self.display = display
+        self.show_hearts = show_hearts
+        self.stations = []
+        self.labels = []
+        self.start = 0
+        self.drawn_start = 0
+        self.highlight = None
+        self.shown = False
+        # label and highlight of each cell on screen, None when unknown
+        self.cells = [None]*MAX_STATIONS
+        self.cells_lit = [False]*MAX_STATIONS
+
+        self.repaints = 0
+
+    def label(self, station):
+        name = station[1] if station[1] is not None else "{:>4.1f}".format(station[0])
+        return "{} {:>8}".format("\x03" if station[2] and self.show_hearts else " ", name)
+
+    def show(self, stations, start=0, highlight=None):
+        # the area was cleared or drawn over, every cell is repainted
+        self.stations = stations
+        self.labels = [self.label(station) for station in stations]
+        self.start = start
+        self.drawn_start = start
+        self.highlight = highlight
+        self.shown = True
+        for cell in range(MAX_STATIONS):
+            self.cells[cell] = None
+        self.invalidate()
+
+    def hide(self):
+        self.shown = False
+        self.labels = []
+
+    def changed(self, index):
+        # the station at index was named, or its heart toggled
+        self.labels[index] = self.label(self.stations[index])
+        self.invalidate()
+
+    def inserted(self, index):
+        self.labels.insert(index, self.label(self.stations[index]))
+        self.invalidate()
+
+    def scroll(self, start):
+        self.start = start
+        self.invalidate()
+
+    def move(self, highlight):
+        # the view scrolls only when the highlighted row would leave it: by
+        # a row of two on the offscreen surface, which moves the rows drawn,
+        # by a page on the display, where a scroll repaints every cell
+        self.highlight = highlight
+        row = highlight & ~1
+        page = not isinstance(self.display, Surface)
+        if row < self.start:
+            self.scroll(max(0, row - MAX_STATIONS + 2 if page else row))
+        elif row >= self.start + MAX_STATIONS:
+            self.scroll(row if page else row - MAX_STATIONS + 2)
         else:
-            x_offset = 12*8
-        ctr += 1
+            self.invalidate()
+
+    def draw(self, screen):
+        if not self.shown:
+            return
+        display = self.display
+        offscreen = isinstance(display, Surface)
+        shift = self.start - self.drawn_start
+        self.drawn_start = self.start
+        if shift and abs(shift) < MAX_STATIONS and offscreen:
+            if display.scroll(self.x+16, self.y, 2*CELL_WIDTH, self.height, -shift//2*CELL_HEIGHT):
+                if shift > 0:
+                    self.cells = self.cells[shift:] + [None]*shift
+                    self.cells_lit = self.cells_lit[shift:] + [False]*shift
+                else:
+                    self.cells = [None]*-shift + self.cells[:shift]
+                    self.cells_lit = [False]*-shift + self.cells_lit[:shift]
+        labels = self.labels
+        for cell in range(MAX_STATIONS):
+            index = self.start + cell
+            label = labels[index] if index < len(labels) else ""
+            lit = index == self.highlight
+            # labels are made once, the same string object is the same text
+            if label is self.cells[cell] and lit == self.cells_lit[cell]:
+                continue
+            self.cells[cell] = label
+            self.cells_lit[cell] = lit
+            self.repaints += 1
+            x = self.x + 16 + (cell % 2)*CELL_WIDTH
+            y = self.y + (cell // 2)*CELL_HEIGHT
+            if not label:
+                display.fill_rect(x, y, LABEL_CHARS*8, 16, Application.background)
+            elif lit:
+                display.text(vga2_8x16, label, x, y, Application.background, Application.foreground)
+            else:
+                display.text(vga2_8x16, label, x, y, Application.foreground)
+        if offscreen:
+            # sent now rather than with the next frame
+            display.draw(screen)
 
 class FavSelectMode(Mode):
     def __init__(self, favorites_app):
@@ -681,102 +1212,103 @@ class FavSelectMode(Mode):
         self.favorites_app = favorites_app
         self.timer = None
         self.highlight = 0
-        self.start = 0
         self.stations = []
+        self.list = favorites_app.main_app.renderer.add(StationList(favorites_app.display, 0, 32))
 
     def handle_event(self, event):
         if event.type == Event.MODE_ENTER:
             # shall set radio to off (mute)
-            self.start = 0
             self.highlight = 0
             self.stations = list(self.favorites_app.stations)
-            display_stations(self.stations, self.start, self.favorites_app.display, 0, 32, self.highlight)
-        elif event.type == Event.ROT_CW:
-            self.highlight += 1
-            if self.highlight >= len(self.stations):
-                self.highlight = 0
-            self.radio.enable_rds(False)
-            if len(self.stations):
-                self.radio.set_frequency(self.stations[self.highlight][0])
-            if self.highlight > MAX_STATIONS / 2 and self.highlight % 2 == 0 and not (len(self.stations) - self.highlight < MAX_STATIONS / 2):
-                self.start = (self.highlight-6)
-            display_stations(self.stations, self.start, self.favorites_app.display, 0, 32, self.highlight)
-        elif event.type == Event.ROT_CCW:
-            self.highlight -= 1
-            if self.highlight < 0:
-                self.highlight = len(self.stations) - 1
-            self.radio.enable_rds(False)
+            for station in self.stations:
+                self.name_from_index(station)
+            self.list.show(self.stations, 0, self.highlight)
+        elif event.type == Event.ROT_CW or event.type == Event.ROT_CCW:
             if len(self.stations):
+                step = event.delta if event.type == Event.ROT_CW else -event.delta
+                self.highlight = (self.highlight + step) % len(self.stations)
+                self.radio.enable_rds(False)
                 self.radio.set_frequency(self.stations[self.highlight][0])
-            if self.highlight > MAX_STATIONS / 2 and self.highlight % 2 == 0:
-                self.start = (self.highlight-6)
-            display_stations(self.stations, self.start, self.favorites_app.display, 0, 32, self.highlight)
+                self.list.move(self.highlight)
         elif event.type == Event.ROT_REL:
             if len(self.stations):
                 self.stations[self.highlight][2] = not self.stations[self.highlight][2]
-            display_stations(self.stations, self.start, self.favorites_app.display, 0, 32, self.highlight)
+                self.list.changed(self.highlight)
         elif event.type == Event.KO_REL:
             self.favorites_app.stations = self.stations
+            self.list.hide()
             return None
         elif event.type == Event.TUNED:
             self.radio.enable_rds(True)
         elif event.type == Event.RDS_Basic_Tuning:
-            if self.radio.get_frequency() == self.stations[self.highlight][0] and event.text != self.stations[self.highlight][1]:
-                self.stations[self.highlight][1] = event.text
+            if len(self.stations) and self.name_from_index(self.stations[self.highlight]):
+                self.list.changed(self.highlight)
         return self
 
+    def name_from_index(self, station):
+        name = self.favorites_app.main_app.station_index.name(station[0])
+        if name is None or name == station[1]:
+            return False
+        station[1] = name
+        return True
+
     def tune(self, frequency):
         self.radio.set_frequency(frequency)
 
 class FavScanMode(Mode):
+    # the scan runs in the background, stations show up as they are found
+    # and named, only the cells that changed are redrawn
     def __init__(self, favorites_app):
         super().__init__("scan")
-        self.radio = favorites_app.radio_mgr.radio
+        self.radio_mgr = favorites_app.radio_mgr
         self.favorites_app = favorites_app
-        self.timer = None
+        self.scanner = favorites_app.radio_mgr.scanner
+        self.scanner.on_station = self.station_found
+        self.scanner.on_done = lambda: favorites_app.main_app.events.post(Event.SEEK_COMPLETE)
         self.stations = []
-        self.start = 0
+        self.shown = 0
         self.seek_done = False
+        self.list = favorites_app.main_app.renderer.add(StationList(favorites_app.display, 0, 32))
 
     def handle_event(self, event):
         if event.type == Event.MODE_ENTER:
-            # shall set radio to off (mute)
-            self.start = 0
+            # muted while scanning
             self.seek_done = False
-            self.radio.seek_all()
-        elif event.type == Event.TUNED:
-            if not event.valid:
-                self.scan_continue()
-            else:
-                self.radio.enable_rds(True)
-                self.timer = self.favorites_app.main_app.set_timer(1)
-        elif event.type == Event.RDS_Basic_Tuning:
-            if self.timer is not None:
-                self.timer.cancel()
-                self.timer = None
-            self.stations.append([self.radio.get_frequency(), event.text, False])
-            self.scan_continue()
-        elif event.type == Event.TIMEOUT:
-            self.stations.append([self.radio.get_frequency(), None, False])
-            self.scan_continue()
+            self.stations = []
+            self.shown = 0
+            self.list.show(self.stations)
+            self.radio_mgr.radio.mute(True)
+            self.scanner.start()
         elif event.type == Event.KO_REL:
-            self.radio.seek_stop()
+            self.scanner.stop()
+            self.radio_mgr.radio.mute(not self.radio_mgr.radio_on)
+            self.list.hide()
             return None
-        elif event.type == Event.SEEK_COMPLETE:
+        elif event.type == Event.SEEK_COMPLETE and not self.seek_done:
             for station in self.stations:
                 print(station)
             self.seek_done = True
-            display_stations(self.stations, 0, self.favorites_app.display, 0, 32)
+            self.radio_mgr.radio.mute(not self.radio_mgr.radio_on)
+            self.list.scroll(0)
         elif event.type == Event.ROT_REL:
-            self.favorites_app.stations = self.stations
+            self.favorites_app.stations = [list(station) for station in self.stations]
         return self
 
-    def scan_continue(self):
-        if len(self.stations) >= 12 and len(self.stations) % 2:
-            self.start += 2
-        display_stations(self.stations, self.start, self.favorites_app.display, 0, 32)
-        self.radio.enable_rds(False)
-        self.radio.seek_up(False)
+    def station_found(self, index):
+        # a station was inserted at index, or named
+        stations = self.stations = self.scanner.stations
+        if stations is not self.list.stations:
+            # the first one, in the list the scan started
+            self.shown = len(stations)
+            self.list.show(stations)
+        elif len(stations) > self.shown:
+            self.shown = len(stations)
+            self.list.inserted(index)
+            if index - self.list.start >= MAX_STATIONS:
+                # scroll by a row
+                self.list.scroll(self.list.start + 2)
+        else:
+            self.list.changed(index)
 
 class FavoritesApp(Application):
     def __init__(self, name, main_app, main_coords, mini_coords):
@@ -794,11 +1326,11 @@ class ClockZoneMode(Mode):
         if event.type == Event.MODE_ENTER:
             self.zone = self.settings_app.zone
         elif event.type == Event.ROT_CW:
-            self.zone += 1
+            self.zone += event.delta
             if self.zone > 12:
                 self.zone = 12
         elif event.type == Event.ROT_CCW:
-            self.zone -= 1
+            self.zone -= event.delta
             if self.zone < -12:
                 self.zone = -12
         elif event.type == Event.ROT_REL:
@@ -825,8 +1357,10 @@ class SettingsApp(Application):
 
 class ApplicationHandler:
     def __init__(self):
+        self.boot = BootPhases()
         self.event_flag = asyncio.ThreadSafeFlag()
         self.events = EventsQueue(self.event_flag)
+        self.router = EventRouter()
 
         pin_a = Pin(26, Pin.IN)
         pin_b = Pin(25, Pin.IN)
@@ -834,42 +1368,48 @@ class ApplicationHandler:
         self.rotary = RotaryEncoder(pin_a, pin_b, rotary_button, self.events)
 
         self.pin_ko = Pin(32, Pin.IN)
-        self.pin_ko.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=self.ko_handler)
+        self.pin_ko.irq(trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=self.ko_handler, hard=True)
 
         spi = SPI(2, baudrate=8000000, polarity=1, phase=1, sck=Pin(16), mosi=Pin(17))
         # H W inverted, screen is rotated
         self.display = st7789.ST7789(spi, 240, 320, reset=Pin(5, Pin.OUT), dc=Pin(18, Pin.OUT), backlight=Pin(19, Pin.OUT), rotation=1, color_order=st7789.RGB)
         self.display.inversion_mode(False)
         self.display.init()
-
-        # Radio init
-        sda = Pin(21, Pin.OUT)
-        scl = Pin(22, Pin.OUT)
-
-        sen_pin = Pin(0, Pin.OUT)
+        self.renderer = RenderScheduler(self.display)
+        self.mode_bar = self.renderer.add(ModeBar())
+        self.mini_surface = None
+        try:
+            if OFFSCREEN_MINI or OFFSCREEN:
+                self.mini_surface = Surface(self.display, 0, 0, SCREEN_WIDTH-MINI_SPLIT_X-2*MINI_APP_X_MARGIN, MINI_APP_INNER_HEIGHT)
+            if OFFSCREEN:
+                # the apps draw the main area in RAM, the renderer sends it.
+                # The mini panels are redrawn whole: their buffer is free
+                # between two and stages the main area rectangles
+                self.display = self.renderer.add(Surface(self.display, MAIN_AREA_X, MAIN_AREA_Y, MAIN_AREA_WIDTH, MAIN_AREA_HEIGHT, self.mini_surface.buffer))
+        except MemoryError:
+            # drawn straight on the display
+            pass
+        self.boot.mark("display")
+
+        self.store = StateStore()
+        self.alarm_scheduler = AlarmScheduler()
+        self.timesync = TimeSync(NTP_HOST)
+        self.timesync.on_sync = self.time_synced
+        self.station_index = StationIndex(self.store)
+
+        device_id = "fmclock-" + str(binascii.hexlify(machine.unique_id()), "ascii")
+        self.mqtt = MQTTClient(device_id, MQTT_HOST, MQTT_PORT)
+        self.homie = HomieDevice(self.mqtt, device_id, "FM alarm clock", FIRMWARE_NAME, FIRMWARE_VERSION)
+
+        # Radio init, the chip is reset and powered up by start_radio()
+        self.radio_sda = Pin(21, Pin.OUT)
+        self.radio_scl = Pin(22, Pin.OUT)
+
+        self.radio_sen = Pin(0, Pin.OUT)
         reset_pin = Pin(27, Pin.OUT)
         irq_pin = Pin(14, Pin.IN, Pin.PULL_UP)
 
-        sda.value(0)
-        sen_pin.value(1)    # Enable I2C mode
-
-        # Reset the chip
-        reset_pin.value(0)
-        utime.sleep_ms(200)
-        reset_pin.value(1)
-        utime.sleep_ms(100)
-
-        sda.value(1)
-        i2c = I2C(1, scl=scl, sda=sda, freq=400000)
-
-        self.radio = SI4703(i2c, reset_pin, sen_pin, irq_pin)
-
-        try:
-            ntptime.host = "fr.pool.ntp.org"
-            ntptime.settime()
-        except Exception as e:
-            print("Failed to sync time: {}".format(e))
-
+        self.radio = SI4703(None, reset_pin, self.radio_sen, irq_pin)
 
         self.radio_mgr = RadioManager(self.radio)
 
@@ -882,7 +1422,7 @@ class ApplicationHandler:
         self.favorites_app = FavoritesApp("Favorites", self, main_coords, Point(MINI_SPLIT_X+MINI_APP_X_MARGIN, MINI_APP_Y_MARGIN + 3*MINI_APP_HEIGHT))
         settings_app = SettingsApp("Settings", self, main_coords, Point(MINI_SPLIT_X+MINI_APP_X_MARGIN, MINI_APP_Y_MARGIN + 4*MINI_APP_HEIGHT))
 
-        self.clock = Clock(self, self.radio_mgr, [alarm_app1, alarm_app2], settings_app)
+        self.clock = Clock(self, self.radio_mgr, settings_app)
 
         self.apps = [ self.radio_app,
                       alarm_app1,
@@ -891,16 +1431,20 @@ class ApplicationHandler:
                       settings_app
                     ]
 
+        states = self.store.load([app.name for app in self.apps] + [STATIONS_STORE_NAME])
+        self.station_index.load(states[STATIONS_STORE_NAME])
         for app in self.apps:
-            try:
-                with open("{}.json".format(app.name), "rt") as file:
-                    state = json.load(file)
-                    app.load_state(state)
-            except OSError as excp:
-                pass
+            app.load_state(states[app.name])
+            app.add_homie_node(self.homie)
+        self.homie.add_stat("freeheap", gc.mem_free)
+        self.homie.add_stat("rssi", self.radio.get_rssi)
+        self.boot.mark("state")
 
         self.pre_app = 0
         self.selected_app = None
+        self.monitor = LoopMonitor()
+        # the selected app and its mode get what the others left
+        self.router.subscribe(range(len(EVENT_NAMES)), self.app_event, ROUTE_APPS)
 
         self.last_ko_state = 1
 
@@ -914,6 +1458,7 @@ class ApplicationHandler:
         self.display.hline(MINI_SPLIT_X, x, SCREEN_WIDTH - MINI_SPLIT_X, st7789.WHITE)
 
         self.display_arrow_app()
+        self.boot.mark("ui")
 
     def display_arrow_app(self, clear_all=False):
         y = 10
@@ -927,91 +1472,125 @@ class ApplicationHandler:
     def set_timer(self, delay):
         async def async_delay_task(self, delay):
             await asyncio.sleep(delay)
-            self.events.push(Event(Event.TIMEOUT))
+            self.events.post(Event.TIMEOUT)
         return asyncio.create_task(async_delay_task(self, delay))
 
     def post_exit_event(self):
-        self.events.push(Event(Event.EXIT))
+        self.events.post(Event.EXIT)
 
     def handle_events(self):
         event = self.events.pop()
         while event is not None:
-            if self.radio_mgr.handle_event(event) is None:
+            if (event.type == Event.ROT_CW or event.type == Event.ROT_CCW) and not self.rotary.collect(event):
+                # detents cancelled out
                 event = self.events.pop()
                 continue
-            if self.clock.handle_event(event) is None:
-                event = self.events.pop()
-                continue
-            if self.selected_app is not None:
-                if event.type == Event.EXIT:
-                    if self.selected_app.need_save:
-                        with open("{}.json".format(self.selected_app.name), "wt") as file:
-                            json.dump(self.selected_app.save_state(), file)
-                        self.selected_app.need_save = False
-                    self.selected_app.selected = False
-                    self.selected_app.display_mini()
-                    self.selected_app = None
-                    self.display_arrow_app()
-                else:
-                    self.selected_app.handle_event(event)
-            else:
-                if event.type == Event.ROT_CW:
-                    self.pre_app += 1
-                    if self.pre_app > len(self.apps)-1:
-                        self.pre_app = 0
-                    self.display_arrow_app()
-                elif event.type == Event.ROT_CCW:
-                    self.pre_app -= 1
-                    if self.pre_app < 0:
-                        self.pre_app = len(self.apps)-1
-                    self.display_arrow_app()
-                elif event.type == Event.ROT_REL:
-                    #switch app
-                    self.selected_app = self.apps[self.pre_app]
-                    self.selected_app.selected = True
-                    self.display_arrow_app(clear_all=True)
-                    self.selected_app.display_mini()
-                    self.selected_app.display_modes()
+            self.router.dispatch(event)
             event = self.events.pop()
 
+    def app_event(self, event):
+        if self.selected_app is not None:
+            if event.type == Event.EXIT:
+                self.selected_app.selected = False
+                self.selected_app.display_mini()
+                self.selected_app = None
+                self.display_arrow_app()
+            else:
+                app = self.selected_app
+                start = app.handler_time.start()
+                try:
+                    app.handle_event(event)
+                finally:
+                    app.handler_time.since(start)
+        else:
+            if event.type == Event.ROT_CW:
+                self.pre_app = (self.pre_app + event.delta) % len(self.apps)
+                self.display_arrow_app()
+            elif event.type == Event.ROT_CCW:
+                self.pre_app = (self.pre_app - event.delta) % len(self.apps)
+                self.display_arrow_app()
+            elif event.type == Event.ROT_REL:
+                #switch app
+                self.selected_app = self.apps[self.pre_app]
+                self.selected_app.selected = True
+                self.display_arrow_app(clear_all=True)
+                self.selected_app.display_mini()
+                self.selected_app.display_modes()
+        return None
+
     def ko_handler(self, pin):
         state = pin.value()
         if state == self.last_ko_state:
             return
         self.last_ko_state = state
+        self.rotary.close_batch()
         if state == 0:
-            self.events.push(Event(Event.KO_PUSH))
+            self.events.post(Event.KO_PUSH)
             # Implement KO button functionality here
         else:
-            self.events.push(Event(Event.KO_REL))
+            self.events.post(Event.KO_REL)
             # Implement KO button release functionality here
 
     def tuned_handler(self, frequency, rssi, valid):
         print("Tuned to frequency: {:.1f} MHz, RSSI: {}, Valid {}".format(frequency, rssi, valid))
-        self.events.push(RadioTunedEvent(frequency, rssi, valid))
+        self.events.post(Event.TUNED, self.radio.get_channel(), rssi, valid)
+
+    def pi_handler(self, pi):
+        self.events.post(Event.RDS_PI, self.radio.get_channel(), pi=pi)
 
     def basic_tuning_handler(self, text):
         print("RDS Basic Tuning Text: {}".format(text))
-        self.events.push(BasicTuningEvent(text))
+        self.events.post(Event.RDS_Basic_Tuning, self.radio.get_channel(), text=text)
+
+    def ps_stable_handler(self, text):
+        self.events.post(Event.RDS_Basic_Tuning, self.radio.get_channel(), valid=True, text=text)
 
     def radio_text_handler(self, text):
         print("RDS Radio Text: {}".format(text))
-        self.events.push(RadioTextEvent(text))
+        self.events.post(Event.RDS_Radio_Text, text=text)
 
-    def seek_complete_handler(self):
-        print("seek complete")
-        self.events.push(Event(Event.SEEK_COMPLETE))
+    async def reset_radio(self):
+        # SEN high and SDA low while reset rises select the 2-wire bus
+        sda = self.radio_sda
+        sda.value(0)
+        self.radio_sen.value(1)    # Enable I2C mode
+        self.radio.reset_pin.value(0)
+        await asyncio.sleep_ms(200)
+        self.radio.reset_pin.value(1)
+        await asyncio.sleep_ms(100)
+        sda.value(1)
+        return I2C(1, scl=self.radio_scl, sda=sda, freq=400000)
 
-    def start_radio(self):
-        self.radio.power_cristal(True)
-        self.radio.enable(True)
+    async def start_radio(self):
         self.radio.set_tuned_irq(self.tuned_handler)
+        self.radio.set_pi_handler(self.pi_handler)
         self.radio.set_basic_tuning_handler(self.basic_tuning_handler)
+        self.radio.set_ps_stable_handler(self.ps_stable_handler)
         self.radio.set_radio_text_irq(self.radio_text_handler)
-        self.radio.set_seek_complete_irq(self.seek_complete_handler)
         self.radio.mute(True)           # Mute the audio
-        self.radio.set_frequency(98.2)   # Set frequency to 98.2 MHz
-        self.radio.set_volume(1)         # Set volume to lowest level
+        self.radio_mgr.set_volume(1)     # Set volume to lowest level
+        i2c = await self.reset_radio()
+        self.boot.mark("radio reset")
+        # the first NTP exchange overlaps the crystal start up, the 4A
+        # groups of the station take over without network
+        self.radio.set_clock_time_handler(self.timesync.rds_time)
+        asyncio.create_task(self.timesync.run())
+        await self.radio.power_up(i2c)
+        self.boot.mark("radio powered")
+        if await self.radio.tune(98.2) is None:   # Set frequency to 98.2 MHz
+            print("tuner did not complete the first tune")
+        self.boot.mark("first audio")
+
+    def time_synced(self, source):
+        if self.boot.get("time synced") is None:
+            self.boot.mark("time synced")
+        print("time: {} offset {} ms, drift {} ppm".format(source, self.timesync.offset_ms, self.timesync.drift_ppm))
+
+    async def perf_task(self):
+        while True:
+            await asyncio.sleep(PERF_PUBLISH_S)
+            if self.mqtt.connected:
+                await perf.publish(self.mqtt, self.homie.topic + "/$perf")
 
     async def event_task(self):
         while True:
@@ -1019,15 +1598,30 @@ class ApplicationHandler:
             self.handle_events()
 
     async def main(self):
+        # first screen before anything else runs, hardware and network come
+        # up in the background
+        self.clock.show_time(self.clock.local_time())
+        self.renderer.flush()
+        self.boot.mark("first screen")
+        asyncio.create_task(self.radio.run())
+        asyncio.create_task(self.start_radio())
+        asyncio.create_task(self.renderer.run())
+        asyncio.create_task(self.radio_mgr.radio_text.run())
         asyncio.create_task(self.clock.update_time())
         asyncio.create_task(self.event_task())
+        asyncio.create_task(self.store.run())
+        asyncio.create_task(self.mqtt.run())
+        asyncio.create_task(self.homie.run())
+        asyncio.create_task(perf.run())
+        asyncio.create_task(self.monitor.run())
+        asyncio.create_task(self.perf_task())
 
         while True:
             await asyncio.sleep(1)
 
-app = ApplicationHandler()
-app.start_radio()
+if __name__ == "__main__":
+    app = ApplicationHandler()
 
-gc.collect()
+    gc.collect()
 
-asyncio.run(app.main())
+    asyncio.run(app.main())
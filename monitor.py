@@ -0,0 +1,87 @@
+import utime
+import machine
+import uasyncio as asyncio
+import perf
+
+# Event loop health.
+#
+# run() wakes every LAG_PERIOD_MS and records how late it woke in the
+# "loop.lag" histogram, restarted every LAG_WINDOW_S; the summary of the
+# window before is kept in window. That delay is what the clock tick and
+# the alarms see. The hardware watchdog is fed from there, and only while
+# the lag stays under STALL_MS: a stalled loop, or one that lags that much
+# for WDT_TIMEOUT_MS, resets the board.
+#
+# A timer checks that the loop comes round. Once it is STALL_MS late, the
+# perf section being timed is noted: the handler, widget draw, I2C
+# transaction or state write that holds the loop, "loop" outside of them.
+# When the loop is back the stall goes to the "loop.stall" histogram and to
+# stalls, the last STALL_LOG ones as [ticks_ms, section, ms].
+
+LAG_PERIOD_MS = const(50)
+LAG_WINDOW_S = const(60)
+STALL_MS = const(500)
+CHECK_MS = const(100)
+WDT_TIMEOUT_MS = const(8000)
+STALL_LOG = const(8)
+
+class LoopMonitor:
+    def __init__(self, watchdog=True):
+        self.watchdog = watchdog
+        self.wdt = None
+        self.timer = None
+        self.lag = perf.histogram("loop.lag")
+        self.stall_time = perf.histogram("loop.stall")
+        self.window = None
+        self.last_ms = utime.ticks_ms()
+        # section the loop was stuck in, set by the timer
+        self.stalled_in = None
+        self.stalls = []
+
+        self.feeds = 0
+        self.withheld = 0
+
+    def start(self):
+        if self.watchdog:
+            self.wdt = machine.WDT(timeout=WDT_TIMEOUT_MS)
+        self.timer = machine.Timer(0)
+        self.timer.init(period=CHECK_MS, mode=machine.Timer.PERIODIC, callback=self._check)
+
+    def _check(self, timer):
+        if self.stalled_in is not None:
+            return
+        if utime.ticks_diff(utime.ticks_ms(), self.last_ms) > LAG_PERIOD_MS + STALL_MS:
+            section = perf.current
+            self.stalled_in = "loop" if section is None else section.name
+
+    async def run(self):
+        self.start()
+        window_start = utime.ticks_ms()
+        while True:
+            before = utime.ticks_us()
+            await asyncio.sleep_ms(LAG_PERIOD_MS)
+            lag = utime.ticks_diff(utime.ticks_us(), before) - LAG_PERIOD_MS*1000
+            now = utime.ticks_ms()
+            self.last_ms = now
+            self.lag.add(lag)
+            if self.stalled_in is not None or lag > STALL_MS*1000:
+                # a stall ending before the timer checked is not named
+                self._stalled(now, self.stalled_in or "unknown", lag//1000)
+                self.stalled_in = None
+            if lag <= STALL_MS*1000:
+                if self.wdt is not None:
+                    self.wdt.feed()
+                    self.feeds += 1
+            else:
+                self.withheld += 1
+            if utime.ticks_diff(now, window_start) > LAG_WINDOW_S*1000:
+                self.window = self.lag.summary()
+                self.lag.reset()
+                window_start = now
+
+    def _stalled(self, now, section, ms):
+        self.stall_time.add(ms*1000)
+        if len(self.stalls) == STALL_LOG:
+            self.stalls.pop(0)
+        self.stalls.append([now, section, ms])
+        print("loop: stalled {} ms in {}".format(ms, section))
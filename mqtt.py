@@ -0,0 +1,318 @@
+import utime
+import uasyncio as asyncio
+
+# MQTT 3.1.1 client on uasyncio streams, QoS 0.
+#
+# publish() only queues: the connection task writes the queue in batches, one
+# stream write per batch. While disconnected messages wait in a bounded queue,
+# the oldest dropped first. The connection task reconnects with exponential
+# backoff and keeps the session alive with PINGREQ. Only the name lookup in
+# open_connection() blocks: give the broker as an address to avoid it.
+
+MQTT_PORT = const(1883)
+KEEPALIVE_S = const(60)
+QUEUE_MAX = const(64)
+BATCH_BYTES = const(1024)
+BACKOFF_MIN_MS = const(1000)
+BACKOFF_MAX_MS = const(60000)
+CONNECT_TIMEOUT_MS = const(5000)
+
+PACKET_CONNECT = const(0x10)
+PACKET_CONNACK = const(0x20)
+PACKET_PUBLISH = const(0x30)
+PACKET_SUBSCRIBE = const(0x82)
+PACKET_SUBACK = const(0x90)
+PACKET_PINGREQ = const(0xC0)
+PACKET_PINGRESP = const(0xD0)
+PACKET_DISCONNECT = const(0xE0)
+
+def _put_length(out, length):
+    while True:
+        byte = length & 0x7F
+        length >>= 7
+        if length:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+def _put_string(out, data):
+    out.append(len(data) >> 8)
+    out.append(len(data) & 0xFF)
+    out.extend(data)
+
+def _bytes(value):
+    return value if isinstance(value, (bytes, bytearray)) else str(value).encode()
+
+def topic_matches(pattern, topic):
+    # MQTT filter matching with + and #
+    if pattern == topic:
+        return True
+    levels = pattern.split("/")
+    parts = topic.split("/")
+    for index, level in enumerate(levels):
+        if level == "#":
+            return True
+        if index >= len(parts) or (level != "+" and level != parts[index]):
+            return False
+    return len(levels) == len(parts)
+
+class MQTTClient:
+    def __init__(self, client_id, host, port=MQTT_PORT, keepalive=KEEPALIVE_S, user=None, password=None, queue_max=QUEUE_MAX):
+        self.client_id = client_id
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.user = user
+        self.password = password
+        self.queue_max = queue_max
+        self.will = None
+        # called after each connection, to subscribe and publish state; may
+        # be a coroutine function
+        self.on_connect = None
+
+        self.queue = []             # (topic, payload, retain) not written yet
+        self.sending = 0            # head of the queue in the write under way
+        self.subscriptions = []     # (topic filter, handler)
+        self.pending_subscribe = False
+        self.flag = asyncio.Event()
+        self.empty = asyncio.Event()
+        self.out = bytearray()
+        self.connected = False
+        self.writer = None
+        self.ping_due = False
+        self.last_tx = 0
+        self.last_rx = 0
+        self.backoff_ms = BACKOFF_MIN_MS
+        self.packet_id = 0
+
+        self.published = 0
+        self.dropped = 0
+        self.received = 0
+        self.connects = 0
+        self.batches = 0
+        self.bytes_out = 0
+
+    def set_last_will(self, topic, payload, retain=True):
+        self.will = (topic, payload, retain)
+
+    def subscribe(self, topic, handler):
+        # handler(topic, payload) for messages matching the filter, kept
+        # across reconnections
+        self.subscriptions.append((topic, handler))
+        self.pending_subscribe = True
+        self.flag.set()
+
+    def publish(self, topic, payload, retain=False):
+        # queues the message, False when the queue was full and the oldest
+        # message not being written was dropped, or this one
+        dropped = False
+        if len(self.queue) >= self.queue_max:
+            self.dropped += 1
+            if self.sending >= len(self.queue):
+                return False
+            self.queue.pop(self.sending)
+            dropped = True
+        self.queue.append((topic, payload, retain))
+        self.empty.clear()
+        self.flag.set()
+        return not dropped
+
+    async def flush(self):
+        # until everything queued so far is written, or the connection is lost
+        while self.queue and self.connected:
+            await self.empty.wait()
+
+    async def run(self):
+        while True:
+            try:
+                reader, writer = await self._connect()
+            except (OSError, EOFError, ValueError, asyncio.TimeoutError) as e:
+                print("mqtt: connect to {} failed: {}, retry in {} ms".format(self.host, e, self.backoff_ms))
+                await asyncio.sleep_ms(self.backoff_ms)
+                self.backoff_ms = min(2*self.backoff_ms, BACKOFF_MAX_MS)
+                continue
+            self.backoff_ms = BACKOFF_MIN_MS
+            tasks = [asyncio.create_task(self._receive(reader)), asyncio.create_task(self._keepalive())]
+            if self.on_connect is not None:
+                result = self.on_connect()
+                if result is not None:
+                    tasks.append(asyncio.create_task(result))
+            try:
+                await self._send(writer)
+            except (OSError, EOFError):
+                pass
+            self.connected = False
+            self.sending = 0
+            self.empty.set()
+            for task in tasks:
+                task.cancel()
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except OSError:
+                pass
+            print("mqtt: connection lost")
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            await self._handshake(reader, writer)
+        except Exception:
+            writer.close()
+            raise
+        self.connected = True
+        self.connects += 1
+        self.writer = writer
+        self.pending_subscribe = len(self.subscriptions) > 0
+        self.last_tx = self.last_rx = utime.ticks_ms()
+        self.flag.set()
+        return reader, writer
+
+    async def _handshake(self, reader, writer):
+        out = self.out
+        out[:] = b""
+        flags = 0x02    # clean session
+        payload = bytearray()
+        _put_string(payload, _bytes(self.client_id))
+        if self.will is not None:
+            flags |= 0x04 | (0x20 if self.will[2] else 0)
+            _put_string(payload, _bytes(self.will[0]))
+            _put_string(payload, _bytes(self.will[1]))
+        if self.user is not None:
+            flags |= 0x80
+            _put_string(payload, _bytes(self.user))
+            if self.password is not None:
+                flags |= 0x40
+                _put_string(payload, _bytes(self.password))
+        out.append(PACKET_CONNECT)
+        _put_length(out, 10 + len(payload))
+        _put_string(out, b"MQTT")
+        out.append(4)   # protocol level 3.1.1
+        out.append(flags)
+        out.append(self.keepalive >> 8)
+        out.append(self.keepalive & 0xFF)
+        out.extend(payload)
+        writer.write(out)
+        await writer.drain()
+        ack = await asyncio.wait_for_ms(reader.readexactly(4), CONNECT_TIMEOUT_MS)
+        if ack[0] != PACKET_CONNACK or ack[3] != 0:
+            raise ValueError("connack {}".format(ack[3]))
+
+    async def _send(self, writer):
+        out = self.out
+        while True:
+            await self.flag.wait()
+            self.flag.clear()
+            if not self.connected:
+                return
+            out[:] = b""
+            if self.pending_subscribe:
+                self.pending_subscribe = False
+                self._put_subscribe(out)
+            if self.ping_due:
+                self.ping_due = False
+                out.append(PACKET_PINGREQ)
+                out.append(0)
+            count = 0
+            queue = self.queue
+            while count < len(queue) and len(out) < BATCH_BYTES:
+                topic, payload, retain = queue[count]
+                topic = _bytes(topic)
+                payload = _bytes(payload)
+                out.append(PACKET_PUBLISH | (0x01 if retain else 0))
+                _put_length(out, 2 + len(topic) + len(payload))
+                _put_string(out, topic)
+                out.extend(payload)
+                count += 1
+            if not out:
+                continue
+            # written: only now out of the queue, a lost connection keeps
+            # them; publish() leaves them alone meanwhile
+            self.sending = count
+            writer.write(out)
+            await writer.drain()
+            del queue[:count]
+            self.sending = 0
+            self.published += count
+            self.batches += 1
+            self.bytes_out += len(out)
+            self.last_tx = utime.ticks_ms()
+            if queue:
+                # other tasks run between batches
+                self.flag.set()
+                await asyncio.sleep_ms(0)
+            else:
+                self.empty.set()
+
+    def _put_subscribe(self, out):
+        self.packet_id = (self.packet_id % 0xFFFF) + 1
+        body = bytearray()
+        body.append(self.packet_id >> 8)
+        body.append(self.packet_id & 0xFF)
+        for topic, handler in self.subscriptions:
+            _put_string(body, _bytes(topic))
+            body.append(0)  # QoS 0
+        out.append(PACKET_SUBSCRIBE)
+        _put_length(out, len(body))
+        out.extend(body)
+
+    async def _receive(self, reader):
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length = 0
+                shift = 0
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length |= (byte & 0x7F) << shift
+                    shift += 7
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length) if length else b""
+                self.last_rx = utime.ticks_ms()
+                if header[0] & 0xF0 == PACKET_PUBLISH:
+                    self._dispatch(header[0], body)
+        except (OSError, EOFError):
+            pass
+        self._lost()
+
+    def _dispatch(self, header, body):
+        size = (body[0] << 8) | body[1]
+        topic = str(body[2:2+size], "utf-8")
+        start = 2 + size
+        if header & 0x06:
+            start += 2  # packet id of QoS 1 and 2
+        payload = body[start:]
+        self.received += 1
+        for pattern, handler in self.subscriptions:
+            if topic_matches(pattern, topic):
+                handler(topic, payload)
+
+    async def _keepalive(self):
+        # PINGREQ when nothing was sent for half the keepalive, connection
+        # dropped when the broker stays silent for 1.5 times the keepalive
+        period = self.keepalive * 1000
+        while True:
+            await asyncio.sleep_ms(period // 4)
+            now = utime.ticks_ms()
+            if utime.ticks_diff(now, self.last_rx) > period + period // 2:
+                print("mqtt: broker timeout")
+                self._lost()
+                return
+            if utime.ticks_diff(now, self.last_tx) >= period // 2:
+                self.ping_due = True
+                self.flag.set()
+
+    def _lost(self):
+        self.connected = False
+        self.empty.set()
+        self.flag.set()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def stats(self):
+        return {"connected": self.connected, "published": self.published, "dropped": self.dropped,
+                "received": self.received, "connects": self.connects, "batches": self.batches,
+                "bytes_out": self.bytes_out, "queued": len(self.queue)}
@@ -0,0 +1,140 @@
+import gc
+import utime
+import uasyncio as asyncio
+from array import array
+
+# Fixed size histograms for the hot paths, cheap enough to stay on: a
+# record is a ticks_us() and a few integer operations into log2 buckets of
+# microseconds, no allocation.
+#
+#   draw_time = perf.histogram("draw.clock")
+#   start = draw_time.start()
+#   try:
+#       ...
+#   finally:
+#       draw_time.since(start)
+#
+# The histogram timing a section is current until since(): the loop monitor
+# names it when the loop stalls. A section that may raise calls since() in
+# a finally, or every later section is charged to it.
+#
+# dump() prints every histogram on the serial console, publish() sends one
+# message per histogram, both as "count avg p50 p99 max" in microseconds,
+# percentiles rounded up to their bucket. run() samples the free heap for
+# its low water mark and counts the collections, seen as the free heap
+# growing back.
+
+HIST_BUCKETS = const(20)    # bucket n holds 2**n to 2**(n+1)-1 us, the last one the rest
+HEAP_SAMPLE_MS = const(100)
+PUBLISH_BATCH = const(8)
+
+class Histogram:
+    def __init__(self, name):
+        self.name = name
+        self.buckets = array("I", [0]*HIST_BUCKETS)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        if value < 0:
+            value = 0
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        bucket = 0
+        value >>= 1
+        while value and bucket < HIST_BUCKETS-1:
+            value >>= 1
+            bucket += 1
+        self.buckets[bucket] += 1
+
+    def start(self):
+        # the outer section stays current: the handler, not its I2C writes
+        global current
+        if current is None:
+            current = self
+        return utime.ticks_us()
+
+    def since(self, start_us):
+        global current
+        if current is self:
+            current = None
+        self.add(utime.ticks_diff(utime.ticks_us(), start_us))
+
+    def percentile(self, fraction):
+        seen = 0
+        for bucket in range(HIST_BUCKETS):
+            seen += self.buckets[bucket]
+            if seen and seen >= self.count*fraction:
+                return min((2 << bucket) - 1, self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return "0 0 0 0 0"
+        return "{} {} {} {} {}".format(self.count, self.total//self.count, self.percentile(0.5), self.percentile(0.99), self.max)
+
+    def reset(self):
+        for bucket in range(HIST_BUCKETS):
+            self.buckets[bucket] = 0
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+histograms = {}
+current = None      # section being timed
+
+def histogram(name):
+    # the same histogram for the same name
+    hist = histograms.get(name)
+    if hist is None:
+        hist = histograms[name] = Histogram(name)
+    return hist
+
+class HeapWatch:
+    def __init__(self):
+        self.free = gc.mem_free()
+        self.low = self.free
+        self.collections = 0
+
+    def sample(self):
+        free = gc.mem_free()
+        if free > self.free:
+            self.collections += 1
+        if free < self.low:
+            self.low = free
+        self.free = free
+
+    def summary(self):
+        return "{} {} {}".format(self.free, self.low, self.collections)
+
+heap = HeapWatch()
+
+async def run():
+    while True:
+        heap.sample()
+        await asyncio.sleep_ms(HEAP_SAMPLE_MS)
+
+def dump():
+    for name in sorted(histograms):
+        print("{:<24} {}".format(name, histograms[name].summary()))
+    print("{:<24} {}".format("heap free low gcs", heap.summary()))
+
+async def publish(client, topic):
+    # <topic>/<histogram name>, flushed by a few so the client queue holds
+    count = 0
+    for name in sorted(histograms):
+        client.publish("{}/{}".format(topic, name), histograms[name].summary())
+        count += 1
+        if count % PUBLISH_BATCH == 0:
+            await client.flush()
+    client.publish(topic + "/heap", heap.summary())
+    await client.flush()
+
+def reset():
+    for hist in histograms.values():
+        hist.reset()
+    heap.low = heap.free
+    heap.collections = 0
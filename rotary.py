@@ -1,37 +1,131 @@
-import time
+import utime
+import machine
+from array import array
 from machine import Pin
-from event import Event, EventRotCwEvent, EventRotCcwEvent
+from event import Event
+
+# Quarter steps for a transition of the (A << 1 | B) state, indexed by
+# old state << 2 | new state. Transitions where both pins changed are
+# invalid (bounce or a missed edge) and count for nothing.
+QUADRATURE_STEPS = (0, -1, 1, 0,
+                    1, 0, 0, -1,
+                    -1, 0, 0, 1,
+                    0, 1, -1, 0)
+QUADRATURE_INVALID = const(0x1248)     # bit set for indices 3, 6, 9 and 12
+STATE_DETENT = const(3)                # both pins high at rest
+
+# acceleration multiplier from the shortest interval between detents of a batch
+ACCEL_STEPS = ((25, 5), (60, 2))
 
 class RotaryEncoder:
-    # Rotary encoder handling code would go here
     def __init__(self, pin_a, pin_b, pin_button, event_queue):
         self.pin_a = pin_a
         self.pin_b = pin_b
         self.pin_button = pin_button
         self.event_queue = event_queue
-        self.last_rotation_ts = 0
         self.last_button_state = 1
+
+        self.state = (pin_a.value() << 1) | pin_b.value()
+        self.quarters = 0
+        self.invalid = 0
+        # detents accumulated since the last collect(), and whether an event
+        # announcing them is waiting in the queue
+        self.delta = 0
+        self.posted = False
+        self.last_detent_ts = utime.ticks_ms()
+        self.min_interval = 0x3FFFFFFF
+        # batches closed by a button press, for rotation events queued before
+        # it: delta and shortest interval pairs, oldest first
+        self.closed = array("i", [0]*(2*event_queue.capacity))
+        self.closed_head = 0
+        self.closed_count = 0
         # Initialize GPIO pins and interrupts
-        self.pin_a.irq(self._handle_rotation, Pin.IRQ_FALLING)
-        self.pin_button.irq(self._handle_button, Pin.IRQ_RISING | Pin.IRQ_FALLING)
+        self.pin_a.irq(self._handle_rotation, Pin.IRQ_RISING | Pin.IRQ_FALLING, hard=True)
+        self.pin_b.irq(self._handle_rotation, Pin.IRQ_RISING | Pin.IRQ_FALLING, hard=True)
+        self.pin_button.irq(self._handle_button, Pin.IRQ_RISING | Pin.IRQ_FALLING, hard=True)
 
     def _handle_rotation(self, pin):
-        # Logic to determine rotation direction and generate events
-        a_state = pin.value()
-        b_state = self.pin_b.value()
-        now = time.ticks_ms()
-        if a_state == 0 and b_state == 1:
-            if time.ticks_diff(now, self.last_rotation_ts) < 50:
-                self.event_queue.push(EventRotCwEvent(fast=True))
-            else:
-                self.event_queue.push(EventRotCwEvent())
-            self.last_rotation_ts = now
-        elif a_state == 0 and b_state == 0:
-            if time.ticks_diff(now, self.last_rotation_ts) < 50:
-                self.event_queue.push(EventRotCcwEvent(fast=True))
-            else:
-                self.event_queue.push(EventRotCcwEvent())
-            self.last_rotation_ts = now
+        state = (self.pin_a.value() << 1) | self.pin_b.value()
+        if state == self.state:
+            return
+        index = (self.state << 2) | state
+        self.state = state
+        if QUADRATURE_INVALID & (1 << index):
+            self.invalid += 1
+            return
+        self.quarters += QUADRATURE_STEPS[index]
+        if state != STATE_DETENT:
+            return
+        # back at rest: a detent when most of the cycle went one way
+        if self.quarters >= 2:
+            self.delta += 1
+        elif self.quarters <= -2:
+            self.delta -= 1
+        else:
+            self.quarters = 0
+            return
+        self.quarters = 0
+        now = utime.ticks_ms()
+        interval = utime.ticks_diff(now, self.last_detent_ts)
+        if interval < self.min_interval:
+            self.min_interval = interval
+        self.last_detent_ts = now
+        if not self.posted and self.delta != 0:
+            self.posted = self.event_queue.post(Event.ROT_CW if self.delta > 0 else Event.ROT_CCW)
+
+    def collect(self, event):
+        # Fills a rotation event with the detents of its batch: the oldest
+        # closed one, or those accumulated up to now. Direction, count and
+        # acceleration; False when they cancelled out.
+        state = machine.disable_irq()
+        if self.closed_count:
+            base = 2*self.closed_head
+            delta = self.closed[base]
+            interval = self.closed[base+1]
+            self.closed_head += 1
+            if self.closed_head == len(self.closed)//2:
+                self.closed_head = 0
+            self.closed_count -= 1
+        else:
+            delta = self.delta
+            interval = self.min_interval
+            self.delta = 0
+            self.min_interval = 0x3FFFFFFF
+            self.posted = False
+        machine.enable_irq(state)
+        if delta == 0:
+            return False
+        event.type = Event.ROT_CW if delta > 0 else Event.ROT_CCW
+        event.delta = delta if delta > 0 else -delta
+        event.accel = 1
+        for limit, accel in ACCEL_STEPS:
+            if interval < limit:
+                event.accel = accel
+                break
+        return True
+
+    def _close(self):
+        # the detents so far belong to the rotation event already queued,
+        # the next ones to a new event
+        capacity = len(self.closed)//2
+        if self.closed_count < capacity:
+            index = self.closed_head + self.closed_count
+            if index >= capacity:
+                index -= capacity
+            self.closed[2*index] = self.delta
+            self.closed[2*index+1] = self.min_interval
+            self.closed_count += 1
+        self.delta = 0
+        self.min_interval = 0x3FFFFFFF
+        self.posted = False
+
+    def close_batch(self):
+        # Called by button IRQs before they post: detents turned before the
+        # button go before it, the next ones after
+        if self.delta != 0 and not self.posted:
+            self.posted = self.event_queue.post(Event.ROT_CW if self.delta > 0 else Event.ROT_CCW)
+        if self.posted:
+            self._close()
 
     def _handle_button(self, pin):
         # Logic to handle button press and generate event
@@ -39,7 +133,8 @@ class RotaryEncoder:
         if self.last_button_state == state:
             return
         self.last_button_state = state
+        self.close_batch()
         if state == 0:
-            self.event_queue.push(Event(Event.ROT_PUSH))
+            self.event_queue.post(Event.ROT_PUSH)
         else:
-            self.event_queue.push(Event(Event.ROT_REL))
+            self.event_queue.post(Event.ROT_REL)
@@ -0,0 +1,124 @@
+import utime
+import uasyncio as asyncio
+
+# Band scan in two passes:
+#
+#   1. sweep: the chip seeks from the bottom of the band and stops on each
+#      channel over the RSSI and SNR thresholds. Each stop is written to the
+#      signal map and reported at once, the seek resumes with no RDS wait.
+#   2. names: the channels found are tuned again, strongest first, with RDS
+#      on. A channel is left as soon as its PS is stable by the decoder's
+#      rule, the one the station index saves names by, or when no group
+#      came within RDS_SYNC_MS.
+#
+# Stations are [frequency, name, favorite] like FavoritesApp.stations, in
+# frequency order. on_station(index) is called when a station is added or
+# named, on_done() at the end; the tuner is back on its frequency then.
+
+BAND_BOTTOM = 87.5
+BAND_CHANNELS = const(205)
+SCAN_RSSI_MIN = const(20)
+SCAN_SNR_MIN = const(4)
+RDS_SYNC_MS = const(250)        # no group by then: no RDS on the channel
+RDS_TIMEOUT_MS = const(2500)
+POLL_MS = const(20)
+
+class BandScanner:
+    def __init__(self, radio, rssi_min=SCAN_RSSI_MIN, snr_min=SCAN_SNR_MIN):
+        self.radio = radio
+        self.rssi_min = rssi_min
+        self.snr_min = snr_min
+        # rssi of each channel the seek stopped on, 0 for the others
+        self.signal = bytearray(BAND_CHANNELS)
+        self.stations = []
+        self.on_station = None
+        self.on_done = None
+        self.task = None
+        self.running = False    # tuning and reading RDS for the scan
+        self.frequency = None
+
+        self.sweep_ms = 0
+        self.names_ms = 0
+        self.named = 0
+
+    def start(self):
+        self.stop()
+        # restored by stop(), which may come before scan() runs
+        self.frequency = self.radio.get_frequency()
+        self.running = True
+        self.task = asyncio.create_task(self.scan())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+            self.running = False
+            self.radio.seek_stop()
+            self.radio.set_frequency(self.frequency)
+
+    async def scan(self):
+        radio = self.radio
+        for i in range(BAND_CHANNELS):
+            self.signal[i] = 0
+        self.stations = []
+        self.named = 0
+        start = utime.ticks_ms()
+        await self.sweep()
+        middle = utime.ticks_ms()
+        self.sweep_ms = utime.ticks_diff(middle, start)
+        await self.names()
+        self.names_ms = utime.ticks_diff(utime.ticks_ms(), middle)
+        # the radio gets its tune back
+        self.running = False
+        await radio.tune(self.frequency)
+        self.task = None
+        if self.on_done:
+            self.on_done()
+
+    async def sweep(self):
+        radio = self.radio
+        radio.set_seek_threshold(self.rssi_min, self.snr_min)
+        # the seek starts above the current channel: the bottom one is
+        # measured on its own
+        result = await radio.tune(BAND_BOTTOM)
+        if result is not None and result[2] and result[1] >= self.rssi_min:
+            self._found(result[0], result[1])
+        while True:
+            result = await radio.seek(up=True, wrap=False)
+            if result is None or not result[2]:
+                # band limit
+                return
+            self._found(result[0], result[1])
+
+    def _found(self, frequency, rssi):
+        frequency = round(frequency, 1)
+        self.signal[int(round(frequency*10)) - 875] = min(rssi, 0xFF)
+        index = len(self.stations)
+        while index and self.stations[index-1][0] > frequency:
+            index -= 1
+        self.stations.insert(index, [frequency, None, False])
+        if self.on_station:
+            self.on_station(index)
+
+    async def names(self):
+        radio = self.radio
+        rds = radio.rds
+        for station in sorted(self.stations, key=lambda s: -self.signal[int(round(s[0]*10)) - 875]):
+            if await radio.tune(station[0]) is None:
+                continue
+            radio.enable_rds(True)
+            groups = rds.groups
+            start = utime.ticks_ms()
+            while True:
+                await asyncio.sleep_ms(POLL_MS)
+                elapsed = utime.ticks_diff(utime.ticks_ms(), start)
+                if rds.ps_stable():
+                    break
+                if elapsed > RDS_TIMEOUT_MS or (rds.groups == groups and elapsed > RDS_SYNC_MS):
+                    break
+            if rds.ps_stable():
+                station[1] = rds.ps_shown.decode().strip()
+                self.named += 1
+                if self.on_station:
+                    self.on_station(self.stations.index(station))
+            radio.enable_rds(False)
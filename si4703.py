@@ -1,5 +1,7 @@
-import time
+import utime
+import uasyncio as asyncio
 from machine import Pin
+import perf
 
 I2C_ADDRESS = const(0x10)
 
@@ -17,164 +19,295 @@ REG_RDSB = const(0x0D)
 REG_RDSC = const(0x0E)
 REG_RDSD = const(0x0F)
 
-
-class RDSB:
-    RDS_A = const(0)
-    RDS_B = const(1)
-    RDS_C = const(2)
-    RDS_D = const(3)
-
-
-
-class BasicTuning(RDSB):
+# Registers 0x02-0x07 are written by the host only and are served from the
+# shadow copy. The chip updates status, channel and RDS on its own: these are
+# read again when marked stale (tune, seek, interrupt) or when too old.
+STALE_STATUS = const(0x0400)    # STATUSRSSI
+STALE_CHANNEL = const(0x0800)   # READCHAN
+STALE_RDS = const(0xF000)       # RDSA to RDSD
+STALE_VOLATILE = const(0xFC00)
+RSSI_MAX_AGE_MS = const(500)
+
+CRYSTAL_MS = const(500)         # oscillator start up
+POWERUP_MS = const(110)         # enable to ready
+TUNE_TIMEOUT_MS = const(500)
+SEEK_TIMEOUT_MS = const(15000)  # whole band, 60 ms per channel worst case
+POLL_MS = const(20)             # status polling without an interrupt pin
+
+# host owned registers, written as one span from 0x02 up to the highest one
+# that differs from what the chip holds
+WRITE_FIRST = const(0x02)
+WRITE_LAST = const(0x07)
+
+# RDS groups are dispatched on block B bits 15:11, group type and version
+RDS_GROUP_0A = const(0x00)
+RDS_GROUP_0B = const(0x01)
+RDS_GROUP_2A = const(0x04)
+RDS_GROUP_2B = const(0x05)
+RDS_GROUP_4A = const(0x08)
+
+RDS_PS_LEN = const(8)
+RDS_PS_STABLE = const(8)        # 0A groups agreeing: the whole PS twice more
+RDS_RT_LEN = const(64)
+RDS_AF_MAX = const(25)
+
+class RdsDecoder:
+    # Group decoder working on a preallocated state block: segments are
+    # tracked in bitmasks and a group costs no allocation, strings are only
+    # built when a complete new PS or radio text is handed to a handler.
     def __init__(self):
-        self.text = bytearray(8) # max of 8 chars
-        self.complete = False
-        self.segments_received = set()
-        self.last_segment = 3  # default to max segments
-
-    def process_data(self, block_kind, rds_blocks):
-        segment = rds_blocks[RDSB.RDS_B] & 0x03
-        self.segments_received.add(segment)
-        self._add_data(segment*2, rds_blocks[RDSB.RDS_D])
-
-        # check if we have all blocks
-        if len(self.segments_received) >= self.last_segment + 1:
-            self.complete = True
-
-    def _add_data(self, index, block):
-        c1 = (block >> 8) & 0xFF
-        self.text[index] = c1
-        c2 = block & 0xFF
-        self.text[index + 1] = c2
-        return c1, c2
-
-    def get_text(self):
-        res = self.text.decode("utf-8")
-        return res
-
-class RadioText(BasicTuning):
-    def __init__(self, version):
-        super().__init__()
-        self.version = version
-        self.text = bytearray(64)   # 16 * 4 bytes max
-        self.last_segment = 15 # default to max segments
-
-    def process_data(self, block_kind, rds_blocks):
-        segment = rds_blocks[RDSB.RDS_B] & 0x0F
-        if block_kind == 0:  # Text A
-            # Each segment has 4 characters (2 from block C, 2 from block D
-            self._add_data_A(segment, rds_blocks[RDSB.RDS_C], rds_blocks[RDSB.RDS_D])
-        else: # Text B
-            # Each segment has 2 characters from block D
-            self._add_data_B(segment, rds_blocks[RDSB.RDS_D])
-
-        self.segments_received.add(segment)
-
-        # check if we have all blocks
-        if len(self.segments_received) >= self.last_segment + 1:
-            self.complete = True
-
-    def _add_data_A(self, segment, blockC, blockD):
-        index = segment * 4
-        c1, c2 = self._add_data(index, blockC)
-        c3, c4 = self._add_data(index+2, blockD)
-        # check for end of text
-        if c1 == 0x0D or c2 == 0x0D or c3 == 0x0D or c4 == 0x0D: # or (c1 == 0x020 and c2 == 0x020 and c3 == 0x020 and c4 == 0x020):
-            self.last_segment = segment
-            self.text = self.text[:4*(self.last_segment+1)+1]
-
-    def _add_data_B(self, segment, blockD):
-        index = segment * 2
-        c1, c2 = self._add_data(index, blockD)
-        # check for end of text
-        if c1 == 0x0D or c2 == 0x0D: # or (c1 == 0x020 and c2 == 0x020):
-            self.last_segment = segment
-            self.text = self.text[:2*(self.last_segment+1)]
-
-    def get_text(self):
+        self.ps = bytearray(RDS_PS_LEN)
+        self.ps_shown = bytearray(RDS_PS_LEN)
+        self.rt = bytearray(RDS_RT_LEN)
+        self.rt_shown = bytearray(RDS_RT_LEN)
+        self.af = bytearray(RDS_AF_MAX)
+
+        self.pi_handler = None
+        self.ps_handler = None
+        self.ps_stable_handler = None   # a PS that stopped changing
+        self.rt_handler = None
+        self.ct_handler = None
+
+        self.table = [None]*32
+        self.table[RDS_GROUP_0A] = self._group_0
+        self.table[RDS_GROUP_0B] = self._group_0
+        self.table[RDS_GROUP_2A] = self._group_2a
+        self.table[RDS_GROUP_2B] = self._group_2b
+        self.table[RDS_GROUP_4A] = self._group_4a
+
+        self.groups = 0
+        self.reset()
+
+    def reset(self):
+        # new channel: forget everything, including what was last reported
+        self.pi = -1
+        self.pi_confirmed = False
+        self.pty = -1
+        self.tp = False
+        self.ta = False
+        self.ps_mask = 0
+        self.ps_shown_valid = False
+        self.ps_matches = 0     # 0A groups in a row agreeing with ps_shown
+        self.rt_mask = 0
+        self.rt_last = 15
+        self.rt_ab = -1
+        self.rt_group = -1
+        self.rt_shown_len = -1
+        self.af_count = 0
+
+    def decode(self, block_a, block_b, block_c, block_d):
+        self.groups += 1
+        if block_a != self.pi:
+            if self.pi != -1:
+                self.reset()
+            self.pi = block_a
+        elif not self.pi_confirmed:
+            # the same PI in two groups: reported long before the PS
+            self.pi_confirmed = True
+            if self.pi_handler:
+                self.pi_handler(block_a)
+        self.pty = (block_b >> 5) & 0x1F
+        self.tp = (block_b >> 10) & 0x01 == 1
+        handler = self.table[block_b >> 11]
+        if handler is not None:
+            handler(block_b, block_c, block_d)
+
+    def ps_stable(self):
+        # the PS shown came whole, then RDS_PS_STABLE groups agreed with it
+        return self.ps_shown_valid and self.ps_matches >= RDS_PS_STABLE
+
+    def _group_0(self, block_b, block_c, block_d):
+        # basic tuning: 2 PS characters, TA, and 2 AF codes in version A
+        segment = block_b & 0x03
+        self.ta = (block_b >> 4) & 0x01 == 1
+        self.ps[2*segment] = block_d >> 8
+        self.ps[2*segment+1] = block_d & 0xFF
+        if self.ps_shown_valid and self.ps_shown[2*segment] == block_d >> 8 and self.ps_shown[2*segment+1] == block_d & 0xFF:
+            self.ps_matches += 1
+            if self.ps_matches == RDS_PS_STABLE and self.ps_stable_handler:
+                self.ps_stable_handler(self.ps_shown.decode())
+        else:
+            self.ps_matches = 0
+        if block_b & 0x0800 == 0:
+            self._add_af(block_c >> 8)
+            self._add_af(block_c & 0xFF)
+        self.ps_mask |= 1 << segment
+        if self.ps_mask == 0x0F:
+            self.ps_mask = 0
+            if not self.ps_shown_valid or self.ps != self.ps_shown:
+                try:
+                    text = self.ps.decode()
+                except UnicodeError:
+                    return
+                self.ps_shown[:] = self.ps
+                self.ps_shown_valid = True
+                if self.ps_handler:
+                    self.ps_handler(text)
+
+    def _add_af(self, code):
+        # codes 1-204 are frequencies, the count code and fillers are skipped
+        if code == 0 or code > 204:
+            return
+        for i in range(self.af_count):
+            if self.af[i] == code:
+                return
+        if self.af_count < RDS_AF_MAX:
+            self.af[self.af_count] = code
+            self.af_count += 1
+
+    def get_af(self, index):
+        return 87.5 + self.af[index] / 10.0
+
+    def _rt_start(self, group, block_b):
+        ab = (block_b >> 4) & 0x01
+        if ab != self.rt_ab or group != self.rt_group:
+            # text A/B flag toggled: the station sends a new text
+            self.rt_ab = ab
+            self.rt_group = group
+            self.rt_mask = 0
+            self.rt_last = 15
+            for i in range(RDS_RT_LEN):
+                self.rt[i] = 0x20
+        return block_b & 0x0F
+
+    def _rt_char(self, segment, index, char):
+        self.rt[index] = char
+        if char == 0x0D:
+            self.rt_last = segment
+
+    def _group_2a(self, block_b, block_c, block_d):
+        segment = self._rt_start(RDS_GROUP_2A, block_b)
+        index = 4*segment
+        self._rt_char(segment, index, block_c >> 8)
+        self._rt_char(segment, index+1, block_c & 0xFF)
+        self._rt_char(segment, index+2, block_d >> 8)
+        self._rt_char(segment, index+3, block_d & 0xFF)
+        self._rt_segment(segment, 4)
+
+    def _group_2b(self, block_b, block_c, block_d):
+        segment = self._rt_start(RDS_GROUP_2B, block_b)
+        index = 2*segment
+        self._rt_char(segment, index, block_d >> 8)
+        self._rt_char(segment, index+1, block_d & 0xFF)
+        self._rt_segment(segment, 2)
+
+    def _rt_segment(self, segment, chars):
+        self.rt_mask |= 1 << segment
+        full = (2 << self.rt_last) - 1
+        if self.rt_mask & full != full:
+            return
+        self.rt_mask = 0
+        length = chars*(self.rt_last+1)
+        end = 0
+        while end < length and self.rt[end] != 0x0D:
+            end += 1
+        while end > 0 and self.rt[end-1] == 0x20:
+            end -= 1
+        if end == self.rt_shown_len:
+            same = 0
+            while same < end and self.rt[same] == self.rt_shown[same]:
+                same += 1
+            if same == end:
+                return
         try:
-            res = self.text.decode("utf-8")
+            text = self.rt[:end].decode()
         except UnicodeError:
-            return None
-        res = res.replace("/x0D", "")
-        res.rstrip()
-        return res
+            return
+        self.rt_shown[:end] = self.rt[:end]
+        self.rt_shown_len = end
+        if self.rt_handler:
+            self.rt_handler(text)
+
+    def _group_4a(self, block_b, block_c, block_d):
+        # clock time: UTC date as modified julian day, hour, minute and the
+        # local offset in half hours
+        mjd = ((block_b & 0x03) << 15) | (block_c >> 1)
+        hour = ((block_c & 0x01) << 4) | (block_d >> 12)
+        minute = (block_d >> 6) & 0x3F
+        offset = block_d & 0x1F
+        if block_d & 0x20:
+            offset = -offset
+        if self.ct_handler and hour < 24 and minute < 60:
+            self.ct_handler(mjd, hour, minute, offset)
 
 class SI4703:
     def __init__(self, i2c_bus, reset_pin, sen_pin, interrupt_pin=None):
 
+        # no bus access until power up: the bus may be given then, and the
+        # registers configured so far are written once the chip is read
         self.i2c = i2c_bus
+        self.attached = False
         self.reset_pin = reset_pin
         self.interrupt_pin = interrupt_pin
         self.shadow_register = [0]*16
+        # when each register was last read, and which ones need a read
+        self.read_ts = [0]*16
+        self.stale = STALE_VOLATILE
+        # what the chip holds for the host owned registers, and the buffer and
+        # views writes go through
+        self.written = [0]*16
+        self.write_buf = bytearray(2*(WRITE_LAST - WRITE_FIRST + 1))
+        self.write_views = [memoryview(self.write_buf)[:2*(i - WRITE_FIRST + 1)] for i in range(WRITE_FIRST, WRITE_LAST + 1)]
+        self.batch_depth = 0
+        self.register_batch = RegisterBatch(self)
+        self.write_count = 0
+        self.write_bytes = 0
+        # transactions, count and durations
+        self.read_time = perf.histogram("i2c.read")
+        self.write_time = perf.histogram("i2c.write")
 
         self.rds_irq = None
-        self.basic_tuning_handler = None
         self.tuned_irq = None
-        self.seek_complete_irq = None
-        self.radio_text_irq = None
-
-        self.seek_in_progress = False
 
-        self.radio_text = None
-        self.basic_tuning = None
+        self.rds = RdsDecoder()
 
-        self.old_radio_text_string = ""
-        self.old_basic_tuning_string = ""
-
-        #sen_pin.value(1)    # Enable I2C mode
-        #Pin(2, Pin.OUT).value(0)
-
-        # Reset the chip
-        #self.reset_pin.value(0)
-        #time.sleep(0.1)
-        #self.reset_pin.value(1)
-        #time.sleep(0.1)
-        self._read_registers()
+        # set by the pin interrupt, the chip is serviced by run()
+        self.irq_flag = asyncio.ThreadSafeFlag()
+        self.irq_count = 0
+        # set when a tune or seek completes, with its (frequency, rssi, valid)
+        self.stc_event = asyncio.Event()
+        self.stc_result = None
 
         # set initial configuration
         if self.interrupt_pin:
-            self.interrupt_pin.irq(trigger=Pin.IRQ_FALLING, handler=self._irq_handler)
+            self.interrupt_pin.irq(trigger=Pin.IRQ_FALLING, handler=self._irq_handler, hard=True)
             self.shadow_register[REG_SYSCONFIG1] |= 0xC004  # Enable interrupts and interrupt pin (GPIO2)
-            self._write_registers(REG_SYSCONFIG1)
 
         # Set europe config as default
         self.shadow_register[REG_SYSCONFIG1] |= 0x0800  # Set to De-emphasis 50us
         self.shadow_register[REG_SYSCONFIG2] |= 0x0010  # Set to 87.5MHz, 100kHz spacing
-        self._write_registers(REG_SYSCONFIG2) # write from REG_POWERCFG to REG_SYSCONFIG2
 
     def _irq_handler(self, pin):
+        # top half, in interrupt context: no I2C, no allocation
+        self.irq_count += 1
+        self.stale |= STALE_STATUS | STALE_RDS
+        self.irq_flag.set()
+
+    async def run(self):
+        # bottom half: reads the chip and calls the handlers from a task.
+        # Without an interrupt pin the status is polled, only while a tune
+        # or seek is pending or RDS is on.
+        registers = self.shadow_register
+        while True:
+            if self.interrupt_pin:
+                await self.irq_flag.wait()
+            else:
+                await asyncio.sleep_ms(POLL_MS)
+                if not (registers[REG_CHANNEL] & 0x8000 or registers[REG_POWERCFG] & 0x0100 or registers[REG_SYSCONFIG1] & 0x1000):
+                    continue
+            self._service()
+
+    def _service(self):
         self._read_registers(REG_STATUSRSSI)
         status = self.shadow_register[REG_STATUSRSSI]
 
         if status & 0x8000:  # RDS ready
             self._read_registers(REG_RDSD)
-            block_type = (self.shadow_register[REG_RDSB] >> 12) & 0x0F
-            block_kind = (self.shadow_register[REG_RDSB] >> 11) & 0x01
-            block_version = (self.shadow_register[REG_RDSB] >> 4) & 0x01
-            # Basic tuning (0x00)
-            if block_type == 0x00:
-                if self.basic_tuning == None:
-                    self.basic_tuning = BasicTuning()
-                self.basic_tuning.process_data(block_kind, self.shadow_register[REG_RDSA:REG_RDSD+1])
-                if self.basic_tuning.complete and self.basic_tuning_handler:
-                    text = self.basic_tuning.get_text()
-                    if text != self.old_basic_tuning_string:
-                        self.basic_tuning_handler(text)
-                        self.old_basic_tuning_string = text
-                        self.basic_tuning = None
-            # Radio text only (0x02)
-            elif block_type == 0x02:
-                if self.radio_text is None or self.radio_text.version != block_version:
-                    self.radio_text = RadioText(block_version)
-                self.radio_text.process_data(block_kind, self.shadow_register[REG_RDSA:REG_RDSD+1])
-                if self.radio_text.complete and self.radio_text_irq:
-                    text = self.radio_text.get_text()
-                    if text is not None and text != self.old_radio_text_string:
-                        self.radio_text_irq(text)
-                        self.old_radio_text_string = text
-                        self.radio_text = None
+            registers = self.shadow_register
+            # skip groups whose block B, which holds the group type, has
+            # uncorrectable errors (BLERB)
+            if registers[REG_READCHAN] & 0xC000 != 0xC000:
+                self.rds.decode(registers[REG_RDSA], registers[REG_RDSB], registers[REG_RDSC], registers[REG_RDSD])
             if self.rds_irq:
                 self.rds_irq()
             # Clear the interrupt flag
@@ -182,58 +315,104 @@ class SI4703:
             #self._write_registers(REG_STATUSRSSI)
 
         if status & 0x4000:  # Seek/Tune complete
-            if self.seek_in_progress:
-                if status & 0x2000: # SEEK reached limit
-                    self.seek_in_progress = False
-                    if self.seek_complete_irq:
-                        self.seek_complete_irq()
-                    # Clear the interrupt flag
-                    self.shadow_register[REG_POWERCFG] &= ~0x0100  # Clear SEEK bit
-                    self._write_registers(REG_POWERCFG)
-                    return
-
-                # Clear the interrupt flag
-                self.shadow_register[REG_POWERCFG] &= ~0x0100  # Clear SEEK bit
-                self._write_registers(REG_POWERCFG)
-
-                self.radio_text = None
-                self.basic_tuning = None
-
             # Clear the interrupt flag
             self.shadow_register[REG_CHANNEL] &= ~0x8000  # Clear TUNE bit
-            self._write_registers(REG_CHANNEL)
             self.shadow_register[REG_POWERCFG] &= ~0x0100  # Clear SEEK bit
-            self._write_registers(REG_POWERCFG)
+            self._commit()
             #get the found channel
             self._read_registers(REG_READCHAN)
             frequency = 87.5 + (self.shadow_register[REG_READCHAN] & 0x03FF) / 10.0
             if self.tuned_irq:
                 self.tuned_irq(frequency, self.shadow_register[REG_STATUSRSSI] & 0xFF, self.shadow_register[REG_STATUSRSSI]&0x1000 == 0)
+            self._stc_done(status & 0x3000 == 0)  # no seek failure, AFC rail or band limit
+
+    def _stc_done(self, valid):
+        frequency = 87.5 + (self.shadow_register[REG_READCHAN] & 0x03FF) / 10.0
+        self.stc_result = (frequency, self.shadow_register[REG_STATUSRSSI] & 0xFF, valid)
+        self.stc_event.set()
+
+    async def _wait_stc(self, timeout_ms):
+        # STC result, or None when the chip did not complete in time: the
+        # tune or seek is then abandoned
+        try:
+            await asyncio.wait_for_ms(self.stc_event.wait(), timeout_ms)
+        except asyncio.TimeoutError:
+            with self.batch():
+                self.shadow_register[REG_CHANNEL] &= ~0x8000  # Clear TUNE bit
+                self.shadow_register[REG_POWERCFG] &= ~0x0100  # Clear SEEK bit
+            self.stale |= STALE_STATUS | STALE_CHANNEL
+            return None
+        return self.stc_result
+
+    async def tune(self, frequency, timeout_ms=TUNE_TIMEOUT_MS):
+        # (frequency, rssi, valid) once tuned, None on timeout
+        self.stc_event.clear()
+        self.set_frequency(frequency)
+        return await self._wait_stc(timeout_ms)
+
+    async def seek(self, up=True, wrap=True, timeout_ms=SEEK_TIMEOUT_MS):
+        # (frequency, rssi, valid) where the seek stopped, valid is False
+        # when no station was found; None on timeout
+        self.stc_event.clear()
+        if up:
+            self.seek_up(wrap)
+        else:
+            self.seek_down(wrap)
+        return await self._wait_stc(timeout_ms)
+
+    async def power_up(self, i2c_bus=None):
+        # crystal then chip enable, the loop keeps running through both
+        # settling times
+        if i2c_bus is not None:
+            self.i2c = i2c_bus
+        self.power_cristal(True, wait=False)
+        await asyncio.sleep_ms(CRYSTAL_MS)
+        self.enable(True, wait=False)
+        await asyncio.sleep_ms(POWERUP_MS)
 
     def set_rds_irq(self, handler):
         self.rds_irq = handler
 
+    def set_pi_handler(self, handler):
+        self.rds.pi_handler = handler
+
     def set_basic_tuning_handler(self, handler):
-        self.basic_tuning_handler = handler
+        self.rds.ps_handler = handler
+
+    def set_ps_stable_handler(self, handler):
+        self.rds.ps_stable_handler = handler
 
     def set_tuned_irq(self, handler):
         self.tuned_irq = handler
 
-    def set_seek_complete_irq(self, handler):
-        self.seek_complete_irq = handler
-
     def set_radio_text_irq(self, handler):
-        self.radio_text_irq = handler
+        self.rds.rt_handler = handler
+
+    def set_clock_time_handler(self, handler):
+        self.rds.ct_handler = handler
+
+    def _attach(self):
+        # first read of the chip. Host registers start from zero, so the bits
+        # set before power up are merged onto the chip values and go out with
+        # the next write.
+        pending = self.shadow_register[WRITE_FIRST:WRITE_LAST+1]
+        self.attached = True
+        self._read_registers()
+        self.written[:] = self.shadow_register
+        for i in range(WRITE_FIRST, WRITE_LAST+1):
+            self.shadow_register[i] |= pending[i-WRITE_FIRST]
 
-    def power_cristal(self, on=True):
+    def power_cristal(self, on=True, wait=True):
+        if not self.attached:
+            self._attach()
         # Power up the crystal oscillator
         if on:
             self.shadow_register[REG_TEST1] |= 0x8100  # Set XOSCEN bit
         else:
             self.shadow_register[REG_TEST1] &= ~0x8000  # Clear XOSCEN bit
-        self._write_registers(REG_TEST1)
-        if on:
-            time.sleep(0.5)  # Wait for crystal to stabilize
+        self._commit()
+        if on and wait:
+            utime.sleep_ms(CRYSTAL_MS)  # Wait for crystal to stabilize
 
     def mute(self, on=True):
         # Mute or unmute audio
@@ -241,34 +420,44 @@ class SI4703:
             self.shadow_register[REG_POWERCFG] &= ~0x4000  # Clear DMUTE bit
         else:
             self.shadow_register[REG_POWERCFG] |= 0x4000  # Set DMUTE bit
-        self._write_registers(REG_POWERCFG)
+        self._commit()
 
-    def enable(self, on=True):
+    def enable(self, on=True, wait=True):
         # enable or disable chip
         if on:
             self.shadow_register[REG_POWERCFG] |= 0x0001  # Set ENABLE bit
         else:
             self.shadow_register[REG_POWERCFG] &= ~0x0001  # Clear ENABLE bit
-        self._write_registers(REG_POWERCFG)
-        if on:
-            time.sleep(0.1)  # Wait for powerup
+        self.stale |= STALE_VOLATILE
+        self._commit()
+        if on and wait:
+            utime.sleep_ms(POWERUP_MS)  # Wait for powerup
 
     def set_frequency(self, frequency):
-        self.enable_rds(False)
-        self.radio_text = None
-        self.basic_tuning = None
-        # Set the frequency in MHz
-        channel = int(frequency*10 - 875)  # Assuming 100kHz spacing
-        self.shadow_register[REG_CHANNEL] &= ~0x83FF  # Clear TUNE bit and channel
-        self.shadow_register[REG_CHANNEL] |= 0x8000 + (channel & 0x03FF) # Set TUNE bit and channel
-        self._write_registers(REG_CHANNEL)
+        with self.batch():
+            self.enable_rds(False)
+            # Set the frequency in MHz
+            channel = int(frequency*10 - 875)  # Assuming 100kHz spacing
+            self.shadow_register[REG_CHANNEL] &= ~0x83FF  # Clear TUNE bit and channel
+            self.shadow_register[REG_CHANNEL] |= 0x8000 + (channel & 0x03FF) # Set TUNE bit and channel
+            self.stale |= STALE_STATUS | STALE_CHANNEL
 
     def get_frequency(self):
         # Get the current frequency in MHz
-        self._read_registers(REG_READCHAN)
-        readchan = self.shadow_register[REG_READCHAN]
-        frequency = 87.5 + (readchan & 0x03FF) / 10.0
-        return frequency
+        return 87.5 + self.get_channel() / 10.0
+
+    def get_channel(self):
+        # 100 kHz steps from 87.5 MHz, no float
+        registers = self.shadow_register
+        if registers[REG_CHANNEL] & 0x8000:
+            # tune pending: report the channel the chip is heading to
+            channel = registers[REG_CHANNEL] & 0x03FF
+        else:
+            # the chip only moves during a seek
+            if registers[REG_POWERCFG] & 0x0100 or self.stale & STALE_CHANNEL:
+                self._read_registers(REG_READCHAN)
+            channel = registers[REG_READCHAN] & 0x03FF
+        return channel
 
     def set_volume(self, volume):
         # Set volume level (0-15)
@@ -279,11 +468,10 @@ class SI4703:
             self.shadow_register[REG_SYSCONFIG3] &= ~0x0100  # CLR attenuation bit
             volume -= 15 # adjust volume to 1-15 range
         self.shadow_register[REG_SYSCONFIG2] = (self.shadow_register[REG_SYSCONFIG2] & ~0x000F) | volume
-        self._write_registers(REG_SYSCONFIG3)
+        self._commit()
 
     def get_volume(self):
-        # Get current volume level (0-15)
-        self._read_registers(REG_SYSCONFIG3)
+        # Get current volume level (0-30), host owned: no bus access
         volume = self.shadow_register[REG_SYSCONFIG2] & 0x000F
         if (self.shadow_register[REG_SYSCONFIG3] & 0x0100) == 0: # if attenuation bit is clear
             volume += 15
@@ -295,58 +483,47 @@ class SI4703:
             self.shadow_register[REG_SYSCONFIG1] |= 0x1000  # Set RDS bit
         else:
             self.shadow_register[REG_SYSCONFIG1] &= ~0x1000  # Clear RDS bit
-            self.radio_text = None
-            self.basic_tuning = None
-        self._write_registers(REG_SYSCONFIG1)
-
-    def seek_all(self, rssi_min=20):
-        if not self.seek_in_progress:
-            # set FM impulse detection
-            self.shadow_register[REG_SYSCONFIG3] &= ~0x000F
-            self.shadow_register[REG_SYSCONFIG3] |= ~0x0008
-            # Start seek from lowest frequency
-            self.set_frequency(87.5)
-            self.seek_in_progress = True
-            #set interrupt flag for seek complete
-            if self.interrupt_pin:
-                self.shadow_register[REG_SYSCONFIG1] |= 0x4000  # Enable SEEK complete interrupt
-                self._write_registers(REG_SYSCONFIG1)
-            # set rssi minimum
+            self.rds.reset()
+        self._commit()
+
+    def set_seek_threshold(self, rssi_min=20, snr_min=4, impulses_max=8):
+        # where a seek stops: RSSI, SNR and FM impulse count thresholds
+        with self.batch():
             self.shadow_register[REG_SYSCONFIG2] &= ~0xFF00  # Clear RSSI bits
             self.shadow_register[REG_SYSCONFIG2] |= rssi_min<<8 # Set RSSI threshold
-            self._write_registers(REG_SYSCONFIG2)
-        self.seek_up(False)
+            self.shadow_register[REG_SYSCONFIG3] &= ~0x00FF
+            self.shadow_register[REG_SYSCONFIG3] |= (snr_min & 0x0F)<<4 | (impulses_max & 0x0F)
 
     def seek_stop(self):
         self.shadow_register[REG_POWERCFG] &= ~0x0100  # clear SEEK bit
-        self._write_registers(REG_POWERCFG)
-        self.seek_in_progress = False
+        self._commit()
 
     def seek_up(self, wrap=True):
-        self.enable_rds(False)  # Disable RDS during seek
-        self.radio_text = None
-        self.basic_tuning = None
-        # Seek upwards
-        self.shadow_register[REG_POWERCFG] &= ~0x0400 # Clr SEEKMODE (wrap) bit
-        self.shadow_register[REG_POWERCFG] |= 0x0300 + (0x0000 if wrap else 0x0400)  # Set SEEKMODE, SEEK and SEEKUP bit
-        self._write_registers(REG_POWERCFG)
-
-    def seek_down(self):
-        self.enable_rds(False)  # Disable RDS during seek
-        self.radio_text = None
-        self.basic_tuning = None
-        # Seek downwards
-        self.shadow_register[REG_POWERCFG] &= ~0x0200  # Clear SEEKUP bit
-        self.shadow_register[REG_POWERCFG] |= 0x0500  # Set SEEKMODE and SEEK bit
-        self._write_registers(REG_POWERCFG)
-
-    def get_rssi(self):
-        self._read_registers(REG_STATUSRSSI)
+        with self.batch():
+            self.enable_rds(False)  # Disable RDS during seek
+            # Seek upwards
+            self.shadow_register[REG_POWERCFG] &= ~0x0400 # Clr SEEKMODE (wrap) bit
+            self.shadow_register[REG_POWERCFG] |= 0x0300 + (0x0000 if wrap else 0x0400)  # Set SEEKMODE, SEEK and SEEKUP bit
+            self.stale |= STALE_STATUS | STALE_CHANNEL
+
+    def seek_down(self, wrap=False):
+        with self.batch():
+            self.enable_rds(False)  # Disable RDS during seek
+            # Seek downwards
+            self.shadow_register[REG_POWERCFG] &= ~0x0600  # Clear SEEKUP and SEEKMODE (wrap) bits
+            self.shadow_register[REG_POWERCFG] |= 0x0100 + (0x0000 if wrap else 0x0400)  # Set SEEK and SEEKMODE (stop at band limit) bits
+            self.stale |= STALE_STATUS | STALE_CHANNEL
+
+    def get_rssi(self, max_age_ms=RSSI_MAX_AGE_MS):
+        if self.stale & STALE_STATUS or utime.ticks_diff(utime.ticks_ms(), self.read_ts[REG_STATUSRSSI]) > max_age_ms:
+            self._read_registers(REG_STATUSRSSI)
         status = self.shadow_register[REG_STATUSRSSI]
         rssi = status & 0xFF
         return rssi
 
     def _read_registers(self, top_register=0x09):
+        if not self.attached:
+            return
         if top_register > 0x0F:
             raise ValueError("top_register must be between 0x00 and 0x0F")
 
@@ -354,20 +531,62 @@ class SI4703:
         read_len = nb_registers * 2
 
         # read starts at register 0x0A and reads 32 bytes (16 registers)
-        temp = self.i2c.readfrom(I2C_ADDRESS, read_len)
+        start = self.read_time.start()
+        try:
+            temp = self.i2c.readfrom(I2C_ADDRESS, read_len)
+        finally:
+            self.read_time.since(start)
+        now = utime.ticks_ms()
         # temp[0-1] = Reg 0A, temp[2-3] = Reg 0B, ..., temp[30-31] = Reg 19
         for i in range(nb_registers):
-            self.shadow_register[(i+0x0a)%16] = (temp[2*i] << 8) | temp[2*i + 1]
+            register = (i+0x0a)%16
+            self.shadow_register[register] = (temp[2*i] << 8) | temp[2*i + 1]
+            self.read_ts[register] = now
+            self.stale &= ~(1 << register)
+
+    def batch(self):
+        # with radio.batch(): register changes made in the block go out as
+        # a single write when it ends
+        return self.register_batch
+
+    def _commit(self):
+        # Write registers from 0x02 up to the highest one that changed
+        if self.batch_depth or not self.attached:
+            return
+        top = WRITE_LAST
+        while top >= WRITE_FIRST and self.shadow_register[top] == self.written[top]:
+            top -= 1
+        if top >= WRITE_FIRST:
+            self._write_registers(top)
 
     def _write_registers(self, top_register):
         # Write registers from 0x02 up to top_register
-        if top_register < 2 or top_register > 7:
+        if top_register < WRITE_FIRST or top_register > WRITE_LAST:
             raise ValueError("top_register must be between 2 and 7")
 
-        # write starts at register 0x02 and writes up to register 0x07
-        temp = bytearray()
-        for i in range(2, top_register + 1):
-            temp.append(self.shadow_register[i] >> 8)    # High byte
-            temp.append(self.shadow_register[i] & 0x00FF)  # Low byte
-
-        self.i2c.writeto(I2C_ADDRESS, temp)
+        buf = self.write_buf
+        for i in range(WRITE_FIRST, top_register + 1):
+            value = self.shadow_register[i]
+            buf[2*(i-WRITE_FIRST)] = value >> 8         # High byte
+            buf[2*(i-WRITE_FIRST)+1] = value & 0x00FF   # Low byte
+            self.written[i] = value
+        view = self.write_views[top_register - WRITE_FIRST]
+        start = self.write_time.start()
+        try:
+            self.i2c.writeto(I2C_ADDRESS, view)
+        finally:
+            self.write_time.since(start)
+        self.write_count += 1
+        self.write_bytes += len(view)
+
+class RegisterBatch:
+    def __init__(self, radio):
+        self.radio = radio
+
+    def __enter__(self):
+        self.radio.batch_depth += 1
+        return self.radio
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.radio.batch_depth -= 1
+        self.radio._commit()
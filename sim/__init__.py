@@ -0,0 +1,34 @@
+# Host side simulation of the alarm clock hardware.
+#
+# install() registers CPython stand-ins for the MicroPython modules used by
+# main.py, si4703.py, rotary.py and event.py (machine, st7789, fonts, utime,
+# uasyncio, micropython, network) so the application can boot headless:
+#
+#   from sim.board import Board
+#   board = Board()
+#   app = board.boot()
+#   board.run(board.demo(), seconds=5)
+
+import builtins
+import sys
+
+_MODULES = ("machine", "st7789", "framebuf", "utime", "uasyncio", "micropython", "network")
+
+
+def install():
+    if getattr(builtins, "const", None) is None:
+        builtins.const = lambda value: value
+
+    import importlib
+    for name in _MODULES:
+        if name not in sys.modules:
+            sys.modules[name] = importlib.import_module("sim." + name)
+
+    import gc
+    if not hasattr(gc, "mem_free"):
+        # MicroPython's gc reports the free heap
+        gc.mem_free = lambda: 100000
+
+    from sim import fonts
+    for font in fonts.FONTS:
+        sys.modules.setdefault(font.__name__, font)
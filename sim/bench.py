@@ -0,0 +1,1391 @@
+# Benchmarks on the simulated board.
+#
+#   python -m sim.bench            run everything
+#   python -m sim.bench events     run one benchmark
+#
+# Wall times are CPython times on the host: compare them between revisions,
+# not with the device.  SPI and I2C costs are exact.
+
+import asyncio
+import sys
+import time
+
+from sim.board import Board
+
+
+def _report(name, values):
+    print("{}:".format(name))
+    for key, value in values:
+        if isinstance(value, float):
+            value = "{:.3f}".format(value)
+        print("  {:<28} {}".format(key, value))
+
+
+def _percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def bench_events(bursts=40, burst=5):
+    # input to handled latency per detent and SPI cost per burst of detents
+    # spun within one frame, volume being adjusted with the radio playing
+    board = Board()
+    app = board.boot()
+    latencies = []
+    costs = []
+
+    async def script():
+        await asyncio.sleep(0.3)
+        board.click()           # select radio
+        await board.settle()
+        board.click()           # on/off mode: radio on
+        await asyncio.sleep(0.5)
+        board.push()            # hold the knob: volume
+        for i in range(bursts):
+            await board.frame()
+            display = board.display
+            before = display.bytes, display.windows
+            for _ in range(burst):
+                start = time.perf_counter()
+                board.rotate(1 if i % 4 < 2 else -1)
+                await board.settle()
+                latencies.append((time.perf_counter() - start) * 1000000)
+            await board.frame()
+            costs.append((display.bytes - before[0], display.windows - before[1]))
+        board.release()
+        await board.settle()
+
+    board.run(script())
+    _report("events ({} bursts of {} detents)".format(bursts, burst), (
+        ("latency median (us)", _percentile(latencies, 0.5)),
+        ("latency p95 (us)", _percentile(latencies, 0.95)),
+        ("spi bytes per burst", sum(c[0] for c in costs) / len(costs)),
+        ("spi windows per burst", sum(c[1] for c in costs) / len(costs)),
+    ))
+
+
+def bench_draw(seconds=3):
+    # SPI traffic of an idle clock with the radio playing RDS
+    board = Board()
+    app = board.boot()
+    stats = {}
+
+    async def script():
+        await asyncio.sleep(0.3)
+        board.click()
+        await board.settle()
+        board.click()
+        await asyncio.sleep(1)
+        board.display.reset_stats()
+        start = time.perf_counter()
+        await asyncio.sleep(seconds)
+        stats["elapsed"] = time.perf_counter() - start
+
+    board.run(script())
+    display = board.display
+    _report("draw (idle, {} s)".format(seconds), (
+        ("spi bytes per second", display.bytes / stats["elapsed"]),
+        ("spi windows per second", display.windows / stats["elapsed"]),
+    ))
+
+
+def bench_clock(ticks=600):
+    # SPI cost of one clock tick, rendered without the event loop
+    board = Board()
+    app = board.boot()
+    display = board.display
+    face = app.clock.face
+    renderer = app.renderer
+    renderer.flush()
+    secs = 0x2E000000
+    import utime
+    face.set_time(utime.localtime(secs))
+    renderer.flush()
+    display.reset_stats()
+    start = time.perf_counter()
+    for tick in range(1, ticks + 1):
+        face.set_time(utime.localtime(secs + tick))
+        renderer.flush()
+    elapsed = time.perf_counter() - start
+    _report("clock ({} ticks)".format(ticks), (
+        ("spi bytes per tick", display.bytes / ticks),
+        ("spi windows per tick", display.windows / ticks),
+        ("host us per tick", elapsed * 1000000 / ticks),
+    ))
+
+
+def bench_rds(groups=20000):
+    # decoder throughput on recorded group streams of every simulated station
+    import sim
+    sim.install()
+    from si4703 import RdsDecoder
+    from sim.tuner import DEFAULT_STATIONS, recorded_stream
+
+    streams = [recorded_stream(station, groups // len(DEFAULT_STATIONS)) for station in DEFAULT_STATIONS]
+    decoder = RdsDecoder()
+    texts = []
+    decoder.ps_handler = texts.append
+    decoder.rt_handler = texts.append
+    decode = decoder.decode
+    count = 0
+    start = time.perf_counter()
+    for stream in streams:
+        for a, b, c, d in stream:
+            decode(a, b, c, d)
+        count += len(stream)
+    elapsed = time.perf_counter() - start
+    _report("rds ({} groups)".format(count), (
+        ("groups per second (host)", count / elapsed),
+        ("texts reported", len(texts)),
+    ))
+
+
+def bench_queue(bursts=(4, 8, 16, 32, 64)):
+    # bursts of button events, which are not batched like detents, posted
+    # while the event loop is busy: queue occupancy, drops and post to pop
+    # latency. What fits is popped in order, the rest is dropped
+    board = Board()
+    app = board.boot()
+    Event = sys.modules["event"].Event
+    rows = []
+
+    async def script():
+        await asyncio.sleep(0.3)
+        events = app.events
+        router = app.router
+        for burst in bursts:
+            await board.settle()
+            popped = []
+            router.dispatch = lambda event: popped.append(event.type)
+            events.high_water = events.drops = events.latency_max = 0
+            posted = events.posted
+            for i in range(burst):      # no yield: the whole burst lands in one go
+                events.post(Event.KO_PUSH if i % 2 == 0 else Event.KO_REL)
+            await board.settle()
+            del router.dispatch
+            kept = min(burst, events.capacity)
+            assert events.posted - posted == kept and events.drops == burst - kept, "queue lost count"
+            assert popped == [Event.KO_PUSH if i % 2 == 0 else Event.KO_REL for i in range(kept)], "queue lost events"
+            rows.append(("burst {:>2} events".format(burst), "posted {:>3} popped {:>3} high water {:>2} drops {:>3} latency max {} us".format(
+                events.posted - posted, len(popped), events.high_water, events.drops, events.latency_max)))
+
+    board.run(script())
+    _report("queue (capacity {})".format(app.events.capacity), rows)
+
+
+def bench_encoder(spins=(1, 5, 20, 64), bounces=(0, 1, 3)):
+    # detents counted by the handlers against detents turned, with contact
+    # bounce and spins landing without a yield
+    board = Board()
+    app = board.boot()
+    rows = []
+
+    async def script():
+        await asyncio.sleep(0.3)
+        events = app.events
+        rotary = app.rotary
+        for bounce in bounces:
+            for detents in spins:
+                counted = []
+
+                def count(event, collect=rotary.collect):
+                    if not collect(event):
+                        return False
+                    counted.append(event.delta)
+                    return True
+
+                rotary.collect = count
+                drops = events.drops
+                invalid = rotary.invalid
+                posted = events.posted
+                board.rotate(detents, bounce)
+                await board.settle()
+                board.rotate(-detents, bounce)
+                await board.settle()
+                del rotary.collect
+                rows.append(("bounce {} spin {:>2}".format(bounce, detents),
+                    "counted {:>3}/{:<3} events {:>2} invalid {:>3} drops {}".format(
+                        sum(counted), 2*detents, events.posted - posted,
+                        rotary.invalid - invalid, events.drops - drops)))
+
+    board.run(script())
+    _report("encoder", rows)
+
+
+def bench_getters(calls=1000):
+    # tuner bus reads behind the getters the UI calls on every redraw and
+    # detent, with the radio tuned and RDS running
+    board = Board()
+    app = board.boot()
+    rows = []
+
+    async def script():
+        await asyncio.sleep(0.3)
+        board.click()
+        await board.settle()
+        board.click()           # radio on
+        await asyncio.sleep(0.5)
+        radio = app.radio
+        tuner = board.tuner
+        for name in ("get_volume", "get_frequency", "get_rssi"):
+            getter = getattr(radio, name)
+            reads = tuner.reads
+            start = time.perf_counter()
+            for _ in range(calls):
+                getter()
+            elapsed = time.perf_counter() - start
+            rows.append((name, "bus reads {:>4} host us per call {:.2f}".format(tuner.reads - reads, elapsed * 1000000 / calls)))
+        # volume detents: read, write, redraw
+        board.push()
+        reads = tuner.reads
+        for _ in range(20):
+            board.rotate(1)
+            await board.frame()
+        board.release()
+        rows.append(("20 volume detents", "bus reads {:>4}".format(tuner.reads - reads)))
+        await board.settle()
+
+    board.run(script())
+    _report("getters ({} calls each)".format(calls), rows)
+
+
+def bench_registers(rounds=50):
+    # I2C traffic per tuner operation, run outside the event loop so no
+    # interrupt service reads get in the way
+    board = Board()
+    app = board.boot()
+    radio = app.radio
+    # powered up by hand, start_radio() needs the loop
+    bus = board.machine.I2C(1)
+    radio.i2c = bus
+    radio.power_cristal(True, wait=False)
+    radio.enable(True, wait=False)
+    operations = (
+        ("set_volume", lambda i: radio.set_volume(5 + i % 10)),
+        ("set_frequency", lambda i: radio.set_frequency(88.6 if i % 2 else 105.5)),
+        ("enable_rds", lambda i: radio.enable_rds(i % 2 == 0)),
+        ("seek_up", lambda i: (radio.seek_up(), radio.seek_stop())),
+        ("set_seek_threshold", lambda i: radio.set_seek_threshold(20 + i % 2)),
+    )
+    rows = []
+    for name, operation in operations:
+        transactions, count = bus.transactions, bus.bytes
+        for i in range(rounds):
+            operation(i)
+        rows.append((name, "writes {:.1f} bytes {:.1f} per call".format(
+            (bus.transactions - transactions) / rounds, (bus.bytes - count) / rounds)))
+    _report("registers ({} calls each)".format(rounds), rows)
+
+
+def bench_boot(ntp_delays_ms=(0, 800)):
+    # startup phases, from the board power on, with a fast and a slow network
+    rows = []
+    for delay in ntp_delays_ms:
+        board = Board()
+        board.ntp.delay_ms = delay
+        app = board.boot()
+
+        async def script():
+            while app.boot.get("first audio") is None:
+                await asyncio.sleep(0.01)
+
+        board.run(script())
+        rows.append(("ntp {} ms".format(delay), " ".join("{} {}".format(name.replace(" ", "_"), ms) for name, ms in app.boot.phases)))
+    _report("boot (ms from power on)", rows)
+
+
+def bench_store(changes=200, loads=200):
+    # boot read and save cost of the application state: one json file per
+    # application saved whole on each change, against the state journal
+    import json
+    import os
+    import tempfile
+    import sim
+    sim.install()
+    from store import StateStore
+
+    stations = [[87.5 + i * 0.9, "STN {:<4}".format(i), i % 3 == 0] for i in range(20)]
+    state = {
+        "Radio": {},
+        "Alarm1": {"wakeup": [6, 30], "active": True, "volume": 12, "last_ring_date": [2026, 10, 1]},
+        "Alarm2": {"wakeup": [7, 45], "active": False, "volume": 8, "last_ring_date": [0, 0, 0]},
+        "Favorites": {"stations": stations},
+        "Settings": {"zone": 1},
+    }
+    names = list(state)
+    # a session: alarm volume and time edits, station toggles, zone changes
+    session = []
+    for i in range(changes):
+        if i % 4 == 0:
+            session.append(("Alarm1", "volume", 5 + i % 20))
+        elif i % 4 == 1:
+            session.append(("Alarm2", "wakeup", [i % 24, i % 60]))
+        elif i % 4 == 2:
+            stations[i % 20][2] = not stations[i % 20][2]
+            session.append(("Favorites", "stations", stations))
+        else:
+            session.append(("Settings", "zone", i % 5))
+
+    rows = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            written = 0
+            for name, key, value in session:
+                state[name][key] = value
+                with open("{}.json".format(name), "wt") as file:
+                    written += file.write(json.dumps(state[name]))
+            start = time.perf_counter()
+            for _ in range(loads):
+                for name in names:
+                    try:
+                        with open("{}.json".format(name), "rt") as file:
+                            json.load(file)
+                    except OSError:
+                        pass
+            elapsed = time.perf_counter() - start
+            size = sum(os.path.getsize(name + ".json") for name in names if os.path.exists(name + ".json"))
+            rows.append(("json files", "load {:.0f} us from {} files {} bytes, {} writes {} bytes".format(
+                elapsed * 1000000 / loads, len(names), size, len(session), written)))
+
+            store = StateStore()
+            store.load(names)
+            store.flush()   # migration
+            store.bytes_written = store.flushes = 0
+            for i, (name, key, value) in enumerate(session):
+                store.set(name, key, value)
+                if i % 10 == 9:     # changes coalesced over the flush delay
+                    store.flush()
+            store.flush()
+            start = time.perf_counter()
+            for _ in range(loads):
+                StateStore().load(names)
+            elapsed = time.perf_counter() - start
+            rows.append(("state journal", "load {:.0f} us from 1 file {} bytes, {} writes {} bytes, {} compactions".format(
+                elapsed * 1000000 / loads, store.size, store.flushes, store.bytes_written, store.compactions)))
+        finally:
+            os.chdir(cwd)
+    _report("store ({} changes)".format(changes), rows)
+
+
+def bench_alarms(counts=(2, 16, 128), ticks=3600):
+    # per second cost of the alarm check against the number of alarms: the
+    # former scan of every alarm, and the scheduler
+    import sim
+    sim.install()
+    import utime
+    from alarm import AlarmScheduler
+
+    class Alarm:
+        def __init__(self, index):
+            self.wakeup = [index % 24, (index * 7) % 60]
+            self.active = True
+            self.days = 0x7F
+            self.last_ring_date = [0, 0, 0]
+            self.ringing = False
+
+    rows = []
+    base = utime.mktime((2026, 10, 17, 0, 0, 0))
+    for count in counts:
+        alarms = [Alarm(i) for i in range(count)]
+        times = [utime.localtime(base + tick) for tick in range(ticks)]    # the clock face needs them anyway
+        start = time.perf_counter()
+        for tm in times:
+            for alarm in alarms:
+                if alarm.active and alarm.wakeup is not None:
+                    if [tm[3], tm[4]] == alarm.wakeup and alarm.last_ring_date != tm[:3] and not alarm.ringing:
+                        alarm.last_ring_date = tm[:3]
+        scan = (time.perf_counter() - start) * 1000000 / ticks
+
+        scheduler = AlarmScheduler()
+        alarms = [Alarm(i) for i in range(count)]
+        for alarm in alarms:
+            scheduler.invalidate(alarm)
+        rung = 0
+        start = time.perf_counter()
+        for tick in range(ticks):
+            now = base + tick
+            scheduler.update(now)
+            alarm = scheduler.pop_due(now)
+            while alarm is not None:
+                tm = utime.localtime(now)
+                alarm.last_ring_date = [tm[0], tm[1], tm[2]]
+                scheduler.invalidate(alarm)
+                rung += 1
+                alarm = scheduler.pop_due(now)
+        heap = (time.perf_counter() - start) * 1000000 / ticks
+        rows.append(("{} alarms".format(count), "scan {:.2f} us/tick, scheduler {:.2f} us/tick ({} rang)".format(scan, heap, rung)))
+    _report("alarms ({} ticks)".format(ticks), rows)
+
+
+def bench_mqtt(messages=5000, seconds=2, rates=(200, 1000)):
+    # publish throughput to the in-process broker, then event loop lag (10 ms
+    # sleeps overshoot) with the client idle, publishing at a steady rate,
+    # reconnecting to a flapping broker and queueing for a dead one
+    board = Board()
+    app = board.boot()
+    client = app.mqtt
+    delivered = [0]
+    board.broker.watch("bench/#", lambda topic, payload: delivered.__setitem__(0, delivered[0] + 1))
+    rows = []
+
+    async def lag(duration):
+        samples = []
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            samples.append((time.perf_counter() - start - 0.01) * 1000)
+        return "p50 {:.2f} ms p99 {:.2f} ms max {:.2f} ms".format(
+            _percentile(samples, 0.5), _percentile(samples, 0.99), max(samples))
+
+    async def publisher(rate, duration):
+        period = 1 / rate
+        end = time.perf_counter() + duration
+        i = 0
+        while time.perf_counter() < end:
+            client.publish("bench/rate/{}".format(i % 16), str(i))
+            i += 1
+            await asyncio.sleep(period)
+
+    async def script():
+        while app.homie.state != "ready":
+            await asyncio.sleep(0.01)
+        published, batches, sent = client.published, client.batches, client.bytes_out
+        start = time.perf_counter()
+        for i in range(messages):
+            if len(client.queue) >= client.queue_max:
+                await client.flush()
+            client.publish("bench/throughput/{}".format(i % 16), "payload {}".format(i))
+        while delivered[0] < messages:
+            await asyncio.sleep(0.001)
+        elapsed = time.perf_counter() - start
+        writes = client.batches - batches
+        rows.append(("throughput", "{:.0f} msg/s, {:.1f} msg and {:.0f} bytes per write".format(
+            messages / elapsed, (client.published - published) / writes, (client.bytes_out - sent) / writes)))
+
+        rows.append(("loop lag, idle", await lag(seconds)))
+        for rate in rates:
+            task = asyncio.create_task(publisher(rate, seconds))
+            rows.append(("loop lag, {} msg/s".format(rate), await lag(seconds)))
+            await task
+
+        async def flap():
+            while True:
+                await asyncio.sleep(0.2)
+                board.broker.drop_clients()
+        flapper = asyncio.create_task(flap())
+        task = asyncio.create_task(publisher(rates[0], seconds))
+        connects = client.connects
+        rows.append(("loop lag, broker flapping", await lag(seconds) + " ({} reconnects)".format(client.connects - connects)))
+        flapper.cancel()
+        await task
+
+        board.broker.accepting = False
+        board.broker.drop_clients()
+        dropped = client.dropped
+        task = asyncio.create_task(publisher(rates[0], seconds))
+        rows.append(("loop lag, broker down", await lag(seconds) + " (queued {}, dropped {})".format(
+            len(client.queue), client.dropped - dropped)))
+        await task
+
+    board.run(script())
+    _report("mqtt ({} messages)".format(messages), rows)
+
+
+def bench_homie(spins=40):
+    # MQTT traffic for attribute changes: volume spun with the radio on and
+    # favorites toggled, coalesced deltas against a full state per change
+    board = Board()
+    app = board.boot()
+    homie = app.homie
+    changes = [0]
+    publish = homie.publish
+
+    def count(prop, value):
+        changes[0] += 1
+        publish(prop, value)
+    homie.publish = count
+    rows = []
+
+    async def script():
+        while homie.state != "ready":
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(1.5)
+        properties = sum(len(node.properties) for node in homie.nodes.values())
+        full = sum(len(prop.topic) + 4 + len(prop.sent or "") for node in homie.nodes.values() for prop in node.properties.values())
+        changes[0] = 0
+        published, sent = app.mqtt.published, app.mqtt.bytes_out
+        board.click()           # select radio
+        await board.settle()
+        board.click()           # on/off mode: radio on
+        await asyncio.sleep(0.5)
+        board.push()            # hold the knob: volume
+        for i in range(spins):
+            board.rotate(1 if i % 4 < 2 else -1)
+            await asyncio.sleep(0.02)
+        board.release()
+        await asyncio.sleep(1.5)
+        messages = app.mqtt.published - published
+        rows.append(("attribute changes", changes[0]))
+        rows.append(("deltas", "{} messages, {} bytes".format(messages, app.mqtt.bytes_out - sent)))
+        rows.append(("full state per change", "{} messages, {} bytes".format(changes[0] * properties, changes[0] * full)))
+
+    board.run(script())
+    _report("homie ({} volume detents)".format(spins), rows)
+
+
+def _dense_band(count=30):
+    # a city band: a station every 0.6 MHz, one in three without RDS
+    from sim.tuner import Station
+    stations = []
+    for i in range(count):
+        frequency = 87.9 + 0.6 * i
+        name = None if i % 3 == 2 else "ST{:02}".format(i)
+        stations.append(Station(frequency, 22 + (i * 7) % 30, name, None, pi=0xF300 + i))
+    return stations
+
+
+def _display_stations(main, favorites, start, display, x, y, highlight_index=None, show_hearts=True):
+    # the previous list drawing: walk to start, format and draw every cell
+    Application = main.Application
+    x += 16
+    ctr = 0
+    iter_fav = iter(favorites)
+    while ctr != start:
+        next(iter_fav)
+        ctr += 1
+    x_offset = 0
+    y_offset = 0
+    while (ctr - start) < main.MAX_STATIONS:
+        try:
+            fav = next(iter_fav)
+            station = fav[1] if fav[1] is not None else "{:>4.1f}".format(fav[0])
+            text = "{} {:>8}".format("\x03" if fav[2] and show_hearts else " ", station)
+            if ctr == highlight_index:
+                display.text(main.vga2_8x16, text, x + x_offset, y + y_offset, Application.background, Application.foreground)
+            else:
+                display.text(main.vga2_8x16, text, x + x_offset, y + y_offset, Application.foreground)
+        except StopIteration:
+            display.text(main.vga2_8x8, " " * 11, x + x_offset, y + y_offset, Application.foreground)
+        if x_offset != 0:
+            x_offset = 0
+            y_offset += 18
+        else:
+            x_offset = 12 * 8
+        ctr += 1
+
+
+def bench_scan():
+    # favorites band scan from the UI: time to a complete list, stations
+    # found and named, and SPI traffic, against the previous scan (seek,
+    # wait up to 1 s for a PS, redraw the whole list, seek again)
+    rows = []
+    for band_name, stations in (("default band", None), ("dense band", _dense_band())):
+        for engine in ("seek and wait", "two passes"):
+            board = Board(stations)
+            app = board.boot()
+            from scan import SCAN_RSSI_MIN
+            result = {}
+
+            async def seek_and_wait():
+                radio = app.radio
+                rds = radio.rds
+                found = []
+                radio.mute(True)
+                radio.set_seek_threshold(SCAN_RSSI_MIN)
+                await radio.tune(87.5)
+                while True:
+                    stop = await radio.seek(up=True, wrap=False)
+                    if stop is None or not stop[2]:
+                        break
+                    radio.enable_rds(True)
+                    start = time.perf_counter()
+                    while not rds.ps_shown_valid and time.perf_counter() - start < 1:
+                        await asyncio.sleep(0.01)
+                    found.append([round(stop[0], 1), rds.ps_shown.decode().strip() if rds.ps_shown_valid else None, False])
+                    result["listed"] = time.perf_counter() - result["start"]
+                    _display_stations(board.main, found, max(0, (len(found) - 11) & ~1), app.display, 0, 32)
+                    radio.enable_rds(False)
+                return found
+
+            async def script():
+                while app.boot.get("first audio") is None:
+                    await asyncio.sleep(0.01)
+                display = app.display
+                before = display.bytes
+                start = result["start"] = time.perf_counter()
+                if engine == "two passes":
+                    board.rotate(3)         # favorites
+                    await board.settle()
+                    board.click()
+                    await board.settle()
+                    board.rotate(1)         # scan mode
+                    await board.settle()
+                    board.click()
+                    mode = app.favorites_app.modes[1]
+                    while not mode.seek_done:
+                        await asyncio.sleep(0.01)
+                    found = mode.stations
+                    result["listed"] = mode.scanner.sweep_ms / 1000
+                else:
+                    found = await seek_and_wait()
+                result["seconds"] = time.perf_counter() - start
+                result["found"] = len(found)
+                result["named"] = sum(1 for station in found if station[1] is not None)
+                result["spi"] = display.bytes - before
+
+            board.run(script())
+            expected = sum(1 for station in board.tuner.stations.values() if station.rssi >= SCAN_RSSI_MIN)
+            rows.append(("{}, {}".format(band_name, engine), "all found {:.1f} s, done {:.1f} s, {}/{} found, {} named, {} spi bytes".format(
+                result["listed"], result["seconds"], result["found"], expected, result["named"], result["spi"])))
+    _report("scan", rows)
+
+
+def bench_stations(rounds=2):
+    # tune to name on screen, for each station of the band: the first round
+    # waits for the whole PS, later ones show the indexed name at once and
+    # confirm it with the PI code
+    from sim.tuner import Station, ps_groups
+    board = Board()
+    app = board.boot()
+    rows = []
+
+    async def script():
+        while app.boot.get("first audio") is None:
+            await asyncio.sleep(0.01)
+        manager = app.radio_mgr
+        manager.set_radio_on(True)
+        widget = manager.station_name
+        for round_index in range(rounds):
+            shown = []
+            confirmed = []
+            for channel, station in sorted(board.tuner.stations.items()):
+                if station.ps is None:
+                    continue
+                frequency = (channel + 875) / 10
+                start = time.perf_counter()
+                manager.tune_to(frequency)
+                while widget.text is not None:
+                    await asyncio.sleep(0.001)
+                while widget.text is None:
+                    await asyncio.sleep(0.001)
+                shown.append((time.perf_counter() - start) * 1000)
+                while not widget.confirmed or widget.text.strip() != station.ps:
+                    await asyncio.sleep(0.001)
+                confirmed.append((time.perf_counter() - start) * 1000)
+            rows.append(("round {}".format(round_index + 1), "name shown {:.0f} ms, confirmed {:.0f} ms (median of {})".format(
+                _percentile(shown, 0.5), _percentile(confirmed, 0.5), len(shown))))
+        # index records written for a static PS and for a dynamic one
+        # changing word every two cycles, over the same 400 groups
+        manager.radio.enable_rds(False)
+        await board.settle()
+        rds = manager.radio.rds
+        store = app.store
+        set_record = store.set
+        saved = []
+
+        def counting(name, key, value):
+            if name == "Stations":
+                saved.append(value[1])
+            set_record(name, key, value)
+        store.set = counting
+        for name, words in (("static PS", ["FIP     "]), ("dynamic PS", ["NOVA    ", "LE GRAND", "MIX     ", "24H/24  "])):
+            del saved[:]
+            rds.reset()
+            names = set()
+            for i in range(100):
+                station = Station(98.2, 40, ps=words[i // 2 % len(words)], pi=0xF201)
+                for group in ps_groups(station):
+                    rds.decode(*group)
+                await board.settle()
+                names.add(manager.station_name.text)
+            rows.append((name, "{} names shown, {} index records".format(len(names), len(saved))))
+        store.set = set_record
+
+    board.run(script())
+    _report("stations (tune to name)", rows)
+
+
+RADIO_TEXT = "Le meilleur de la musique en continu sur votre radio locale"
+
+
+def bench_scroll(seconds=4):
+    # radio text scrolling: the old task per character step redrawing 14
+    # glyphs, against the scroller task blitting the offscreen strip
+    board = Board()
+    app = board.boot()
+    main = board.main
+    display = board.display
+    rows = []
+
+    async def old_scroll(widget, counts):
+        # the previous RadioManager.do_scroll_text, a new task for each step
+        text = RADIO_TEXT.strip() + " " * 14
+        pos = 0
+        first = False       # measured past the hold on the start
+        while True:
+            counts["tasks"] += 1
+            start = time.perf_counter()
+            display.text(main.vga2_bold_16x32, text[pos:pos + 14], widget.x, widget.y, main.st7789.WHITE, main.st7789.BLACK)
+            counts["draw"] += time.perf_counter() - start
+            counts["frames"] += 1
+            counts["moved"] += 16
+            await asyncio.sleep(2 if first else .250)
+            pos += 1
+            first = pos > len(text) - 14
+            if first:
+                pos = 0
+
+    async def measure(name, run):
+        counts = {"tasks": 0, "frames": 0, "moved": 0, "draw": 0.0}
+        display.reset_stats()
+        task = asyncio.ensure_future(run(counts))
+        await asyncio.sleep(seconds)
+        task.cancel()
+        rows.append((name, "{:.0f} B/s, {:.1f} windows/s, {:.0f} px/s in steps of {} px, {:.1f} tasks/s, {:.2f} ms per frame".format(
+            display.bytes / seconds, display.windows / seconds, counts["moved"] / seconds,
+            counts["moved"] // max(counts["frames"], 1), counts["tasks"] / seconds,
+            counts["draw"] * 1000 / max(counts["frames"], 1))))
+
+    async def new_scroll(counts):
+        widget = app.radio_mgr.radio_text
+        draw = widget.draw
+
+        def timed(display):
+            start = time.perf_counter()
+            draw(display)
+            counts["draw"] += time.perf_counter() - start
+            counts["frames"] += 1
+
+        widget.draw = timed
+        widget.set(RADIO_TEXT)
+        # the scroller is already running: no task is created
+        widget.hold = 0
+        try:
+            while True:
+                offset = widget.offset
+                await asyncio.sleep(0.001)
+                counts["moved"] += (widget.offset - offset) % widget.wrap
+        finally:
+            widget.draw = draw
+            widget.set(None)
+
+    async def script():
+        while app.boot.get("first audio") is None:
+            await asyncio.sleep(0.01)
+        manager = app.radio_mgr
+        manager.set_radio_on(True)
+        await asyncio.sleep(0.5)
+        # no RDS from the tuner during the measures
+        manager.radio.enable_rds(False)
+        manager.radio_text.set(None)
+        await board.settle()
+        await measure("old (task per step)", lambda counts: old_scroll(manager.radio_text, counts))
+        await measure("new (strip scroller)", new_scroll)
+        widget = manager.radio_text
+        widget.set(RADIO_TEXT)
+        await asyncio.sleep(0.5)
+        manager.set_radio_on(False)
+        await board.settle()
+        frames = widget.frames
+        await asyncio.sleep(1)
+        rows.append(("radio off", "{} scroller frames in 1 s".format(widget.frames - frames)))
+
+    board.run(script())
+    _report("scroll (radio text, {} s)".format(seconds), rows)
+
+
+def bench_compose(rounds=48):
+    # main area and mini panels drawn straight on the display, against
+    # composed offscreen and sent by the renderer
+    rows = []
+    for offscreen in (False, True):
+        board = Board()
+        app = board.boot(OFFSCREEN=offscreen, OFFSCREEN_MINI=offscreen)
+        main = board.main
+        display = board.display
+        results = {}
+
+        async def script():
+            while app.boot.get("first audio") is None:
+                await asyncio.sleep(0.01)
+            renderer = app.renderer
+            await board.settle()
+            await asyncio.sleep(0.1)
+            renderer.flush()
+            stations = [[88.0 + i, "STATION{}".format(i), i % 3 == 0] for i in range(main.MAX_STATIONS)]
+            station_list = renderer.add(main.StationList(app.display, 0, 32))
+            station_list.show(stations)
+
+            def measure(name, draw):
+                display.reset_stats()
+                start = time.perf_counter()
+                for i in range(rounds):
+                    draw(i)
+                    renderer.flush()
+                elapsed = time.perf_counter() - start
+                results[name] = (display.bytes / rounds, display.windows / rounds, elapsed * 1000 / rounds)
+
+            measure("station list", lambda i: station_list.move(i % len(stations)))
+            alarm_set = app.apps[1].modes[3]
+
+            def alarm_time(i):
+                alarm_set.minute = i % 60
+                alarm_set.display_time(first=i == 0)
+            measure("alarm time", alarm_time)
+
+            def minis(i):
+                for mini_app in app.apps:
+                    mini_app.display_mini()
+            measure("mini panels", minis)
+
+        board.run(script())
+        for name, (spi_bytes, windows, ms) in results.items():
+            rows.append(("{} ({})".format(name, "offscreen" if offscreen else "direct"),
+                         "{:.0f} B, {:.1f} windows, {:.2f} ms".format(spi_bytes, windows, ms)))
+    _report("compose (per redraw)", rows)
+
+
+def bench_perf(records=20000, spins=40):
+    # cost of a histogram record, then the histograms after some use of the
+    # clock as dumped on the console and published to the broker
+    board = Board()
+    app = board.boot()
+    perf = sys.modules["perf"]
+    rows = []
+
+    hist = perf.Histogram("bench")
+    start = time.perf_counter()
+    for i in range(records):
+        hist.since(board.main.utime.ticks_us())
+    rows.append(("record cost (us)", (time.perf_counter() - start) * 1e6 / records))
+
+    messages = []
+    board.broker.watch(app.homie.topic + "/$perf/#", lambda topic, payload: messages.append((topic, payload)))
+
+    async def script():
+        while app.homie.state != "ready":
+            await asyncio.sleep(0.01)
+        perf.reset()
+        board.click()
+        await board.settle()
+        board.click()
+        await asyncio.sleep(1)
+        for i in range(spins):
+            board.rotate(1 if i % 4 < 2 else -1)
+            await asyncio.sleep(0.02)
+        board.ko_click()
+        await asyncio.sleep(1)
+        await perf.publish(app.mqtt, app.homie.topic + "/$perf")
+        await asyncio.sleep(0.2)
+
+    board.run(script())
+    rows.append(("histograms", len(perf.histograms)))
+    rows.append(("published", "{} messages".format(len(messages))))
+    for name in ("event.rot_cw", "event.tuned", "handler.radio_manager", "handler.app.radio",
+                 "draw.ClockFace", "draw.Surface", "i2c.read", "i2c.write"):
+        if name in perf.histograms:
+            rows.append((name, perf.histograms[name].summary()))
+    _report("perf (count avg p50 p99 max, us)", rows)
+
+
+def bench_monitor(seconds=2):
+    # loop lag of the running clock, then stalls injected in a state write,
+    # an I2C read and a handler: the monitor names them, and the watchdog
+    # resets the board on the one longer than its timeout
+    board = Board()
+    app = board.boot()
+    monitor = app.monitor
+    monitor_module = sys.modules["monitor"]
+    monitor_module.WDT_TIMEOUT_MS = 1500
+    machine = board.machine
+    rows = []
+
+    def stalling(function, seconds):
+        def stalled(*args, **kwargs):
+            time.sleep(seconds)
+            return function(*args, **kwargs)
+        return stalled
+
+    async def script():
+        while app.homie.state != "ready":
+            await asyncio.sleep(0.01)
+        monitor.lag.reset()
+        board.click()
+        await board.settle()
+        board.click()
+        await asyncio.sleep(seconds)
+        rows.append(("lag, radio on", monitor.lag.summary()))
+
+        store = app.store
+        flush = store.flush
+        store.flush = stalling(flush, 0.8)
+        app.radio_app.volume = app.radio_app.volume + 1
+        await asyncio.sleep(3)
+        store.flush = flush
+
+        read = board.tuner.readfrom
+        board.tuner.readfrom = stalling(read, 0.7)
+        app.radio.get_rssi(max_age_ms=0)
+        board.tuner.readfrom = read
+        await asyncio.sleep(0.2)
+
+        route = app.router.routes[board.main.Event.ROT_CW]
+        priority, handle, timer = route[0]
+        route[0] = (priority, stalling(handle, 2.0), timer)
+        board.rotate(1)
+        await asyncio.sleep(0.3)
+        route[0] = (priority, handle, timer)
+        await asyncio.sleep(0.5)
+
+    board.run(script())
+    for at, section, ms in monitor.stalls:
+        rows.append(("stall", "{} ms in {}".format(ms, section)))
+    rows.append(("watchdog", "{} feeds, {} withheld, {} resets".format(monitor.feeds, monitor.withheld, machine.WDT.resets)))
+    _report("monitor (lag: count avg p50 p99 max, us)", rows)
+
+
+class _ObjectRecord:
+    # the previous event record: an object per ring slot, frequency a float
+    def __init__(self, event_type):
+        self.type = event_type
+        self.delta = 1
+        self.accel = 1
+        self.frequency = 0.0
+        self.rssi = 0
+        self.valid = False
+        self.text = None
+        self.pi = 0
+        self.ts = 0
+
+
+class _ObjectQueue:
+    # the previous EventsQueue: records swapped out of the ring on pop
+    def __init__(self, capacity):
+        import perf
+        self.ring = [_ObjectRecord(0) for _ in range(capacity)]
+        self.spare = _ObjectRecord(0)
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
+        self.latency_max = 0
+        self.latency_avg = 0
+        self.latency = [perf.histogram("event." + name) for name in sys.modules["event"].EVENT_NAMES]
+
+    def post(self, event_type, frequency=0.0, rssi=0, valid=False, text=None, pi=0):
+        import machine
+        import utime
+        state = machine.disable_irq()
+        index = self.head + self.count
+        if index >= self.capacity:
+            index -= self.capacity
+        event = self.ring[index]
+        event.type = event_type
+        event.delta = 1
+        event.accel = 1
+        event.frequency = frequency
+        event.rssi = rssi
+        event.valid = valid
+        event.text = text
+        event.pi = pi
+        event.ts = utime.ticks_us()
+        self.count += 1
+        machine.enable_irq(state)
+
+    def pop(self):
+        import machine
+        import utime
+        state = machine.disable_irq()
+        event = self.ring[self.head]
+        self.ring[self.head] = self.spare
+        self.spare = event
+        self.head += 1
+        if self.head == self.capacity:
+            self.head = 0
+        self.count -= 1
+        machine.enable_irq(state)
+        latency = utime.ticks_diff(utime.ticks_us(), event.ts)
+        if latency > self.latency_max:
+            self.latency_max = latency
+        self.latency_avg += (latency - self.latency_avg) >> 3
+        self.latency[event.type].add(latency)
+        return event
+
+
+def bench_records(tunes=500, rds_per_tune=9, channels=10):
+    # event records: memory held by a full ring, floats boxed and post+pop
+    # time for a tune followed by RDS events on the same channel
+    import tracemalloc
+    Board()
+    import event
+    Event = event.Event
+
+    class Flag:
+        def set(self):
+            pass
+
+    # the perf histograms exist before measuring
+    event.EventsQueue(Flag())
+
+    def full_ring(make, post):
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        queue = make()
+        for i in range(queue.capacity):
+            post(queue, i % channels)
+        held = tracemalloc.get_traced_memory()[0] - base
+        tracemalloc.stop()
+        return held
+
+    def stream(queue, post):
+        floats = 0
+        last = None
+        start = time.perf_counter()
+        for tune in range(tunes):
+            channel = tune % channels
+            for i in range(1 + rds_per_tune):
+                post(queue, channel, Event.TUNED if i == 0 else Event.RDS_PI)
+                popped = queue.pop()
+                if popped.frequency is not last:
+                    floats += 1
+                    last = popped.frequency
+        elapsed = time.perf_counter() - start
+        return floats, elapsed * 1e6 / (tunes * (1 + rds_per_tune))
+
+    capacity = event.EVENTS_CAPACITY
+
+    def post_object(queue, channel, event_type=Event.TUNED):
+        # the producers read the frequency as a float
+        queue.post(event_type, 87.5 + channel / 10.0, 40, True, None, 0x1234)
+
+    def post_record(queue, channel, event_type=Event.TUNED):
+        queue.post(event_type, channel, 40, True, None, 0x1234)
+
+    rows = []
+    count = tunes * (1 + rds_per_tune)
+    for name, make, post in (("objects", lambda: _ObjectQueue(capacity), post_object),
+                             ("array records", lambda: event.EventsQueue(Flag(), capacity), post_record)):
+        held = full_ring(make, post)
+        floats, us = stream(make(), post)
+        rows.append((name, "{} B held by {} events, {} floats for {} events, {:.2f} us per post+pop".format(
+            held, capacity, floats, count, us)))
+    _report("records ({} tunes, {} RDS events each)".format(tunes, rds_per_tune), rows)
+
+
+def bench_list(lengths=(12, 48, 200), detents=200):
+    # favorites list, one detent at a time through the whole list: the
+    # previous redraw of every cell against the list view repainting the
+    # cells that changed, drawing on the display or scrolling offscreen
+    rows = []
+    for offscreen in (False, True):
+        _bench_list(offscreen, lengths, detents, rows)
+    _report("list ({} detents)".format(detents), rows)
+
+
+def _bench_list(offscreen, lengths, detents, rows):
+    board = Board()
+    app = board.boot(OFFSCREEN=offscreen, OFFSCREEN_MINI=offscreen)
+    main = board.main
+    display = board.display
+
+    async def script():
+        while app.boot.get("first audio") is None:
+            await asyncio.sleep(0.01)
+        renderer = app.renderer
+        await board.settle()
+        renderer.flush()
+        for length in lengths:
+            stations = [[87.6 + i / 10, "STAT{}".format(i) if i % 2 else None, i % 3 == 0] for i in range(length)]
+
+            def old_detent(i):
+                # centered on the highlighted row
+                highlight = i % length
+                start = (highlight & ~1) - main.MAX_STATIONS // 2
+                start = max(0, min(start, ((length + 1) & ~1) - main.MAX_STATIONS))
+                _display_stations(main, stations, start, app.display, 0, 32, highlight)
+                renderer.flush()
+
+            station_list = renderer.add(main.StationList(app.display, 0, 32))
+            station_list.show(stations, 0, 0)
+            renderer.flush()
+
+            def new_detent(i):
+                station_list.move(i % length)
+                renderer.flush()
+
+            for name, detent in (("old", old_detent), ("new", new_detent)):
+                display.reset_stats()
+                repaints = station_list.repaints
+                start = time.perf_counter()
+                for i in range(1, detents + 1):
+                    detent(i)
+                elapsed = time.perf_counter() - start
+                cells = "{:.1f} cells".format((station_list.repaints - repaints) / detents) if name != "old" else "12 cells"
+                rows.append(("{} stations, {}{}".format(length, name, " offscreen" if offscreen else ""), "{:.0f} us, {}, {:.0f} spi bytes, {:.1f} windows per detent".format(
+                    elapsed * 1e6 / detents, cells, display.bytes / detents, display.windows / detents)))
+            station_list.hide()
+
+    board.run(script())
+
+
+def _chained(app):
+    # the previous dispatch: every event through the radio manager, the
+    # clock, then the apps, each testing the type
+    import perf
+    manager = app.radio_mgr
+    clock = app.clock
+    radio_time = perf.histogram("handler.radio_manager")
+    clock_time = perf.histogram("handler.clock")
+
+    def dispatch(event):
+        start = radio_time.start()
+        handled = manager.station_event(event) is None or manager.volume_event(event) is None
+        radio_time.since(start)
+        if handled:
+            return True
+        start = clock_time.start()
+        handled = clock.alarm_event(event) is None
+        clock_time.since(start)
+        if handled:
+            return True
+        app.app_event(event)
+        return False
+    return dispatch
+
+
+def bench_router(rounds=2000, repeats=9):
+    # events per second through dispatch and handlers, radio playing: RDS
+    # groups with the apps unselected, then the knob browsing the apps. The
+    # two engines take turns, the best of repeats runs counts
+    board = Board()
+    app = board.boot()
+    Event = board.main.Event
+    rows = []
+
+    def make(event_type, **fields):
+        event = Event(event_type)
+        event.channel = 107
+        event.frequency = 98.2
+        event.rssi = 40
+        event.pi = 0xF201
+        for name, value in fields.items():
+            setattr(event, name, value)
+        return event
+
+    mixes = (
+        ("rds", [make(Event.RDS_Radio_Text, text="RADIO TEXT " * 5), make(Event.RDS_PI),
+                 make(Event.RDS_Basic_Tuning, text="FIP     "), make(Event.RDS_PI)]),
+        ("knob", [make(Event.ROT_CW), make(Event.ROT_CW), make(Event.ROT_CCW), make(Event.ROT_CCW)]),
+        ("buttons", [make(Event.KO_PUSH), make(Event.KO_REL), make(Event.TIMEOUT), make(Event.SEEK_COMPLETE)]),
+    )
+
+    async def script():
+        while app.boot.get("first audio") is None:
+            await asyncio.sleep(0.01)
+        app.radio_mgr.set_radio_on(True)
+        await board.settle()
+        engines = (("chain", _chained(app)), ("router", app.router.dispatch))
+        for name, events in mixes:
+            best = {}
+            for repeat in range(repeats):
+                for engine, dispatch in engines:
+                    elapsed = 0
+                    for i in range(rounds):
+                        start = time.perf_counter()
+                        for event in events:
+                            dispatch(event)
+                        elapsed += time.perf_counter() - start
+                        # the screen is drawn outside the measure
+                        app.renderer.flush()
+                    best[engine] = min(best.get(engine, elapsed), elapsed)
+            count = rounds * len(events)
+            for engine, dispatch in engines:
+                rows.append(("{}, {}".format(name, engine), "{:.0f} events/s, {:.2f} us per event".format(
+                    count / best[engine], best[engine] * 1e6 / count)))
+            rows.append(("{}, router/chain".format(name), "{:.2f}".format(best["router"] / best["chain"])))
+
+    board.run(script())
+    _report("router ({} rounds)".format(rounds), rows)
+
+
+def bench_time(seconds=12, drift_ppm=5000):
+    # time service on a board whose crystal runs drift_ppm fast, with the
+    # periods shortened to seconds: error of the disciplined time and of
+    # the RTC set once at boot, like before, against the wall time; time
+    # from boot to a synced clock without network, from the RDS clock time;
+    # lateness of an alarm
+    from sim import utime
+    rows = []
+    # re-anchored every second, not every hour
+    fast = dict(SYNC_S=2, RETRY_S=1, NTP_STALE_S=4, DRIFT_MIN_S=1, DRIFT_MAX_PPM=20000, SLEW_PPM=20000, ANCHOR_MS=1000)
+
+    def start(network=True, edge_in_s=None):
+        utime.drift_ppm = drift_ppm
+        # the next minute of the wall time begins edge_in_s after boot
+        utime.wall_offset = 0.0
+        if edge_in_s is not None:
+            utime.wall_offset = 60 - edge_in_s - utime.wall_time() % 60
+        board = Board()
+        board.ntp.answering = network
+        app = board.boot()
+        timesync = sys.modules["timesync"]
+        for name, value in fast.items():
+            setattr(timesync, name, value)
+        return board, app
+
+    def disciplined(app):
+        seconds, ms = app.timesync.now()
+        return seconds + ms / 1000
+
+    # drift tracking
+    board, app = start()
+    samples = []
+
+    async def tracking():
+        rtc_offset = None
+        last = None
+        backwards = 0
+        while len(samples) < seconds * 10:
+            await asyncio.sleep(0.1)
+            if not app.timesync.synced:
+                continue
+            if rtc_offset is None:
+                # the RTC set at the first sync, then left running
+                rtc_offset = utime.time_f() - disciplined(app)
+            now = disciplined(app)
+            if last is not None and now < last:
+                backwards += 1
+            last = now
+            wall = utime.wall_time()
+            samples.append((now - wall, utime.time_f() - rtc_offset - wall, app.timesync.drift_ppm))
+        rows.append(("time going back", backwards))
+
+    board.run(tracking())
+    assert rows[-1][1] == 0, "disciplined time went back"
+
+    tail = samples[len(samples) // 2:]
+    # ticks drift_ppm fast need this many ppm taken off
+    expected = round(1000000 - 1000000000000 / (1000000 + drift_ppm))
+    estimates = [sample[2] for sample in tail]
+    rows.append(("drift estimate (ppm)", "{} for {}, {} to {} in the second half".format(
+        app.timesync.drift_ppm, expected, min(estimates), max(estimates))))
+    rows.append(("disciplined error (ms)", "max {:.0f}, last {:.0f} (second half)".format(
+        max(abs(sample[0]) for sample in tail) * 1000, tail[-1][0] * 1000)))
+    rows.append(("rtc set once (ms)", "max {:.0f}, last {:.0f} (second half)".format(
+        max(abs(sample[1]) for sample in tail) * 1000, tail[-1][1] * 1000)))
+    rows.append(("ntp syncs", "{} syncs, {} steps, rtt {} ms".format(app.timesync.syncs, app.timesync.steps, app.timesync.rtt_ms)))
+
+    # no network: the radio plays, the minute edge is 3 s away
+    board, app = start(network=False, edge_in_s=3)
+    result = {}
+
+    async def fallback():
+        while app.boot.get("first audio") is None:
+            await asyncio.sleep(0.01)
+        app.radio_mgr.set_radio_on(True)
+        began = time.perf_counter()
+        while not app.timesync.synced and time.perf_counter() - began < 10:
+            await asyncio.sleep(0.01)
+        result["source"] = app.timesync.source
+        result["after"] = app.boot.get("time synced")
+        await asyncio.sleep(0.2)
+        result["error"] = (disciplined(app) - utime.wall_time()) * 1000
+
+    board.run(fallback())
+    rows.append(("no network, radio on", "synced by {} at {} ms from boot, error {:.0f} ms".format(
+        result["source"], result["after"], result["error"])))
+
+    # alarm at the minute beginning 4 s after boot, time zone 0
+    board, app = start(edge_in_s=4)
+    result = {}
+
+    async def alarm():
+        while not app.timesync.synced:
+            await asyncio.sleep(0.01)
+        fire = int(utime.wall_time() + 30) // 60 * 60
+        tm = utime.localtime(fire)
+        clock = app.clock
+        ring = clock.ring
+
+        def ringing(alarm, now):
+            result["late"] = (utime.wall_time() - fire) * 1000
+            ring(alarm, now)
+        clock.ring = ringing
+        alarm_app = app.apps[1]
+        alarm_app.days = 0x7F
+        alarm_app.wakeup = [tm[3], tm[4]]
+        alarm_app.active = True
+        began = time.perf_counter()
+        while "late" not in result and time.perf_counter() - began < 10:
+            await asyncio.sleep(0.01)
+        app.radio_mgr.set_radio_on(False)
+
+    board.run(alarm())
+    rows.append(("alarm lateness (ms)", "{:.0f} by the wall clock, alarm.late {}".format(
+        result.get("late", float("nan")), sys.modules["perf"].histogram("alarm.late").summary())))
+
+    # the NTP and drift arithmetic alone, on exact answers every SYNC_S: the
+    # network above jitters by a millisecond or so, which hides a bias of
+    # one. A biased estimate walks away by step at each answer
+    timesync = sys.modules["timesync"]
+    sync = timesync.TimeSync(None)
+    step = 1000000 // (fast["SYNC_S"] * 1000) // timesync.DRIFT_GAIN
+    estimates = []
+    for answer in range(40):
+        # received at ms past the boot, any fraction of a millisecond
+        ms = answer * fast["SYNC_S"] * 1000 + answer * 0.37 % 1
+        sync.rtt_ms = 5 + answer % 2
+        sent = (utime.time() + timesync.NTP_DELTA) * 1000 + ms - sync.rtt_ms / 2
+        ticks = int(ms * (1 + drift_ppm / 1000000)) & 0x3FFFFFFF
+        sync.ntp_answer(int(sent // 1000), int(sent % 1000 / 1000 * (1 << 32)), ticks)
+        estimates.append(sync.drift_ppm)
+    estimates = estimates[len(estimates) // 2:]
+    rows.append(("drift on exact answers (ppm)", "{} to {} for {}, last {} answers".format(
+        min(estimates), max(estimates), expected, len(estimates))))
+    assert all(abs(estimate - expected) <= step for estimate in estimates), "drift estimate not converging"
+    utime.drift_ppm = 0
+    utime.wall_offset = 0.0
+    _report("time ({} ppm crystal)".format(drift_ppm), rows)
+
+
+BENCHMARKS = {
+    "events": bench_events,
+    "draw": bench_draw,
+    "clock": bench_clock,
+    "rds": bench_rds,
+    "queue": bench_queue,
+    "encoder": bench_encoder,
+    "getters": bench_getters,
+    "registers": bench_registers,
+    "boot": bench_boot,
+    "store": bench_store,
+    "alarms": bench_alarms,
+    "mqtt": bench_mqtt,
+    "homie": bench_homie,
+    "scan": bench_scan,
+    "stations": bench_stations,
+    "scroll": bench_scroll,
+    "compose": bench_compose,
+    "perf": bench_perf,
+    "monitor": bench_monitor,
+    "records": bench_records,
+    "list": bench_list,
+    "router": bench_router,
+    "time": bench_time,
+}
+
+
+def main(argv):
+    import os
+    import tempfile
+    names = argv[1:] or list(BENCHMARKS)
+    for name in names:
+        # saved state starts empty for each benchmark, and stays out of the tree
+        os.chdir(tempfile.mkdtemp(prefix="bench-"))
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,143 @@
+# The alarm clock board: device models wired on the pins main.py uses, plus
+# helpers to script the rotary encoder and the KO button. An in-process MQTT
+# broker and NTP server stand in for the network ones.
+
+import asyncio
+import sys
+
+import sim
+from sim.broker import Broker
+from sim.ntpserver import NTPServer
+
+PIN_ROT_A = 26
+PIN_ROT_B = 25
+PIN_ROT_PUSH = 33
+PIN_KO = 32
+PIN_RADIO_IRQ = 14
+RADIO_BUS = 1
+RADIO_ADDRESS = 0x10
+
+
+class Board:
+    def __init__(self, stations=None, **tuner_options):
+        sim.install()
+        from sim import machine, utime
+        from sim.tuner import DEFAULT_STATIONS, SI4703Model
+
+        self.machine = machine
+        utime.reset_ticks()
+        machine.Pin.reset_board()
+        machine.I2C.reset_bus()
+        machine.Timer.reset_board()
+        machine.WDT.reset_board()
+        machine.WDT.resets = 0
+        self.tuner = SI4703Model(DEFAULT_STATIONS if stations is None else stations, irq_pin=PIN_RADIO_IRQ, **tuner_options)
+        machine.I2C.attach(RADIO_BUS, RADIO_ADDRESS, self.tuner)
+        self.app = None
+        self.broker = Broker()
+        self.ntp = NTPServer()
+
+    def boot(self, **constants):
+        # constants replace the main.py ones, e.g. boot(OFFSCREEN=False)
+        sys.modules.pop("main", None)
+        import main
+        for name, value in constants.items():
+            setattr(main, name, value)
+        self.main = main
+        self.app = main.ApplicationHandler()
+        return self.app
+
+    @property
+    def display(self):
+        return self.app.renderer.display
+
+    def pin(self, id):
+        return self.machine.Pin.board(id)
+
+    # input scripting, one call per electrical transition
+
+    def rotate(self, detents, bounce=0):
+        # quadrature sequence of (A, B) levels, A leads B when turning clockwise;
+        # each edge chatters `bounce` times before it settles
+        a = self.pin(PIN_ROT_A)
+        b = self.pin(PIN_ROT_B)
+        if detents > 0:
+            sequence = ((a, 0), (b, 0), (a, 1), (b, 1))
+        else:
+            sequence = ((b, 0), (a, 0), (b, 1), (a, 1))
+        for _ in range(abs(detents)):
+            for pin, level in sequence:
+                for _ in range(bounce):
+                    pin.drive(level)
+                    pin.drive(1 - level)
+                pin.drive(level)
+
+    def push(self):
+        self.pin(PIN_ROT_PUSH).drive(0)
+
+    def release(self):
+        self.pin(PIN_ROT_PUSH).drive(1)
+
+    def click(self):
+        self.push()
+        self.release()
+
+    def ko_push(self):
+        self.pin(PIN_KO).drive(0)
+
+    def ko_release(self):
+        self.pin(PIN_KO).drive(1)
+
+    def ko_click(self):
+        self.ko_push()
+        self.ko_release()
+
+    async def settle(self):
+        # let the event task drain everything queued so far
+        while self.app.events.count:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+    async def frame(self):
+        # wait until the widgets invalidated so far are on screen
+        await self.settle()
+        while self.app.renderer.dirty:
+            await asyncio.sleep(0.001)
+
+    async def demo(self):
+        await asyncio.sleep(0.5)
+        # select the radio app, enter on/off mode to switch it on
+        self.click()
+        await asyncio.sleep(0.1)
+        self.click()
+        await asyncio.sleep(1)
+        # volume up while the knob is held down
+        self.push()
+        self.rotate(4)
+        self.release()
+        await asyncio.sleep(3)
+
+    def run(self, script=None, seconds=None):
+        async def runner():
+            # the app's MQTT client and time service talk to the in-process
+            # servers
+            await self.broker.start()
+            self.app.mqtt.host = "127.0.0.1"
+            self.app.mqtt.port = self.broker.port
+            await self.ntp.start()
+            self.app.timesync.host = "127.0.0.1"
+            self.app.timesync.port = self.ntp.port
+            main_task = asyncio.create_task(self.app.main())
+            try:
+                if script is not None:
+                    await script
+                if seconds is not None:
+                    await asyncio.sleep(seconds)
+            finally:
+                main_task.cancel()
+                await self.broker.stop()
+                await self.ntp.stop()
+                # timers and watchdog stop with the board
+                self.machine.Timer.reset_board()
+                self.machine.WDT.reset_board()
+        asyncio.run(runner())
@@ -0,0 +1,188 @@
+# In-process MQTT 3.1.1 broker for the simulated board: QoS 0, retained
+# messages, last wills, + and # filters.
+#
+#   broker = Broker()
+#   await broker.start()            listens on 127.0.0.1, port in broker.port
+#   broker.watch("homie/#", cb)     cb(topic, payload) for every message routed
+#   broker.drop_clients()           cut every connection, like a network loss
+#   broker.accepting = False        refuse connections, like a broker down
+
+import asyncio
+
+
+def topic_matches(pattern, topic):
+    levels = pattern.split("/")
+    parts = topic.split("/")
+    for index, level in enumerate(levels):
+        if level == "#":
+            return True
+        if index >= len(parts) or (level != "+" and level != parts[index]):
+            return False
+    return len(levels) == len(parts)
+
+
+def _string(data, pos):
+    size = (data[pos] << 8) | data[pos + 1]
+    return bytes(data[pos + 2:pos + 2 + size]), pos + 2 + size
+
+
+def _length(size):
+    out = bytearray()
+    while True:
+        byte = size & 0x7F
+        size >>= 7
+        out.append(byte | (0x80 if size else 0))
+        if not size:
+            return out
+
+
+def _publish_packet(topic, payload, retain):
+    topic = topic.encode()
+    body = bytes((len(topic) >> 8, len(topic) & 0xFF)) + topic + payload
+    return bytes((0x30 | (1 if retain else 0),)) + _length(len(body)) + body
+
+
+class _Session:
+    def __init__(self, writer):
+        self.writer = writer
+        self.filters = []
+        self.will = None
+        self.client_id = None
+
+
+class Broker:
+    def __init__(self):
+        self.server = None
+        self.port = None
+        self.accepting = True
+        self.sessions = []
+        self.tasks = set()
+        self.retained = {}
+        self.watchers = []
+
+        self.connects = 0
+        self.refused = 0
+        self.messages = 0
+        self.packets = 0
+        self.pings = 0
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self._serve, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        self.drop_clients()
+        if self.tasks:
+            await asyncio.gather(*self.tasks)
+        await self.server.wait_closed()
+
+    def watch(self, pattern, callback):
+        self.watchers.append((pattern, callback))
+
+    def drop_clients(self):
+        for session in list(self.sessions):
+            session.writer.transport.abort()
+
+    async def _serve(self, reader, writer):
+        session = _Session(writer)
+        clean = False
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            header, body = await self._packet(reader)
+            if header & 0xF0 != 0x10:
+                return
+            if not self.accepting:
+                self.refused += 1
+                writer.write(b"\x20\x02\x00\x03")    # server unavailable
+                await writer.drain()
+                return
+            self._connect(session, body)
+            self.sessions.append(session)
+            self.connects += 1
+            writer.write(b"\x20\x02\x00\x00")
+            await writer.drain()
+            while True:
+                header, body = await self._packet(reader)
+                self.packets += 1
+                kind = header & 0xF0
+                if kind == 0x30:
+                    topic, pos = _string(body, 0)
+                    if header & 0x06:
+                        pos += 2
+                    self.route(topic.decode(), bytes(body[pos:]), bool(header & 0x01))
+                elif kind == 0x80:
+                    self._subscribe(session, body)
+                elif kind == 0xC0:
+                    self.pings += 1
+                    writer.write(b"\xd0\x00")
+                elif kind == 0xE0:
+                    clean = True
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if session in self.sessions:
+                self.sessions.remove(session)
+                if not clean and session.will is not None:
+                    self.route(*session.will)
+            writer.close()
+            self.tasks.discard(task)
+
+    async def _packet(self, reader):
+        header = (await reader.readexactly(1))[0]
+        size = 0
+        shift = 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            size |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        body = await reader.readexactly(size) if size else b""
+        return header, body
+
+    def _connect(self, session, body):
+        _, pos = _string(body, 0)          # protocol name
+        flags = body[pos + 1]
+        pos += 4                           # level, flags, keepalive
+        client_id, pos = _string(body, pos)
+        session.client_id = client_id.decode()
+        if flags & 0x04:
+            topic, pos = _string(body, pos)
+            payload, pos = _string(body, pos)
+            session.will = (topic.decode(), payload, bool(flags & 0x20))
+
+    def _subscribe(self, session, body):
+        packet_id = body[:2]
+        pos = 2
+        codes = bytearray()
+        new = []
+        while pos < len(body):
+            pattern, pos = _string(body, pos)
+            pos += 1
+            session.filters.append(pattern.decode())
+            new.append(pattern.decode())
+            codes.append(0)
+        session.writer.write(bytes((0x90,)) + _length(2 + len(codes)) + packet_id + codes)
+        for topic, payload in self.retained.items():
+            if any(topic_matches(pattern, topic) for pattern in new):
+                session.writer.write(_publish_packet(topic, payload, True))
+
+    def route(self, topic, payload, retain=False):
+        self.messages += 1
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        for pattern, callback in self.watchers:
+            if topic_matches(pattern, topic):
+                callback(topic, payload)
+        packet = None
+        for session in self.sessions:
+            if any(topic_matches(pattern, topic) for pattern in session.filters):
+                if packet is None:
+                    packet = _publish_packet(topic, payload, False)
+                session.writer.write(packet)
@@ -0,0 +1,31 @@
+# Bitmap fonts with the layout of the st7789_mpy romfonts (WIDTH, HEIGHT,
+# FIRST, LAST and a row-major, MSB-first FONT buffer).
+#
+# The glyphs are synthetic: every character gets a distinct, reproducible
+# pattern so screen dumps can be compared, space stays blank.
+
+import types
+
+
+def _make_font(name, width, height):
+    row_bytes = (width + 7) // 8
+    font = bytearray(256 * row_bytes * height)
+    for char in range(0x21, 0x100):
+        base = char * row_bytes * height
+        for row in range(1, height - 1):
+            for col in range(row_bytes):
+                font[base + row * row_bytes + col] = (char * 37 + row * 11 + col * 5) & 0xFF | 0x18
+    module = types.ModuleType(name)
+    module.WIDTH = width
+    module.HEIGHT = height
+    module.FIRST = 0x00
+    module.LAST = 0xFF
+    module.FONT = bytes(font)
+    return module
+
+
+vga2_8x8 = _make_font("vga2_8x8", 8, 8)
+vga2_8x16 = _make_font("vga2_8x16", 8, 16)
+vga2_bold_16x32 = _make_font("vga2_bold_16x32", 16, 32)
+
+FONTS = (vga2_8x8, vga2_8x16, vga2_bold_16x32)
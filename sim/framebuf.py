@@ -0,0 +1,140 @@
+# framebuf stand-in: the MONO_HLSB and RGB565 formats the application uses.
+#
+# RGB565 pixels are stored little endian like MicroPython does, so colors
+# meant for the display, which takes them big endian, are byte swapped by
+# the caller.  text() uses the 8x8 font of the sim fonts.
+
+MONO_VLSB = 0
+RGB565 = 1
+GS4_HMSB = 2
+MONO_HLSB = 3
+MONO_HMSB = 4
+GS2_HMSB = 5
+GS8 = 6
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format not in (MONO_HLSB, RGB565):
+            raise ValueError("format not supported by the simulator")
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self.format = format
+        self.stride = width if stride is None else stride
+
+    # pixel access
+
+    def _get(self, x, y):
+        if self.format == RGB565:
+            offset = (y * self.stride + x) * 2
+            return self.buffer[offset] | self.buffer[offset + 1] << 8
+        offset = y * ((self.stride + 7) // 8) + (x >> 3)
+        return (self.buffer[offset] >> (7 - (x & 7))) & 1
+
+    def _set(self, x, y, color):
+        if self.format == RGB565:
+            offset = (y * self.stride + x) * 2
+            self.buffer[offset] = color & 0xFF
+            self.buffer[offset + 1] = color >> 8 & 0xFF
+            return
+        offset = y * ((self.stride + 7) // 8) + (x >> 3)
+        mask = 0x80 >> (x & 7)
+        if color & 1:
+            self.buffer[offset] |= mask
+        else:
+            self.buffer[offset] &= ~mask & 0xFF
+
+    def pixel(self, x, y, color=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        if color is None:
+            return self._get(x, y)
+        self._set(x, y, color)
+
+    # drawing
+
+    def fill_rect(self, x, y, w, h, color):
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, self.width), min(y + h, self.height)
+        if x1 <= x0 or y1 <= y0:
+            return
+        if self.format == RGB565:
+            row = bytes((color & 0xFF, color >> 8 & 0xFF)) * (x1 - x0)
+            for line in range(y0, y1):
+                start = (line * self.stride + x0) * 2
+                self.buffer[start:start + len(row)] = row
+            return
+        for line in range(y0, y1):
+            for column in range(x0, x1):
+                self._set(column, line, color)
+
+    def fill(self, color):
+        if self.format == MONO_HLSB:
+            value = 0xFF if color & 1 else 0
+            for i in range(len(self.buffer)):
+                self.buffer[i] = value
+            return
+        self.fill_rect(0, 0, self.width, self.height, color)
+
+    def hline(self, x, y, w, color):
+        self.fill_rect(x, y, w, 1, color)
+
+    def vline(self, x, y, h, color):
+        self.fill_rect(x, y, 1, h, color)
+
+    def rect(self, x, y, w, h, color, fill=False):
+        if fill:
+            self.fill_rect(x, y, w, h, color)
+            return
+        self.hline(x, y, w, color)
+        self.hline(x, y + h - 1, w, color)
+        self.vline(x, y, h, color)
+        self.vline(x + w - 1, y, h, color)
+
+    def blit(self, source, x, y, key=-1, palette=None):
+        # palette maps the source colors, a MONO source onto two RGB565 ones
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + source.width, self.width), min(y + source.height, self.height)
+        if x1 <= x0 or y1 <= y0:
+            return
+        colors = None
+        if palette is not None:
+            colors = [palette._get(i, 0) for i in range(palette.width)]
+        if source.format == RGB565 and self.format == RGB565 and colors is None and key == -1:
+            span = (x1 - x0) * 2
+            for line in range(y0, y1):
+                src = ((line - y) * source.stride + (x0 - x)) * 2
+                dst = (line * self.stride + x0) * 2
+                self.buffer[dst:dst + span] = source.buffer[src:src + span]
+            return
+        if source.format == MONO_HLSB and self.format == RGB565 and colors is not None and key == -1:
+            pixels = [bytes((color & 0xFF, color >> 8 & 0xFF)) for color in colors]
+            source_stride = (source.stride + 7) // 8
+            for line in range(y0, y1):
+                row = source.buffer[(line - y) * source_stride:(line - y + 1) * source_stride]
+                out = bytearray()
+                for column in range(x0 - x, x1 - x):
+                    out += pixels[(row[column >> 3] >> (7 - (column & 7))) & 1]
+                dst = (line * self.stride + x0) * 2
+                self.buffer[dst:dst + len(out)] = out
+            return
+        for line in range(y0, y1):
+            for column in range(x0, x1):
+                color = source._get(column - x, line - y)
+                if color == key:
+                    continue
+                self._set(column, line, colors[color] if colors is not None else color)
+
+    def text(self, string, x, y, color=1):
+        from sim.fonts import vga2_8x8 as font
+        for code in string.encode("latin-1", "replace"):
+            base = code * 8
+            for row in range(8):
+                bits = font.FONT[base + row]
+                for column in range(8):
+                    if bits & (0x80 >> column):
+                        px, py = x + column, y + row
+                        if 0 <= px < self.width and 0 <= py < self.height:
+                            self._set(px, py, color)
+            x += 8
@@ -0,0 +1,230 @@
+# machine module stand-in.
+#
+# Pins are registered by id so the board script and the device models can
+# find the objects main.py created; drive() changes an input level from the
+# outside and runs the irq handler on a matching edge.
+
+import threading
+import time as _time
+
+from sim import utime
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_DOWN = 1
+    PULL_UP = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    _board = {}
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.handler = None
+        self.trigger = 0
+        self.hard = False
+        self.irq_count = 0
+        self.level = 1
+        self.init(mode, pull, value)
+        Pin._board[id] = self
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if pull != -1:
+            self.pull = pull
+        if value is not None:
+            self.level = 1 if value else 0
+
+    @classmethod
+    def board(cls, id):
+        return cls._board[id]
+
+    @classmethod
+    def reset_board(cls):
+        cls._board.clear()
+
+    def value(self, value=None):
+        if value is None:
+            return self.level
+        self.level = 1 if value else 0
+
+    __call__ = value
+
+    def on(self):
+        self.level = 1
+
+    def off(self):
+        self.level = 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, priority=1, wake=None, hard=False):
+        self.handler = handler
+        self.trigger = trigger
+        self.hard = hard
+
+    def drive(self, level):
+        level = 1 if level else 0
+        if level == self.level:
+            return
+        self.level = level
+        edge = Pin.IRQ_RISING if level else Pin.IRQ_FALLING
+        if self.handler is not None and self.trigger & edge:
+            self.irq_count += 1
+            self.handler(self)
+
+
+class I2C:
+    _buses = {}
+
+    def __init__(self, id, scl=None, sda=None, freq=400000, timeout=50000):
+        self.id = id
+        self.freq = freq
+        self.transactions = 0
+        self.bytes = 0
+
+    @classmethod
+    def attach(cls, bus_id, address, device):
+        cls._buses.setdefault(bus_id, {})[address] = device
+
+    @classmethod
+    def reset_bus(cls):
+        cls._buses.clear()
+
+    def _device(self, address):
+        try:
+            return I2C._buses[self.id][address]
+        except KeyError:
+            raise OSError(19)  # ENODEV, like a missing ack
+
+    def scan(self):
+        return sorted(I2C._buses.get(self.id, {}))
+
+    def readfrom(self, address, nbytes, stop=True):
+        data = self._device(address).readfrom(nbytes)
+        self.transactions += 1
+        self.bytes += nbytes
+        return data
+
+    def readfrom_into(self, address, buf, stop=True):
+        buf[:] = self.readfrom(address, len(buf))
+
+    def writeto(self, address, buf, stop=True):
+        buf = bytes(buf)
+        self._device(address).writeto(buf)
+        self.transactions += 1
+        self.bytes += len(buf)
+        return len(buf)
+
+
+SoftI2C = I2C
+
+
+class SPI:
+    def __init__(self, id, baudrate=1000000, polarity=0, phase=0, bits=8, firstbit=0, sck=None, mosi=None, miso=None):
+        self.id = id
+        self.baudrate = baudrate
+
+
+class RTC:
+    def datetime(self, datetime=None):
+        if datetime is None:
+            tm = utime.localtime()
+            return (tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5], 0)
+        year, month, day, weekday, hour, minute, second = datetime[:7]
+        utime.settime(utime.mktime((year, month, day, hour, minute, second, 0, 0)))
+
+
+class Timer:
+    # Periodic and one shot timers on threads: the callback runs on the
+    # timer thread, like a soft timer interrupt between two bytecodes of a
+    # stalled loop.
+    ONE_SHOT = 0
+    PERIODIC = 1
+    instances = []
+
+    def __init__(self, id, mode=PERIODIC, period=-1, callback=None):
+        self.id = id
+        self._stop = None
+        Timer.instances.append(self)
+        if callback is not None:
+            self.init(mode=mode, period=period, callback=callback)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None):
+        self.deinit()
+        stop = self._stop = threading.Event()
+
+        def run():
+            while not stop.wait(period / 1000):
+                callback(self)
+                if mode == Timer.ONE_SHOT:
+                    return
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def deinit(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+    @classmethod
+    def reset_board(cls):
+        for timer in cls.instances:
+            timer.deinit()
+        cls.instances = []
+
+
+class WDT:
+    # Watchdog that cannot be stopped once created. Running out does not
+    # reset the simulator: it is counted in WDT.resets and reported.
+    resets = 0
+    instances = []
+
+    def __init__(self, id=0, timeout=5000):
+        self.timeout = timeout
+        self.fed = _time.monotonic()
+        self.feeds = 0
+        WDT.instances.append(self)
+        stop = self._stop = threading.Event()
+
+        def watch():
+            while not stop.wait(min(self.timeout, 100) / 1000):
+                if (_time.monotonic() - self.fed) * 1000 > self.timeout:
+                    WDT.resets += 1
+                    print("wdt: not fed for {} ms, the board resets".format(self.timeout))
+                    self.fed = _time.monotonic()
+
+        threading.Thread(target=watch, daemon=True).start()
+
+    @classmethod
+    def reset_board(cls):
+        # power off: the watchdogs of the previous run stop
+        for wdt in cls.instances:
+            wdt._stop.set()
+        cls.instances = []
+
+    def feed(self):
+        self.fed = _time.monotonic()
+        self.feeds += 1
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+def freq(hz=None):
+    return 240000000
+
+
+def unique_id():
+    return b"\x00\x00\x00\x00\x00\x00"
+
+
+def reset():
+    raise SystemExit("machine.reset()")
@@ -0,0 +1,54 @@
+# micropython module stand-in.
+
+import asyncio as _asyncio
+import gc as _gc
+
+
+def const(value):
+    return value
+
+
+def schedule(func, arg):
+    # Scheduled callbacks run "soon" from the main context, never nested in
+    # the caller.
+    try:
+        loop = _asyncio.get_running_loop()
+    except RuntimeError:
+        func(arg)
+    else:
+        loop.call_soon(func, arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def mem_info(verbose=False):
+    print("gc objects: {}".format(len(_gc.get_objects())))
+
+
+def qstr_info(verbose=False):
+    pass
+
+
+def opt_level(level=None):
+    return 0
+
+
+def heap_lock():
+    return 0
+
+
+def heap_unlock():
+    return 0
+
+
+def kbd_intr(chr):
+    pass
+
+
+def native(func):
+    return func
+
+
+viper = native
@@ -0,0 +1,24 @@
+# network stand-in: the station interface, connected to the access point
+# of the simulated LAN.
+
+STA_IF = 0
+AP_IF = 1
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+
+    def active(self, value=None):
+        return True
+
+    def isconnected(self):
+        return True
+
+    def ifconfig(self):
+        return ("192.168.1.42", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+
+    def config(self, name):
+        if name == "mac":
+            return b"\x24\x0a\xc4\x00\x00\x01"
+        raise ValueError("unknown config param")
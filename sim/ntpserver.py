@@ -0,0 +1,65 @@
+# In-process NTP server for the simulated board, answering with the wall
+# time of sim.utime.
+#
+#   server = NTPServer()
+#   await server.start()            listens on 127.0.0.1, port in server.port
+#   server.answering = False        drop the requests, like a network down
+#   server.delay_ms = 300           answer late, like a slow network
+
+import asyncio
+import struct
+
+from sim import utime
+
+NTP_DELTA = 3155673600  # 1900-01-01 to 2000-01-01
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        server = self.server
+        server.requests += 1
+        if not server.answering or len(data) < 48:
+            return
+        if server.delay_ms:
+            asyncio.get_running_loop().call_later(server.delay_ms / 1000, self.answer, address)
+        else:
+            self.answer(address)
+
+    def answer(self, address):
+        now = utime.wall_time() + NTP_DELTA
+        seconds = int(now)
+        fraction = int((now - seconds) * (1 << 32))
+        reply = bytearray(48)
+        reply[0] = 0x24         # version 4, server
+        reply[1] = 2            # stratum
+        reply[32:40] = struct.pack("!II", seconds, fraction)
+        reply[40:48] = struct.pack("!II", seconds, fraction)
+        self.server.answers += 1
+        self.transport.sendto(bytes(reply), address)
+
+
+class NTPServer:
+    def __init__(self):
+        self.transport = None
+        self.port = None
+        self.answering = True
+        self.delay_ms = 0
+        self.requests = 0
+        self.answers = 0
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: _Protocol(self), local_addr=("127.0.0.1", 0))
+        self.port = self.transport.get_extra_info("sockname")[1]
+
+    async def stop(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
@@ -0,0 +1,28 @@
+# Boot the application on the simulated board and run the demo script.
+#
+#   python -m sim.run [seconds]
+#
+# The board runs in a scratch directory: its saved state starts empty and
+# stays out of the tree.
+
+import os
+import sys
+import tempfile
+
+from sim.board import Board
+
+
+def main(argv):
+    seconds = float(argv[1]) if len(argv) > 1 else 2
+    os.chdir(tempfile.mkdtemp(prefix="sim-"))
+    board = Board()
+    board.boot()
+    board.run(board.demo(), seconds=seconds)
+    display = board.display
+    print("display: {} windows, {} pixels, {} bytes".format(display.windows, display.pixels, display.bytes))
+    print("tuner: {} reads, {} writes, {} RDS groups, {} interrupts".format(
+        board.tuner.reads, board.tuner.writes, board.tuner.groups_sent, board.tuner.interrupts))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,169 @@
+# st7789_mpy stand-in: an RGB565 (big endian, as sent over SPI) framebuffer.
+#
+# Every primitive costs what the C driver would put on the bus: one address
+# window per rectangle or glyph cell and two bytes per pixel.  `windows`,
+# `pixels` and `bytes` accumulate that cost, reset_stats() clears it.
+
+BLACK = 0x0000
+BLUE = 0x001F
+RED = 0xF800
+GREEN = 0x07E0
+CYAN = 0x07FF
+MAGENTA = 0xF81F
+YELLOW = 0xFFE0
+WHITE = 0xFFFF
+
+RGB = 0x00
+BGR = 0x08
+
+
+def color565(red, green=0, blue=0):
+    if isinstance(red, (tuple, list)):
+        red, green, blue = red[:3]
+    return (red & 0xF8) << 8 | (green & 0xFC) << 3 | blue >> 3
+
+
+class ST7789:
+    def __init__(self, spi, width, height, reset=None, dc=None, cs=None, backlight=None,
+                 rotation=0, color_order=RGB, inversion=True, options=0, buffer_size=0):
+        self.spi = spi
+        if rotation & 1:
+            width, height = height, width
+        self._width = width
+        self._height = height
+        self._rotation = rotation
+        self.buffer = bytearray(width * height * 2)
+        self._glyphs = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.windows = 0
+        self.pixels = 0
+        self.bytes = 0
+
+    def _account(self, pixels):
+        self.windows += 1
+        self.pixels += pixels
+        self.bytes += 2 * pixels
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def init(self):
+        self.fill(BLACK)
+        self.reset_stats()
+
+    def on(self):
+        pass
+
+    def off(self):
+        pass
+
+    def sleep_mode(self, value):
+        pass
+
+    def inversion_mode(self, value):
+        pass
+
+    def rotation(self, rotation):
+        pass
+
+    def vscrdef(self, tfa, vsa, bfa):
+        pass
+
+    def vscsad(self, vssa):
+        pass
+
+    def _clip(self, x, y, w, h):
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + w, self._width)
+        y1 = min(y + h, self._height)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1, y1
+
+    def _paint(self, x, y, w, h, color):
+        clipped = self._clip(x, y, w, h)
+        if clipped is None:
+            return
+        x0, y0, x1, y1 = clipped
+        row = bytes((color >> 8 & 0xFF, color & 0xFF)) * (x1 - x0)
+        stride = self._width * 2
+        for line in range(y0, y1):
+            start = line * stride + x0 * 2
+            self.buffer[start:start + len(row)] = row
+        self._account((x1 - x0) * (y1 - y0))
+
+    def fill(self, color):
+        self._paint(0, 0, self._width, self._height, color)
+
+    def fill_rect(self, x, y, width, height, color):
+        self._paint(x, y, width, height, color)
+
+    def rect(self, x, y, width, height, color):
+        self.hline(x, y, width, color)
+        self.hline(x, y + height - 1, width, color)
+        self.vline(x, y, height, color)
+        self.vline(x + width - 1, y, height, color)
+
+    def hline(self, x, y, length, color):
+        self._paint(x, y, length, 1, color)
+
+    def vline(self, x, y, length, color):
+        self._paint(x, y, 1, length, color)
+
+    def pixel(self, x, y, color):
+        self._paint(x, y, 1, 1, color)
+
+    def _glyph(self, font, code, fg, bg):
+        key = (font.__name__, code, fg, bg)
+        cell = self._glyphs.get(key)
+        if cell is None:
+            row_bytes = (font.WIDTH + 7) // 8
+            size = row_bytes * font.HEIGHT
+            base = (code - font.FIRST) * size
+            bits = font.FONT[base:base + size]
+            fg_px = bytes((fg >> 8 & 0xFF, fg & 0xFF))
+            bg_px = bytes((bg >> 8 & 0xFF, bg & 0xFF))
+            out = bytearray()
+            for row in range(font.HEIGHT):
+                for col in range(font.WIDTH):
+                    byte = bits[row * row_bytes + col // 8] if bits else 0
+                    out += fg_px if byte & (0x80 >> (col & 7)) else bg_px
+            cell = self._glyphs[key] = bytes(out)
+        return cell
+
+    def text(self, font, text, x, y, fg=WHITE, bg=BLACK):
+        if isinstance(text, str):
+            text = text.encode("latin-1", "replace")
+        for code in text:
+            if x >= self._width:
+                break
+            if font.FIRST <= code <= font.LAST:
+                self._blit(self._glyph(font, code, fg, bg), x, y, font.WIDTH, font.HEIGHT)
+            x += font.WIDTH
+
+    def _blit(self, data, x, y, w, h):
+        clipped = self._clip(x, y, w, h)
+        if clipped is None:
+            return
+        x0, y0, x1, y1 = clipped
+        stride = self._width * 2
+        src_stride = w * 2
+        span = (x1 - x0) * 2
+        for line in range(y0, y1):
+            src = (line - y) * src_stride + (x0 - x) * 2
+            dst = line * stride + x0 * 2
+            self.buffer[dst:dst + span] = data[src:src + span]
+        self._account((x1 - x0) * (y1 - y0))
+
+    def blit_buffer(self, buffer, x, y, width, height):
+        self._blit(bytes(buffer), x, y, width, height)
+
+    def get_pixel(self, x, y):
+        offset = (y * self._width + x) * 2
+        return self.buffer[offset] << 8 | self.buffer[offset + 1]
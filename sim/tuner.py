@@ -0,0 +1,324 @@
+# Register level model of the SI4703 FM tuner as seen over I2C.
+#
+# Reads start at register 0x0A and wrap around, writes start at 0x02, like
+# the chip.  Tune and seek complete after a delay, set STC and pulse GPIO2
+# (the interrupt pin) when STCIEN is set.  While RDS is enabled and the
+# channel carries a station, RDS groups (0A, 2A, 4A) are produced at the
+# on-air rate and signalled through RDSR / GPIO2 when RDSIEN is set. The 4A
+# clock time goes out as each minute of the wall time begins.
+
+import asyncio
+import datetime
+
+from sim import machine
+from sim import utime
+
+REG_DEVICEID = 0x00
+REG_CHIPID = 0x01
+REG_POWERCFG = 0x02
+REG_CHANNEL = 0x03
+REG_SYSCONFIG1 = 0x04
+REG_SYSCONFIG2 = 0x05
+REG_SYSCONFIG3 = 0x06
+REG_TEST1 = 0x07
+REG_STATUSRSSI = 0x0A
+REG_READCHAN = 0x0B
+REG_RDSA = 0x0C
+
+BAND_CHANNELS = 205  # 87.5 - 108.0 MHz, 100 kHz spacing
+
+STATUS_RDSR = 0x8000
+STATUS_STC = 0x4000
+STATUS_SFBL = 0x2000
+STATUS_AFCRL = 0x1000
+STATUS_RDSS = 0x0800
+STATUS_ST = 0x0100
+
+
+class Station:
+    def __init__(self, frequency, rssi, ps=None, rt=None, pi=0xF000, pty=0, tp=False, ta=False, af=()):
+        self.channel = int(round(frequency * 10)) - 875
+        self.rssi = rssi
+        self.ps = ps
+        self.rt = rt
+        self.pi = pi
+        self.pty = pty
+        self.tp = tp
+        self.ta = ta
+        self.af = af
+
+
+DEFAULT_STATIONS = (
+    Station(88.6, 38, "FIP", "FIP - Jazz a toute heure", pi=0xF201, pty=15),
+    Station(91.7, 32, "INTER", "France Inter - Le 7/9, la matinale", pi=0xF202, pty=1, tp=True),
+    Station(95.5, 45, "CULTURE", "France Culture", pi=0xF203, pty=9),
+    Station(98.2, 41, "NOVA", "Radio Nova - le grand mix", pi=0xF204, pty=10),
+    Station(101.1, 24, "MUSIQUE", None, pi=0xF205, pty=14),
+    Station(103.4, 18, None, None),
+    Station(105.5, 36, "RTL", "RTL - On a tellement de choses a se dire", pi=0xF206, pty=3, tp=True),
+)
+
+
+def _b(group_type, version, tp, pty, low):
+    return (group_type << 12) | (version << 11) | (tp << 10) | (pty << 5) | (low & 0x1F)
+
+
+def _af_code(frequency):
+    return int(round(frequency * 10)) - 875 + 1
+
+
+def ps_groups(station):
+    # four 0A groups carrying two PS characters each
+    ps = (station.ps or "").encode()[:8].ljust(8)
+    # AF method A: count code first, then the list, padded with filler codes
+    af = [0xE0 + len(station.af)] + [_af_code(frequency) for frequency in station.af]
+    af += [0xCD] * (8 - len(af))
+    groups = []
+    for segment in range(4):
+        b = _b(0, 0, station.tp, station.pty, (station.ta << 4) | segment)
+        c = (af[2 * segment] << 8) | af[2 * segment + 1]
+        groups.append((station.pi, b, c, (ps[2 * segment] << 8) | ps[2 * segment + 1]))
+    return groups
+
+
+def rt_groups(station, ab=0):
+    # 2A groups, text terminated by a carriage return when shorter than 64
+    rt = (station.rt or "").encode()[:64]
+    if len(rt) < 64:
+        rt += b"\r"
+    rt = rt.ljust((len(rt) + 3) // 4 * 4)
+    groups = []
+    for segment in range(len(rt) // 4):
+        chars = rt[4 * segment:4 * segment + 4]
+        b = _b(2, 0, station.tp, station.pty, (ab << 4) | segment)
+        groups.append((station.pi, b, (chars[0] << 8) | chars[1], (chars[2] << 8) | chars[3]))
+    return groups
+
+
+def ct_group(station, secs, offset_half_hours=4):
+    # 4A clock time for the UTC time `secs` (MicroPython epoch)
+    tm = utime.localtime(secs)
+    mjd = datetime.date(tm[0], tm[1], tm[2]).toordinal() - datetime.date(1858, 11, 17).toordinal()
+    sign = 0x20 if offset_half_hours < 0 else 0
+    b = _b(4, 0, station.tp, station.pty, mjd >> 15)
+    c = ((mjd & 0x7FFF) << 1) | (tm[3] >> 4)
+    d = ((tm[3] & 0x0F) << 12) | (tm[4] << 6) | sign | abs(offset_half_hours)
+    return (station.pi, b, c, d)
+
+
+def recorded_stream(station, groups):
+    # on-air order: PS and RT interleaved, one CT group every 50 groups
+    ps = ps_groups(station)
+    rt = rt_groups(station) if station.rt else []
+    stream = []
+    ps_index = rt_index = 0
+    while len(stream) < groups:
+        if len(stream) % 50 == 49:
+            stream.append(ct_group(station, 0x2E000000))
+        elif rt and len(stream) % 2:
+            stream.append(rt[rt_index % len(rt)])
+            rt_index += 1
+        else:
+            stream.append(ps[ps_index % len(ps)])
+            ps_index += 1
+    return stream
+
+
+class SI4703Model:
+    def __init__(self, stations=DEFAULT_STATIONS, irq_pin=14, tune_ms=60, seek_ms_per_channel=40, group_ms=88):
+        self.stations = {station.channel: station for station in stations}
+        self.irq_pin = irq_pin
+        self.tune_ms = tune_ms
+        self.seek_ms_per_channel = seek_ms_per_channel
+        self.group_ms = group_ms
+        self.regs = [0] * 16
+        self.regs[REG_DEVICEID] = 0x1242
+        self.regs[REG_CHIPID] = 0x1253
+        self.regs[REG_TEST1] = 0x0100
+        self.pending = None
+        self.rds_handle = None
+        self.rds_stream = []
+        self.rds_index = 0
+        self.ct_minute = None
+        self.ct_offset = 4      # local offset sent with the clock time, half hours
+        self.groups_sent = 0
+        self.interrupts = 0
+        self.reads = 0
+        self.writes = 0
+
+    # I2C side
+
+    def readfrom(self, nbytes):
+        self.reads += 1
+        data = bytearray()
+        for i in range(nbytes // 2):
+            value = self.regs[(REG_STATUSRSSI + i) % 16]
+            data.append(value >> 8)
+            data.append(value & 0xFF)
+        if nbytes >= 12:
+            # RDS registers were read: the group has been consumed
+            self.regs[REG_STATUSRSSI] &= ~STATUS_RDSR
+        return bytes(data)
+
+    def writeto(self, data):
+        self.writes += 1
+        old = list(self.regs)
+        for i in range(len(data) // 2):
+            self.regs[REG_POWERCFG + i] = (data[2 * i] << 8) | data[2 * i + 1]
+        self._on_write(old)
+
+    # chip behaviour
+
+    def enabled(self):
+        return self.regs[REG_POWERCFG] & 0x0001 and self.regs[REG_TEST1] & 0x8000
+
+    def channel(self):
+        return self.regs[REG_READCHAN] & 0x03FF
+
+    def rssi(self, channel):
+        best = 3 + (channel * 37) % 7
+        for station in self.stations.values():
+            best = max(best, station.rssi - 14 * abs(station.channel - channel))
+        return best
+
+    def _on_write(self, old):
+        powercfg = self.regs[REG_POWERCFG]
+        channel = self.regs[REG_CHANNEL]
+        tune_started = channel & 0x8000 and not old[REG_CHANNEL] & 0x8000
+        seek_started = powercfg & 0x0100 and not old[REG_POWERCFG] & 0x0100
+        if not channel & 0x8000 and not powercfg & 0x0100:
+            # host acknowledged STC
+            self.regs[REG_STATUSRSSI] &= ~(STATUS_STC | STATUS_SFBL)
+            if (old[REG_CHANNEL] & 0x8000 or old[REG_POWERCFG] & 0x0100) and self.pending is not None:
+                self.pending.cancel()
+                self.pending = None
+        if tune_started:
+            self._stop_rds()
+            self._later(self.tune_ms, self._tune_complete, channel & 0x03FF)
+        elif seek_started:
+            self._stop_rds()
+            self._start_seek(powercfg)
+        self._update_rds()
+
+    def _start_seek(self, powercfg):
+        step = 1 if powercfg & 0x0200 else -1
+        wrap = not powercfg & 0x0400
+        threshold = self.regs[REG_SYSCONFIG2] >> 8
+        channel = self.channel()
+        for travelled in range(1, BAND_CHANNELS):
+            channel += step
+            if channel < 0 or channel >= BAND_CHANNELS:
+                if not wrap:
+                    limit = 0 if channel < 0 else BAND_CHANNELS - 1
+                    self._later(travelled * self.seek_ms_per_channel, self._seek_complete, limit, True)
+                    return
+                channel %= BAND_CHANNELS
+            if channel in self.stations and self.rssi(channel) >= threshold:
+                self._later(travelled * self.seek_ms_per_channel, self._seek_complete, channel, False)
+                return
+        self._later(BAND_CHANNELS * self.seek_ms_per_channel, self._seek_complete, self.channel(), True)
+
+    def _later(self, delay_ms, callback, *args):
+        if self.pending is not None:
+            self.pending.cancel()
+            self.pending = None
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            callback(*args)
+        else:
+            self.pending = loop.call_later(delay_ms / 1000, callback, *args)
+
+    def _tune_complete(self, channel):
+        self.pending = None
+        self._set_channel(channel, False)
+
+    def _seek_complete(self, channel, failed):
+        self.pending = None
+        self._set_channel(channel, failed)
+
+    def _set_channel(self, channel, failed):
+        rssi = self.rssi(channel)
+        status = self.regs[REG_STATUSRSSI] & ~(0x00FF | STATUS_SFBL | STATUS_AFCRL | STATUS_ST)
+        status |= STATUS_STC | min(rssi, 0xFF)
+        if failed:
+            status |= STATUS_SFBL
+        if rssi < 10:
+            status |= STATUS_AFCRL
+        if rssi >= 25:
+            status |= STATUS_ST
+        self.regs[REG_STATUSRSSI] = status
+        self.regs[REG_READCHAN] = (self.regs[REG_READCHAN] & ~0x03FF) | channel
+        self.rds_stream = []
+        if self.regs[REG_SYSCONFIG1] & 0x4000:
+            self._interrupt()
+        self._update_rds()
+
+    def _update_rds(self):
+        station = self.stations.get(self.channel())
+        active = (self.enabled() and self.regs[REG_SYSCONFIG1] & 0x1000 and station is not None
+                  and station.ps is not None and not self.regs[REG_STATUSRSSI] & STATUS_AFCRL
+                  and not self.regs[REG_CHANNEL] & 0x8000 and not self.regs[REG_POWERCFG] & 0x0100)
+        if not active:
+            self._stop_rds()
+        elif self.rds_handle is None:
+            if not self.rds_stream:
+                self.rds_stream = recorded_stream(station, 200)
+                self.rds_index = 0
+            self.ct_minute = int(utime.wall_time()) // 60
+            self._schedule_group()
+
+    def _stop_rds(self):
+        if self.rds_handle is not None:
+            self.rds_handle.cancel()
+            self.rds_handle = None
+
+    def _schedule_group(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.rds_handle = loop.call_later(self.group_ms / 1000, self._emit_group)
+
+    def _emit_group(self):
+        self.rds_handle = None
+        station = self.stations.get(self.channel())
+        group = self.rds_stream[self.rds_index % len(self.rds_stream)]
+        if group[1] >> 12 == 4:
+            # the recorded one is replaced by the minute edges
+            self.rds_index += 1
+            group = self.rds_stream[self.rds_index % len(self.rds_stream)]
+        minute = int(utime.wall_time()) // 60
+        if minute != self.ct_minute:
+            self.ct_minute = minute
+            group = ct_group(station, minute * 60, self.ct_offset)
+        else:
+            self.rds_index += 1
+        self.emit(group)
+        self._schedule_group()
+
+    def emit(self, group):
+        # latch one group in RDSA..RDSD and signal it
+        for i in range(4):
+            self.regs[REG_RDSA + i] = group[i]
+        self.regs[REG_STATUSRSSI] |= STATUS_RDSR | STATUS_RDSS
+        self.groups_sent += 1
+        if self.regs[REG_SYSCONFIG1] & 0x8000:
+            self._interrupt()
+
+    def _interrupt(self):
+        # GPIO2 goes low for a few ms
+        if self.regs[REG_SYSCONFIG1] & 0x000C != 0x0004:
+            return
+        try:
+            pin = machine.Pin.board(self.irq_pin)
+        except KeyError:
+            return
+        self.interrupts += 1
+        pin.drive(0)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            pin.drive(1)
+        else:
+            loop.call_later(0.005, pin.drive, 1)
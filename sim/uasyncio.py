@@ -0,0 +1,37 @@
+# uasyncio stand-in on top of CPython asyncio.
+
+import asyncio as _asyncio
+import threading as _threading
+from asyncio import *  # noqa: F401,F403
+
+
+async def sleep_ms(ms):
+    await _asyncio.sleep(ms / 1000)
+
+
+def wait_for_ms(awaitable, timeout):
+    return _asyncio.wait_for(awaitable, timeout / 1000)
+
+
+class ThreadSafeFlag:
+    # May be set from a pin handler or from another thread (machine.Timer),
+    # like the MicroPython one.
+    def __init__(self):
+        self._event = _asyncio.Event()
+        self._loop = None
+
+    def set(self):
+        loop = self._loop
+        if loop is None or _threading.get_ident() == self._thread:
+            self._event.set()
+        else:
+            loop.call_soon_threadsafe(self._event.set)
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        self._loop = _asyncio.get_running_loop()
+        self._thread = _threading.get_ident()
+        await self._event.wait()
+        self._event.clear()
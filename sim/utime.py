@@ -0,0 +1,103 @@
+# utime stand-in: MicroPython epoch (2000-01-01) and wrapping ticks.
+#
+# The RTC starts at the epoch like a freshly booted ESP32, settime() is what
+# machine.RTC uses to move it. Ticks count from reset_ticks(), which the
+# board calls like a power on. Both run drift_ppm faster than the host
+# clock, like the crystal of the board; set it before the board powers on.
+# wall_time() is the true time, the one of the NTP server and of the RDS
+# clock time, the host clock moved by wall_offset seconds.
+
+import calendar
+import time as _time
+
+EPOCH_OFFSET = 946684800  # 2000-01-01T00:00:00 as a unix timestamp
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALF = _TICKS_PERIOD // 2
+
+drift_ppm = 0
+wall_offset = 0.0
+
+_rtc_base = 0.0
+_mono_base = _time.monotonic()
+_ticks_base = _time.monotonic()
+_rate = 1.0
+
+
+def reset_ticks():
+    global _ticks_base, _rate
+    _ticks_base = _time.monotonic()
+    _rate = 1 + drift_ppm / 1000000
+
+
+def _elapsed(base):
+    return (_time.monotonic() - base) * _rate
+
+
+def settime(secs):
+    global _rtc_base, _mono_base
+    _rtc_base = float(secs)
+    _mono_base = _time.monotonic()
+
+
+def time_f():
+    return _rtc_base + _elapsed(_mono_base)
+
+
+def wall_time():
+    return _time.time() - EPOCH_OFFSET + wall_offset
+
+
+def time():
+    return int(time_f())
+
+
+def time_ns():
+    return int(time_f() * 1000000000)
+
+
+def localtime(secs=None):
+    if secs is None:
+        secs = time()
+    tm = _time.gmtime(int(secs) + EPOCH_OFFSET)
+    return (tm.tm_year, tm.tm_mon, tm.tm_mday, tm.tm_hour, tm.tm_min, tm.tm_sec, tm.tm_wday, tm.tm_yday)
+
+
+gmtime = localtime
+
+
+def mktime(tm):
+    return calendar.timegm((tm[0], tm[1], tm[2], tm[3], tm[4], tm[5], 0, 0, 0)) - EPOCH_OFFSET
+
+
+def ticks_ms():
+    return int(_elapsed(_ticks_base) * 1000) & _TICKS_MAX
+
+
+def ticks_us():
+    return int(_elapsed(_ticks_base) * 1000000) & _TICKS_MAX
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _TICKS_HALF) & _TICKS_MAX) - _TICKS_HALF
+
+
+def sleep(seconds):
+    _time.sleep(seconds)
+
+
+def sleep_ms(ms):
+    _time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    _time.sleep(us / 1000000)
@@ -0,0 +1,77 @@
+# What RDS told about each channel, kept across tunes and reboots so a name
+# shows as soon as a channel is tuned.
+#
+# Entries are [pi, ps, pty, rssi] keyed by channel, 100 kHz steps from
+# 87.5 MHz. Programs are also found by PI code, for a station heard on
+# another frequency. An entry goes to the state store, one record per
+# channel, when its pi or pty change or a stable PS is saved; the rssi
+# follows with it. A PS is shown as soon as it is received but saved only
+# once stable: a dynamic PS changes every few seconds, each a write.
+
+STORE_NAME = "Stations"
+PI_NONE = const(-1)
+
+ENTRY_PI = const(0)
+ENTRY_PS = const(1)
+ENTRY_PTY = const(2)
+ENTRY_RSSI = const(3)
+
+def channel_of(frequency):
+    return int(round(frequency*10)) - 875
+
+class StationIndex:
+    def __init__(self, store):
+        self.store = store
+        self.entries = {}
+        self.by_pi = {}
+
+    def load(self, state):
+        for channel in state:
+            entry = state[channel]
+            self.entries[channel] = entry
+            if entry[ENTRY_PI] != PI_NONE:
+                self.by_pi[entry[ENTRY_PI]] = channel
+
+    def get(self, frequency):
+        return self.entries.get(channel_of(frequency))
+
+    def find_pi(self, pi):
+        channel = self.by_pi.get(pi)
+        return None if channel is None else self.entries[channel]
+
+    def name(self, frequency):
+        entry = self.entries.get(channel_of(frequency))
+        return None if entry is None else entry[ENTRY_PS]
+
+    def heard(self, frequency, rssi):
+        # in memory only, saved with the next change
+        entry = self.entries.get(channel_of(frequency))
+        if entry is not None:
+            entry[ENTRY_RSSI] = rssi
+
+    def update(self, frequency, pi=None, ps=None, pty=None, save=True):
+        # records what was received, a new PI on the channel forgets the
+        # name of the previous program; without save it stays in memory
+        channel = channel_of(frequency)
+        entry = self.entries.get(channel)
+        if entry is None:
+            entry = self.entries[channel] = [PI_NONE, None, 0, 0]
+        changed = False
+        if pi is not None and pi != entry[ENTRY_PI]:
+            if entry[ENTRY_PI] != PI_NONE:
+                entry[ENTRY_PS] = None
+                if self.by_pi.get(entry[ENTRY_PI]) == channel:
+                    del self.by_pi[entry[ENTRY_PI]]
+            entry[ENTRY_PI] = pi
+            self.by_pi[pi] = channel
+            changed = True
+        if ps is not None and ps != entry[ENTRY_PS]:
+            entry[ENTRY_PS] = ps
+            changed = True
+        if pty is not None and pty != entry[ENTRY_PTY]:
+            entry[ENTRY_PTY] = pty
+            changed = True
+        if save and (changed or ps is not None):
+            # the store skips a record equal to the saved one
+            self.store.set(STORE_NAME, channel, entry)
+        return entry
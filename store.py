@@ -0,0 +1,247 @@
+import os
+import json
+import struct
+import binascii
+import uasyncio as asyncio
+import perf
+
+# Application state in one journal file of packed records. A record sets one
+# attribute of one application:
+#
+#   <H length> <I crc32 of the payload> payload
+#   payload: app name, attribute name, value, each a tagged value
+#
+# Changes are appended, the last record for an attribute wins. When the file
+# grows past twice its live records and COMPACT_BYTES, the live records are
+# written to a new file that replaces the journal with a rename, so a power
+# cut leaves either file whole.
+# A torn record at the end fails its crc and is ignored with everything after.
+
+STORE_PATH = "state.bin"
+FLUSH_DELAY_MS = const(2000)    # coalesce changes for this long before writing
+COMPACT_BYTES = const(1024)
+
+TAG_NONE = const(0x4E)      # N
+TAG_TRUE = const(0x54)      # T
+TAG_FALSE = const(0x46)     # F
+TAG_INT = const(0x69)       # i, <i
+TAG_FLOAT = const(0x64)     # d, <d
+TAG_STR = const(0x73)       # s, <H length, utf-8
+TAG_LIST = const(0x6C)      # l, <H count, items
+
+HEADER = "<HI"
+HEADER_LEN = const(6)
+
+def encode(value, out):
+    # appends the tagged encoding of value to the bytearray out; tuples come
+    # back as lists, like they did through json
+    if value is None:
+        out.append(TAG_NONE)
+    elif value is True:
+        out.append(TAG_TRUE)
+    elif value is False:
+        out.append(TAG_FALSE)
+    elif isinstance(value, int):
+        out.append(TAG_INT)
+        out.extend(struct.pack("<i", value))
+    elif isinstance(value, float):
+        out.append(TAG_FLOAT)
+        out.extend(struct.pack("<d", value))
+    elif isinstance(value, str):
+        data = value.encode()
+        out.append(TAG_STR)
+        out.extend(struct.pack("<H", len(data)))
+        out.extend(data)
+    elif isinstance(value, (list, tuple)):
+        out.append(TAG_LIST)
+        out.extend(struct.pack("<H", len(value)))
+        for item in value:
+            encode(item, out)
+    else:
+        raise TypeError("cannot store {}".format(type(value)))
+
+def decode(data, pos):
+    # returns (value, position after it)
+    tag = data[pos]
+    pos += 1
+    if tag == TAG_NONE:
+        return None, pos
+    if tag == TAG_TRUE:
+        return True, pos
+    if tag == TAG_FALSE:
+        return False, pos
+    if tag == TAG_INT:
+        return struct.unpack_from("<i", data, pos)[0], pos + 4
+    if tag == TAG_FLOAT:
+        return struct.unpack_from("<d", data, pos)[0], pos + 8
+    if tag == TAG_STR:
+        length = struct.unpack_from("<H", data, pos)[0]
+        pos += 2
+        return str(data[pos:pos+length], "utf-8"), pos + length
+    if tag == TAG_LIST:
+        count = struct.unpack_from("<H", data, pos)[0]
+        pos += 2
+        items = []
+        for _ in range(count):
+            item, pos = decode(data, pos)
+            items.append(item)
+        return items, pos
+    raise ValueError("bad tag {}".format(tag))
+
+def _payload(name, key, value):
+    payload = bytearray()
+    encode(name, payload)
+    encode(key, payload)
+    encode(value, payload)
+    return bytes(payload)
+
+class StateStore:
+    def __init__(self, path=STORE_PATH, flush_delay_ms=FLUSH_DELAY_MS, compact_bytes=COMPACT_BYTES):
+        self.path = path
+        self.flush_delay_ms = flush_delay_ms
+        self.compact_bytes = compact_bytes
+        # (name, attribute) -> record payload as stored, and the ones waiting
+        # to be written
+        self.records = {}
+        self.pending = {}
+        self.size = 0
+        self.torn = False
+        self.legacy = []
+        self.flag = asyncio.Event()
+
+        self.flushes = 0
+        self.compactions = 0
+        self.bytes_written = 0
+        self.flush_time = perf.histogram("store.flush")
+
+    def load(self, names):
+        # reads the journal, or the legacy <name>.json files when there is
+        # none; returns {name: {attribute: value}}
+        states = {}
+        for name in names:
+            states[name] = {}
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except OSError:
+            data = None
+        if data is None:
+            self._load_legacy(states)
+            return states
+        pos = 0
+        while pos + HEADER_LEN <= len(data):
+            length, crc = struct.unpack_from(HEADER, data, pos)
+            start = pos + HEADER_LEN
+            payload = data[start:start+length]
+            if len(payload) != length or binascii.crc32(payload) & 0xFFFFFFFF != crc:
+                break
+            name, at = decode(payload, 0)
+            key, at = decode(payload, at)
+            self.records[(name, key)] = payload
+            pos = start + length
+        if pos != len(data):
+            # rewritten whole on the next flush
+            print("state store: {} bytes dropped at offset {}".format(len(data) - pos, pos))
+            self.torn = True
+        self.size = pos
+        # only the last value of each attribute is decoded
+        for name_key, payload in self.records.items():
+            name, key = name_key
+            if name in states:
+                _, at = decode(payload, 0)
+                _, at = decode(payload, at)
+                states[name][key] = decode(payload, at)[0]
+        return states
+
+    def _load_legacy(self, states):
+        # one json file per application: migrated on the first flush
+        for name in states:
+            path = "{}.json".format(name)
+            try:
+                with open(path, "rt") as file:
+                    state = json.load(file)
+            except (OSError, ValueError):
+                continue
+            self.legacy.append(path)
+            states[name] = state
+            for key in state:
+                self.set(name, key, state[key])
+
+    def set(self, name, key, value):
+        # records the value if it differs from the stored one, the write
+        # happens later from run() or on flush()
+        payload = _payload(name, key, value)
+        if self.records.get((name, key)) == payload:
+            self.pending.pop((name, key), None)
+            return
+        self.pending[(name, key)] = payload
+        self.flag.set()
+
+    def flush(self):
+        # appends the pending records in one write, or compacts; they stay
+        # pending until written, for the next flush to try again
+        if not self.pending:
+            return
+        records = dict(self.records)
+        data = bytearray()
+        for name_key, payload in self.pending.items():
+            records[name_key] = payload
+            data.extend(struct.pack(HEADER, len(payload), binascii.crc32(payload) & 0xFFFFFFFF))
+            data.extend(payload)
+        live = 0
+        for payload in records.values():
+            live += HEADER_LEN + len(payload)
+        if self.torn or self.size + len(data) > max(2*live, self.compact_bytes):
+            self.compact(records)
+        else:
+            try:
+                with open(self.path, "ab") as file:
+                    file.write(data)
+            except OSError:
+                # part of a record may have made it: rewritten whole next time
+                self.torn = True
+                raise
+            self.size += len(data)
+            self.bytes_written += len(data)
+        self.records = records
+        self.pending.clear()
+        self.flushes += 1
+        for path in self.legacy:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.legacy.clear()
+
+    def compact(self, records=None):
+        # live records only, to a new file renamed over the journal
+        if records is None:
+            records = self.records
+        data = bytearray()
+        for payload in records.values():
+            data.extend(struct.pack(HEADER, len(payload), binascii.crc32(payload) & 0xFFFFFFFF))
+            data.extend(payload)
+        temp = self.path + ".tmp"
+        with open(temp, "wb") as file:
+            file.write(data)
+        os.rename(temp, self.path)
+        self.size = len(data)
+        self.torn = False
+        self.bytes_written += len(data)
+        self.compactions += 1
+
+    async def run(self):
+        # writes at most once per flush delay, off the event path
+        while True:
+            await self.flag.wait()
+            await asyncio.sleep_ms(self.flush_delay_ms)
+            self.flag.clear()
+            start = self.flush_time.start()
+            try:
+                self.flush()
+            except OSError as e:
+                print("state store: write failed: {}".format(e))
+                # still pending: try again after the flush delay
+                self.flag.set()
+            finally:
+                self.flush_time.since(start)
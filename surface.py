@@ -0,0 +1,177 @@
+import framebuf
+import st7789
+from widget import Widget, swap565
+
+# RAM copy of a screen region taking the st7789 drawing calls. A call
+# inside the region draws into the buffer, one that crosses its edge draws
+# into it too and also goes to the display, one outside only goes to the
+# display. draw() sends the rectangle drawn since the last one: full rows
+# are contiguous in the buffer and go in a single blit_buffer, narrower
+# rectangles are copied through the stage buffer, as many rows at a time
+# as it holds. scroll() moves pixels already drawn, for lists.
+#
+# Texts use the romfonts: each glyph is copied into a small buffer and
+# blitted through a two color palette. Glyphs are whole bytes wide, like
+# the ones of the fonts the application uses.
+
+OUTSIDE = const(0)
+ACROSS = const(1)
+INSIDE = const(2)
+
+class Surface(Widget):
+    def __init__(self, display, x, y, width, height, stage=None):
+        super().__init__(x, y, width, height)
+        self.display = display
+        self.buffer = bytearray(width*height*2)
+        self.fb = framebuf.FrameBuffer(self.buffer, width, height, framebuf.RGB565)
+        self.palette = framebuf.FrameBuffer(bytearray(4), 2, 1, framebuf.RGB565)
+        self.glyph_buf = bytearray(2*32)
+        # font -> 1 bit frame buffer over glyph_buf
+        self.glyphs = {}
+        self.stage = stage
+        # frame buffer over the stage for rectangles stage_width wide
+        self.stage_fb = None
+        self.stage_width = 0
+        # rectangle drawn since the last blit
+        self.left = width
+        self.top = height
+        self.right = 0
+        self.bottom = 0
+
+        self.blits = 0
+
+    def move(self, x, y):
+        self.x = x
+        self.y = y
+
+    def _where(self, x, y, w, h):
+        left = self.x
+        top = self.y
+        if x >= left+self.width or y >= top+self.height or x+w <= left or y+h <= top:
+            return OUTSIDE
+        if x >= left and y >= top and x+w <= left+self.width and y+h <= top+self.height:
+            return INSIDE
+        return ACROSS
+
+    def _touch(self, x, y, w, h):
+        left = max(x-self.x, 0)
+        top = max(y-self.y, 0)
+        right = min(x-self.x+w, self.width)
+        bottom = min(y-self.y+h, self.height)
+        if left < self.left:
+            self.left = left
+        if top < self.top:
+            self.top = top
+        if right > self.right:
+            self.right = right
+        if bottom > self.bottom:
+            self.bottom = bottom
+        self.invalidate()
+
+    def fill_rect(self, x, y, width, height, color):
+        where = self._where(x, y, width, height)
+        if where != INSIDE:
+            self.display.fill_rect(x, y, width, height, color)
+        if where != OUTSIDE:
+            self.fb.fill_rect(x-self.x, y-self.y, width, height, swap565(color))
+            self._touch(x, y, width, height)
+
+    def hline(self, x, y, length, color):
+        self.fill_rect(x, y, length, 1, color)
+
+    def vline(self, x, y, length, color):
+        self.fill_rect(x, y, 1, length, color)
+
+    def pixel(self, x, y, color):
+        self.fill_rect(x, y, 1, 1, color)
+
+    def rect(self, x, y, width, height, color):
+        self.hline(x, y, width, color)
+        self.hline(x, y+height-1, width, color)
+        self.vline(x, y, height, color)
+        self.vline(x+width-1, y, height, color)
+
+    def fill(self, color):
+        self.display.fill(color)
+        self.fb.fill(swap565(color))
+        self._touch(self.x, self.y, self.width, self.height)
+
+    def text(self, font, text, x, y, fg=st7789.WHITE, bg=st7789.BLACK):
+        if isinstance(text, str):
+            text = text.encode()
+        where = self._where(x, y, len(text)*font.WIDTH, font.HEIGHT)
+        if where != INSIDE:
+            self.display.text(font, text, x, y, fg, bg)
+        if where == OUTSIDE:
+            return
+        glyph = self.glyphs.get(font)
+        if glyph is None:
+            glyph = self.glyphs[font] = framebuf.FrameBuffer(self.glyph_buf, font.WIDTH, font.HEIGHT, framebuf.MONO_HLSB)
+        size = font.WIDTH//8*font.HEIGHT
+        palette = self.palette
+        palette.pixel(0, 0, swap565(bg))
+        palette.pixel(1, 0, swap565(fg))
+        glyphs = memoryview(font.FONT)
+        buf = self.glyph_buf
+        fb = self.fb
+        left = x-self.x
+        top = y-self.y
+        for code in text:
+            if font.FIRST <= code <= font.LAST:
+                src = (code-font.FIRST)*size
+                buf[:size] = glyphs[src:src+size]
+                fb.blit(glyph, left, top, -1, palette)
+            left += font.WIDTH
+        self._touch(x, y, len(text)*font.WIDTH, font.HEIGHT)
+
+    def scroll(self, x, y, width, height, dy):
+        # moves the pixels of a rectangle inside the region dy rows down, up
+        # when negative; the rows uncovered keep what they had. False when
+        # the rectangle is not inside.
+        if self._where(x, y, width, height) != INSIDE or not 0 < abs(dy) < height:
+            return False
+        stride = self.width*2
+        span = width*2
+        left = (x-self.x)*2
+        buf = self.buffer
+        view = memoryview(buf)
+        rows = range(y-self.y, y-self.y+height+dy) if dy < 0 else range(y-self.y+height-1, y-self.y+dy-1, -1)
+        for row in rows:
+            dst = row*stride + left
+            src = dst - dy*stride
+            buf[dst:dst+span] = view[src:src+span]
+        self._touch(x, y, width, height)
+        return True
+
+    def draw(self, display):
+        self.dirty = False
+        left, top, right, bottom = self.left, self.top, self.right, self.bottom
+        if bottom <= top:
+            return
+        self.left = self.width
+        self.top = self.height
+        self.right = 0
+        self.bottom = 0
+        width = right-left
+        if self.stage is None or width == self.width:
+            stride = self.width*2
+            display.blit_buffer(memoryview(self.buffer)[top*stride:bottom*stride],
+                                self.x, self.y+top, self.width, bottom-top)
+            self.blits += 1
+            return
+        rows = len(self.stage)//(width*2)
+        stage = self.stage_fb
+        if width != self.stage_width:
+            # a widget redrawn again has the width of last time
+            stage = self.stage_fb = framebuf.FrameBuffer(self.stage, width, rows, framebuf.RGB565)
+            self.stage_width = width
+        while top < bottom:
+            count = min(rows, bottom-top)
+            stage.blit(self.fb, -left, -top)
+            display.blit_buffer(memoryview(self.stage)[:width*count*2], self.x+left, self.y+top, width, count)
+            self.blits += 1
+            top += count
+
+    def __getattr__(self, name):
+        # the other display calls, width(), on(), ... go to the display
+        return getattr(self.display, name)
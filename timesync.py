@@ -0,0 +1,240 @@
+import utime
+import machine
+import socket
+import struct
+import uasyncio as asyncio
+import perf
+
+# Disciplined UTC time for the clock and the alarms.
+#
+# time() is the time of the last anchor plus the ticks elapsed since,
+# corrected by the drift of the crystal and by the offset being slewed.
+# run() asks the NTP server every SYNC_S, RETRY_S after a failure, without
+# blocking: the request goes out on a non blocking UDP socket polled from
+# the loop. Only the name lookup blocks, once: the address is kept, a
+# timeout does not look it up again. A failed lookup is tried again after
+# twice the wait of the last one, up to SYNC_S, not every RETRY_S. Give the
+# server as an address to avoid the lookup altogether.
+#
+# A measured offset under STEP_MS is slewed: time() runs at most SLEW_PPM
+# faster or slower until it is absorbed, it never goes back. A larger one,
+# the first sync included, steps the time and the RTC. Two NTP answers at
+# least DRIFT_MIN_S apart give the drift rate: the offset left over the
+# ticks elapsed, averaged in drift_ppm.
+#
+# Without an NTP answer for NTP_STALE_S, the 4A clock time group of the
+# station tuned sets the time. It ends on a minute edge and has a minute
+# resolution: offsets under RDS_TOLERANCE_MS are left alone and it does not
+# feed the drift.
+
+SYNC_S = const(3600)
+RETRY_S = const(60)
+NTP_PORT = const(123)
+NTP_TIMEOUT_MS = const(1000)
+NTP_STALE_S = const(7200)
+POLL_MS = const(5)             # the answer is timed to a poll
+STEP_MS = const(2000)
+SLEW_PPM = const(2000)
+DRIFT_MIN_S = const(600)
+DRIFT_MAX_PPM = const(500)
+DRIFT_GAIN = const(4)           # a new drift sample counts for a quarter
+RDS_TOLERANCE_MS = const(1500)
+ANCHOR_MS = const(3600000)      # well within the ticks_diff range
+
+NTP_DELTA = 3155673600          # 1900-01-01 to 2000-01-01
+MJD_2000 = const(51544)
+
+SOURCE_NTP = "ntp"
+SOURCE_RDS = "rds"
+
+def _ppm(value, ppm):
+    # value*ppm/1000000, to the nearest: floors would bias the drift estimate
+    return (value*ppm + 500000)//1000000
+
+class TimeSync:
+    def __init__(self, host, port=NTP_PORT):
+        self.host = host
+        self.port = port
+        self.address = None
+        # time of base_ticks, in seconds and milliseconds
+        self.base_s = utime.time()
+        self.base_ms = 0
+        self.base_ticks = utime.ticks_ms()
+        self.slew_ms = 0            # offset still to absorb from base_ticks
+        self.drift_ppm = 0          # how much faster the ticks run
+        self.drift_ticks = None     # NTP answer the next drift sample starts from
+        self.drift_samples = 0
+        self.ntp_ticks = None       # last NTP answer
+        self.synced = False
+        self.source = None
+        # called with the source after each correction
+        self.on_sync = None
+        self.offset_time = perf.histogram("time.offset")
+
+        self.offset_ms = 0
+        self.rtt_ms = 0
+        self.syncs = 0
+        self.steps = 0
+        self.failures = 0
+        self.lookup_failures = 0    # in a row
+
+    def _advance(self, elapsed):
+        # disciplined milliseconds for elapsed ticks from the anchor
+        slewed = self.slew_ms
+        if slewed:
+            limit = _ppm(elapsed, SLEW_PPM)
+            if slewed > limit:
+                slewed = limit
+            elif slewed < -limit:
+                slewed = -limit
+        return elapsed - _ppm(elapsed, self.drift_ppm) + slewed
+
+    def _anchor(self, ticks):
+        elapsed = utime.ticks_diff(ticks, self.base_ticks)
+        advance = self._advance(elapsed)
+        self.slew_ms -= advance - (elapsed - _ppm(elapsed, self.drift_ppm))
+        total = self.base_ms + advance
+        self.base_s += total//1000
+        self.base_ms = total % 1000
+        self.base_ticks = ticks
+
+    def _millis(self):
+        # milliseconds from base_s
+        ticks = utime.ticks_ms()
+        elapsed = utime.ticks_diff(ticks, self.base_ticks)
+        if elapsed > ANCHOR_MS:
+            self._anchor(ticks)
+            elapsed = 0
+        return self.base_ms + self._advance(elapsed)
+
+    def time(self):
+        return self.now()[0]
+
+    def ms(self):
+        # milliseconds into the current second
+        return self._millis() % 1000
+
+    def now(self):
+        # seconds and milliseconds into them, from one tick reading.
+        # _millis() may move the anchor, and base_s with it
+        ms = self._millis()
+        return self.base_s + ms//1000, ms % 1000
+
+    def correct(self, source_s, source_ms, ticks, source):
+        # the time was source_s + source_ms at ticks
+        self._anchor(ticks)
+        remaining = self.slew_ms
+        offset = (source_s - self.base_s)*1000 + source_ms - self.base_ms
+        self.offset_ms = offset
+        self.offset_time.add(abs(offset)*1000)
+        if source == SOURCE_NTP:
+            if self.synced and self.drift_ticks is not None and abs(offset) <= STEP_MS:
+                # what the slew in progress does not cover came from the drift
+                self._drift(offset - remaining, utime.ticks_diff(ticks, self.drift_ticks))
+            self.drift_ticks = ticks
+            self.ntp_ticks = ticks
+        else:
+            # the drift sample would include this correction
+            self.drift_ticks = None
+        if not self.synced or abs(offset) > STEP_MS:
+            self.base_s = source_s
+            self.base_ms = source_ms
+            self.slew_ms = 0
+            self.steps += 1
+            tm = utime.localtime(source_s)
+            machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6], tm[3], tm[4], tm[5], 0))
+        else:
+            self.slew_ms = offset
+        self.synced = True
+        self.source = source
+        self.syncs += 1
+        if self.on_sync:
+            self.on_sync(source)
+
+    def _drift(self, error, interval):
+        # error left by the current drift over interval ticks
+        if interval < DRIFT_MIN_S*1000:
+            return
+        sample = self.drift_ppm - (error*1000000 + interval//2)//interval
+        if self.drift_samples:
+            sample = self.drift_ppm + (sample - self.drift_ppm + DRIFT_GAIN//2)//DRIFT_GAIN
+        self.drift_ppm = max(-DRIFT_MAX_PPM, min(DRIFT_MAX_PPM, sample))
+        self.drift_samples += 1
+
+    def ntp_fresh(self):
+        return self.ntp_ticks is not None and utime.ticks_diff(utime.ticks_ms(), self.ntp_ticks) < NTP_STALE_S*1000
+
+    async def run(self):
+        while True:
+            synced = await self.ntp_sync()
+            if not synced and not self.ntp_fresh():
+                # also keeps ticks_diff() in range while the network is down
+                self.ntp_ticks = None
+                self.drift_ticks = None
+            if synced:
+                wait = SYNC_S
+            elif self.lookup_failures:
+                # each lookup blocks the loop as long as the resolver waits
+                wait = min(SYNC_S, RETRY_S << self.lookup_failures)
+            else:
+                wait = RETRY_S
+            await asyncio.sleep(wait)
+
+    async def ntp_sync(self):
+        sock = None
+        try:
+            if self.address is None:
+                self.lookup_failures += 1
+                self.address = socket.getaddrinfo(self.host, self.port)[0][-1]
+                self.lookup_failures = 0
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            request = bytearray(48)
+            request[0] = 0x1B       # version 3, client
+            sent = utime.ticks_ms()
+            sock.sendto(request, self.address)
+            reply = None
+            while reply is None:
+                await asyncio.sleep_ms(POLL_MS)
+                try:
+                    reply = sock.recv(48)
+                except OSError:
+                    if utime.ticks_diff(utime.ticks_ms(), sent) > NTP_TIMEOUT_MS:
+                        raise
+        except OSError as e:
+            print("ntp: {}".format(e))
+            self.failures += 1
+            return False
+        finally:
+            if sock is not None:
+                sock.close()
+        received = utime.ticks_ms()
+        if len(reply) < 48 or reply[0] & 0x07 != 4 or reply[1] == 0:
+            # not a server answer, or kiss of death
+            self.failures += 1
+            return False
+        self.rtt_ms = utime.ticks_diff(received, sent)
+        seconds, fraction = struct.unpack("!II", reply[40:48])
+        self.ntp_answer(seconds, fraction, received)
+        return True
+
+    def ntp_answer(self, seconds, fraction, received):
+        # the transmit time of the server was half the round trip before
+        # received. To the nearest millisecond, the carry goes into seconds
+        ms = (fraction*1000 + 0x80000000 >> 32) + (self.rtt_ms + 1)//2
+        self.correct(seconds - NTP_DELTA + ms//1000, ms % 1000, received, SOURCE_NTP)
+
+    def rds_time(self, mjd, hour, minute, offset):
+        # 4A group handler: UTC at the minute edge that ends the group
+        if self.ntp_fresh():
+            return
+        ticks = utime.ticks_ms()
+        seconds = (mjd - MJD_2000)*86400 + hour*3600 + minute*60
+        if seconds < 0:
+            return
+        if self.synced:
+            elapsed = utime.ticks_diff(ticks, self.base_ticks)
+            ahead = (self.base_s - seconds)*1000 + self.base_ms + self._advance(elapsed)
+            if abs(ahead) < RDS_TOLERANCE_MS:
+                return
+        self.correct(seconds, 0, ticks, SOURCE_RDS)
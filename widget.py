@@ -0,0 +1,79 @@
+import utime
+import uasyncio as asyncio
+import perf
+
+FRAME_MS = const(40)
+
+def swap565(color):
+    # framebuf keeps RGB565 little endian, the display takes it big endian
+    return (color & 0xFF) << 8 | color >> 8
+
+class Widget:
+    # A screen region owning its pixels: state changes call invalidate(),
+    # the scheduler calls draw() at most once per frame.
+    def __init__(self, x, y, width, height):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.dirty = False
+        self.scheduler = None
+        self.draw_time = None
+
+    def invalidate(self):
+        if self.dirty:
+            return
+        self.dirty = True
+        if self.scheduler is not None:
+            self.scheduler.invalidate(self)
+
+    def draw(self, display):
+        pass
+
+class RenderScheduler:
+    def __init__(self, display, frame_ms=FRAME_MS):
+        self.display = display
+        self.frame_ms = frame_ms
+        self.dirty = []
+        self.drawing = []
+        self.flag = asyncio.Event()
+        self.last_frame = utime.ticks_ms()
+        self.frames = 0
+        self.rects = 0
+
+    def add(self, widget):
+        widget.scheduler = self
+        widget.draw_time = perf.histogram("draw." + type(widget).__name__)
+        if widget.dirty:
+            self.dirty.append(widget)
+            self.flag.set()
+        return widget
+
+    def invalidate(self, widget):
+        self.dirty.append(widget)
+        self.flag.set()
+
+    def flush(self):
+        # swap lists so widgets invalidated while drawing go to the next frame
+        self.dirty, self.drawing = self.drawing, self.dirty
+        for widget in self.drawing:
+            widget.dirty = False
+            start = widget.draw_time.start()
+            try:
+                widget.draw(self.display)
+            finally:
+                widget.draw_time.since(start)
+        self.rects += len(self.drawing)
+        self.drawing.clear()
+        self.frames += 1
+        self.last_frame = utime.ticks_ms()
+
+    async def run(self):
+        while True:
+            await self.flag.wait()
+            self.flag.clear()
+            # an idle screen reacts at once, a busy one at most once per frame
+            wait = self.frame_ms - utime.ticks_diff(utime.ticks_ms(), self.last_frame)
+            if wait > 0:
+                await asyncio.sleep_ms(wait)
+            self.flush()